@@ -0,0 +1,233 @@
+"""
+Parallel multi-specimen batch runner.
+
+Reads a manifest of specimens, and runs the ODB extraction, VGI
+calculation and failure index determination of every specimen across
+a process pool. All results are saved to a single database.
+
+usage:
+    python batchRunner.py manifest.json
+
+manifest (JSON):
+    {
+     "database"  : "Deterministic",   (save name, see saveMAT/resultsStore)
+     "format"    : "mat",             (optional: "mat" or "store")
+     "processes" : 8,                 (optional: default = number of cores)
+     "licenses"  : 4,                 (optional: max concurrent ODB readers)
+     "retries"   : 1,                 (optional: default = 1)
+     "jobs"      : [
+        {"specimen"      : "CT",
+         "odbPath"       : "C:\\temp\\CT\\CT_1T_AP50.odb",
+         "material"      : "AP50",
+         "failureLoad"   : [120.5, 131.0],
+         "options"       : {"setName": "CrackExtensionPlane"},  (optional)
+         "vgi"           : "nodalAvg",     (optional, see VGI_METHODS)
+         "vgiSource"     : "FIELDS",       (optional, see specimen_superclasses.VGI_SOURCES)
+         "deterministic" : true},          (optional, CT only)
+        ...
+     ]
+    }
+
+the vgiSource "UVARM" reads the in-solver VGI (one field) instead of the
+MISES, PRESS and PEEQ fields, and is the only source which reads less of
+the ODB. "AUTO" and "CHECK" also read the three fields, to check it.
+
+set the environment variable VGPY_INSTRUMENT to a JSON lines file path to
+record the per-stage timing and memory of every job (see instrumentation).
+a summary table is printed at the end of the batch.
+"""
+
+#
+# imports
+#
+import sys
+import os
+import json
+import time
+import traceback
+import multiprocessing
+import specimen_subclasses
+import saveMAT
+import resultsStore
+import instrumentation
+
+#
+# constants
+#
+
+# manifest "vgi" keys, and the corresponding specimen methods
+VGI_METHODS = {'nodalExtrap' : 'calcNodalExtrapMonoVGI',
+               'intPt'       : 'calcIntPtMonoVGI',
+               'all'         : 'calcAllMonoVGI',
+               'nodalAvg'    : 'calcNodalAvgMonoVGI',
+               'elemAvg'     : 'calcElemAvgMonoVGI'}
+
+# specimen classes which may be used in a manifest
+SPECIMEN_CLASSES = ('SNTT', 'CT', 'BN', 'BB', 'BH', 'RBS')
+
+#
+# function defs
+#
+def loadManifest(manifest):
+    """ returns the manifest dictionary, given a dictionary or JSON file path """
+    if isinstance(manifest, dict):
+        return manifest
+    with open(manifest, 'r') as f:
+        return json.load(f)
+
+def buildSpecimen(job):
+    """ returns the specimen instance defined by a manifest job """
+
+    if job['specimen'] not in SPECIMEN_CLASSES:
+        raise Exception('batchRunner: undefined specimen class ' + str(job['specimen']))
+    specimenClass = getattr(specimen_subclasses, job['specimen'])
+
+    # JSON strings may be unicode; specimen classes expect str
+    options = dict([ (str(k), v) for (k, v) in job.get('options', {}).items() ])
+    return specimenClass(str(job['odbPath']), str(job['material']),
+                         tuple(job['failureLoad']), **options)
+
+def runJob(job):
+    """
+    run extraction + VGI + failure index determination of a manifest job.
+    returns the processed specimen instance
+    """
+
+    specimen = buildSpecimen(job)
+
+    with instrumentation.stage('job', specimen.name):
+        # calculate the VGI
+        vgi = job.get('vgi', 'nodalAvg')
+        if vgi not in VGI_METHODS:
+            raise Exception('batchRunner: undefined vgi method ' + str(vgi))
+        specimen.vgiSource = str(job.get('vgiSource', 'FIELDS'))
+        getattr(specimen, VGI_METHODS[vgi])()
+        if job.get('deterministic', False):
+            specimen.fetchDeterministicVGI()
+
+        # determine the failure indices (the load history is fetched
+        # on first access)
+        specimen.determineFailureIndex()
+    return specimen
+
+def _poolWorker(indexedJob):
+    """
+    process pool worker. returns a tuple of
+    (job index, specimen or None, wall time, error string or None)
+    """
+    (index, job) = indexedJob
+    tic = time.time()
+    try:
+        specimen = runJob(job)
+        return (index, specimen, time.time() - tic, None)
+    except Exception:
+        return (index, None, time.time() - tic, traceback.format_exc())
+
+def defaultProcesses(manifest):
+    """ returns the process pool size: min(cores, licenses, jobs) """
+    processes = manifest.get('processes', multiprocessing.cpu_count())
+    if manifest.get('licenses') is not None:
+        processes = min(processes, manifest['licenses'])
+    return max(1, min(processes, len(manifest['jobs'])))
+
+def runBatch(manifest, processes=None, save=True):
+    """
+    run all jobs of a manifest (dictionary or JSON file path) across a
+    process pool, retrying failed jobs. all successful specimens are
+    saved to a single database (unless save is False).
+
+    returns a tuple of (specimens, report), where specimens is a list of
+    the processed specimen instances (in manifest order, None if the job
+    failed), and report is a list of dictionaries with the per-job
+    'name', 'specimen', 'attempts', 'wallTime' and 'error'.
+    """
+
+    tic      = time.time()
+    manifest = loadManifest(manifest)
+    jobs     = manifest['jobs']
+    retries  = manifest.get('retries', 1)
+    if processes is None:
+        processes = defaultProcesses(manifest)
+
+    specimens = [None]*len(jobs)
+    report    = [{'name': os.path.splitext(os.path.basename(
+                              str(job['odbPath']).replace('\\', '/')))[0],
+                  'specimen': job['specimen'], 'attempts': 0,
+                  'wallTime': 0.0, 'error': None} for job in jobs]
+
+    # a fresh process for every job, such that the memory of an
+    # (ODB) extraction is released when the job is finished
+    pool = None
+    if processes > 1:
+        pool = multiprocessing.Pool(processes, maxtasksperchild=1)
+    try:
+        pending = list(enumerate(jobs))
+        for attempt in range(retries + 1):
+            if not pending:
+                break
+            if pool is None:
+                results = map(_poolWorker, pending)
+            else:
+                results = pool.imap_unordered(_poolWorker, pending)
+
+            failed = []
+            for (index, specimen, wallTime, error) in results:
+                report[index]['attempts'] += 1
+                report[index]['wallTime'] += wallTime
+                report[index]['error']     = error
+                if error is None:
+                    specimens[index] = specimen
+                else:
+                    print('\n!! WARNING: ' + report[index]['name'] +
+                          ' failed (attempt ' + str(attempt + 1) + ') !!\n' + error)
+                    failed.append((index, jobs[index]))
+            pending = failed
+    finally:
+        if pool is not None:
+            pool.close()
+            pool.join()
+
+    if save:
+        saveBatch(manifest, [s for s in specimens if s is not None])
+
+    # summary of the (instrumented) stages of this batch
+    if instrumentation.enabled():
+        records = [r for r in instrumentation.readRecords(instrumentation.enabled())
+                   if r['time'] >= tic]
+        print(instrumentation.formatSummary(instrumentation.summarize(records)))
+    return (specimens, report)
+
+def saveBatch(manifest, specimens):
+    """ save the processed specimens to the manifest database """
+    if not specimens:
+        return
+    with instrumentation.stage('saveBatch'):
+        if manifest.get('format', 'mat') == 'store':
+            resultsStore.saveStore(specimens, str(manifest['database']))
+        else:
+            saveMAT.VGPy(specimens, str(manifest['database']))
+    return
+
+def formatReport(report):
+    """ returns a string table of the per-job report """
+    lines = ['%-32s %-8s %-8s %-9s %10s' % ('name', 'specimen', 'status', 'attempts', 'wall [s]')]
+    total = 0.0
+    for r in report:
+        status = 'ok' if r['error'] is None else 'FAILED'
+        lines.append('%-32s %-8s %-8s %-9i %10.2f' % (r['name'], r['specimen'], status,
+                                                     r['attempts'], r['wallTime']))
+        total += r['wallTime']
+    lines.append('%-32s %-8s %-8s %-9s %10.2f' % ('total (cpu)', '', '', '', total))
+    return '\n'.join(lines)
+
+#
+# script
+#
+if __name__ == '__main__':
+    if len(sys.argv) != 2:
+        print('usage: python batchRunner.py manifest.json')
+        sys.exit(1)
+    tic = time.time()
+    (specimens, report) = runBatch(sys.argv[1])
+    print(formatReport(report))
+    print('batch wall time: %.2f s' % (time.time() - tic))
@@ -0,0 +1,371 @@
+"""
+Micro-benchmarks of the FEM_VGPy kernels on synthetic histories.
+
+The monotonic and cyclic VGI integration (calcVGI), the MATLAB
+conversion of specimen dictionaries (saveMAT) and the likelihood
+pipeline (likelihood.SampleBlock) are timed on synthetic, but realistic,
+MISES/PRESS/PEEQ histories of 10^2 to 10^4 frames and 10^3 to 10^6
+points (rank-2 [frame, node] and rank-3 [frame, ip, element]). no ODB
+or MATLAB is required. the time and peak (traced) memory of every kernel
+are reported, and can be saved to compare between commits.
+
+sizes whose input arrays are larger than MAX_BENCH_BYTES (1 GiB, i.e.
+10^8 values) are skipped. by default, the largest cases are 10^2 x 10^6,
+10^3 x 10^5 and 10^4 x 10^4 (frames x points), which need about 8 GB of
+memory (the cyclic VGI holds about eight arrays of the input size). the
+sizes 10^3 x 10^6, 10^4 x 10^5 and 10^4 x 10^6 are only run with a
+larger --max-bytes.
+
+usage:
+    python benchmarks.py [--quick] [--kernels k1,k2] [--save name] [--compare name]
+
+    python benchmarks.py --save baseline
+    ... (change something)
+    python benchmarks.py --compare baseline
+"""
+
+#
+# imports
+#
+import os
+import gc
+import json
+import time
+import platform
+import subprocess
+import numpy
+import myPaths
+import calcVGI
+import likelihood
+try:
+    import tracemalloc
+except ImportError:
+    # python 2: the peak memory is not reported
+    tracemalloc = None
+import saveMAT
+
+#
+# constants
+#
+
+# (nframe, npoint) sizes of the VGI benchmarks
+SIZES       = [(10**f, 10**p) for f in (2, 3, 4) for p in (3, 4, 5, 6)]
+QUICK_SIZES = [(10**2, 10**3), (10**3, 10**4), (10**4, 10**3)]
+
+# largest input array (bytes) of a benchmark. larger sizes are skipped
+# (see above for the sizes run by default)
+MAX_BENCH_BYTES = 2**30
+
+# points (IPs or nodes) per element of the rank-3 histories
+POINTS_PER_ELEM = 8
+
+# (nspecimen, nframe) sizes of the likelihood benchmarks
+LIKELIHOOD_SIZES = [(30, 10**2), (30, 10**3), (100, 10**4)]
+
+# number of parameter pairs of the likelihood grid benchmark
+LIKELIHOOD_GRID = 100*100
+
+#
+# function defs
+#
+def _shape(nframe, npoint, rank):
+    """ returns the array shape of nframe and npoint of rank 2 or 3 """
+    if rank == 2:
+        return (nframe, npoint)
+    return (nframe, POINTS_PER_ELEM, max(1, npoint//POINTS_PER_ELEM))
+
+def monotonicHistories(nframe, npoint, rank=2, seed=0):
+    """
+    returns a tuple of synthetic (mises, pressure, PEEQ) monotonic
+    histories. PEEQ is non-decreasing, mises is a hardening flow stress,
+    and the stress triaxiality varies smoothly between points (0.3 - 1.5)
+    """
+    rng   = numpy.random.RandomState(seed)
+    shape = _shape(nframe, npoint, rank)
+    t     = numpy.linspace(0.0, 1.0, nframe).reshape((-1,) + (1,)*(len(shape) - 1))
+
+    # per-point strain rate and triaxiality
+    rate  = rng.uniform(0.05, 0.5, shape[1:])
+    triax = rng.uniform(0.3, 1.5, shape[1:])
+
+    PEEQ  = rate*t**1.5
+    mises = 345.0*(1.0 + 10.0*PEEQ)**0.15
+    pressure = -(triax*(1.0 + 0.2*t))*mises
+    return (mises, pressure, PEEQ)
+
+def cyclicHistories(nframe, npoint, rank=2, seed=0, ncycle=4):
+    """
+    returns a tuple of synthetic (mises, pressure, PEEQ) cyclic histories.
+    the pressure reverses sign ncycle times, and PEEQ accumulates in
+    every half cycle
+    """
+    rng   = numpy.random.RandomState(seed)
+    shape = _shape(nframe, npoint, rank)
+    t     = numpy.linspace(0.0, 1.0, nframe).reshape((-1,) + (1,)*(len(shape) - 1))
+
+    rate  = rng.uniform(0.05, 0.5, shape[1:])
+    triax = rng.uniform(0.3, 1.5, shape[1:])
+    phase = numpy.sin(2.0*numpy.pi*ncycle*t)
+
+    # plastic strain accumulates in proportion to |d(phase)|
+    dphase = numpy.abs(numpy.diff(phase, axis=0))
+    PEEQ  = numpy.concatenate((numpy.zeros((1,) + shape[1:]),
+                               numpy.cumsum(dphase*rate/ncycle, axis=0)))
+    mises = 345.0*(1.0 + 10.0*PEEQ)**0.15
+    pressure = -(triax*phase)*mises
+    return (mises, pressure, PEEQ)
+
+class _SyntheticSpecimen(object):
+    """ a specimen stand-in (name, material, VGI, loadHist, failureIndex) """
+    def __init__(self, **attributes):
+        self.__dict__.update(attributes)
+        return
+
+def syntheticSpecimens(nspecimen, nframe, nlstar=5, seed=0):
+    """
+    returns a list of synthetic specimens, with monotonic VGI histories
+    (of nlstar locations), load histories, and (lognormal) failures
+    """
+    rng = numpy.random.RandomState(seed)
+    specimens = []
+    for i in range(nspecimen):
+        t    = numpy.linspace(0.0, 1.0, nframe)**1.3
+        load = t*(5.0 + rng.rand())
+        VGI  = (numpy.exp(2.0*t) - 1.0)[:,numpy.newaxis]*(0.6 + 0.1*numpy.arange(nlstar))
+        crit = rng.lognormal(0.3, 0.3)
+        frame = int(numpy.clip(numpy.searchsorted(VGI[:,nlstar//2], crit), 5, nframe - 2))
+        specimens.append(_SyntheticSpecimen(name='CT_%i' % i, material='AP50', VGI=VGI,
+                                            loadHist=load[:,numpy.newaxis],
+                                            failureIndex=(frame,)))
+    return specimens
+
+def timeKernel(kernel, repeat=3):
+    """
+    returns a dictionary of the 'time' (best of repeat), 'median' time
+    [s], and 'peakBytes' (peak traced memory of a call, None if not
+    available) of kernel (callable without arguments). the first 
+    (untimed) call also warms up e.g. the numba kernels.
+    """
+    peakBytes = None
+    gc.collect()
+    if tracemalloc is not None:
+        tracemalloc.start()
+        try:
+            kernel()
+            peakBytes = tracemalloc.get_traced_memory()[1]
+        finally:
+            tracemalloc.stop()
+    else:
+        kernel()
+
+    times = []
+    for i in range(repeat):
+        gc.collect()
+        tic = time.time()
+        kernel()
+        times.append(time.time() - tic)
+    return {'time': min(times), 'median': float(numpy.median(times)), 'peakBytes': peakBytes}
+
+def _vgiCases(sizes, maxBytes):
+    """ generator of (nframe, npoint, rank) within maxBytes """
+    for (nframe, npoint) in sizes:
+        if 8*nframe*npoint > maxBytes:
+            continue
+        for rank in (2, 3):
+            yield (nframe, npoint, rank)
+
+def _specimenDict(mises, pressure, PEEQ):
+    """ returns a specimen-like dictionary of histories, for conversion """
+    return {'name': 'SNTT_R050_1', 'material': 'AP50', 'setName': 'CENTERNODE',
+            'VGI': PEEQ, 'loadHist': mises[:,:1].copy(),
+            'failureIndex': (10, 20), 'nodeLabelSet': numpy.arange(PEEQ.shape[1]),
+            'radius': 0.05, 'lstars': None}
+
+def benchmarkCases(quick=False, maxBytes=MAX_BENCH_BYTES):
+    """
+    generator of the benchmark cases, tuples of (kernel name, size
+    dictionary, setup), where setup() returns the kernel callable
+    """
+    sizes = QUICK_SIZES if quick else SIZES
+    for (nframe, npoint, rank) in _vgiCases(sizes, maxBytes):
+        size = {'nframe': nframe, 'npoint': npoint, 'rank': rank}
+
+        def setup(nframe=nframe, npoint=npoint, rank=rank):
+            (mises, pressure, PEEQ) = monotonicHistories(nframe, npoint, rank)
+            return lambda: calcVGI.calcMonotonicVGI(mises, pressure, PEEQ)
+        yield ('calcMonotonicVGI', size, setup)
+
+        def setup(nframe=nframe, npoint=npoint, rank=rank):
+            (mises, pressure, PEEQ) = cyclicHistories(nframe, npoint, rank)
+            return lambda: calcVGI.calcCyclicVGI(mises, pressure, PEEQ)
+        yield ('calcCyclicVGI', size, setup)
+
+        if rank == 2:
+            def setup(nframe=nframe, npoint=npoint):
+                data = _specimenDict(*monotonicHistories(nframe, npoint))
+                return lambda: saveMAT._convert_dict_numpy(data)
+            yield ('_convert_dict_numpy', size, setup)
+
+            if saveMAT.matlab is not None:
+                def setup(nframe=nframe, npoint=npoint):
+                    data = _specimenDict(*monotonicHistories(nframe, npoint))
+                    return lambda: saveMAT._convert_dict_dtypes(data)
+                yield ('_convert_dict_dtypes', size, setup)
+
+    for (nspecimen, nframe) in (LIKELIHOOD_SIZES[:2] if quick else LIKELIHOOD_SIZES):
+        size = {'nspecimen': nspecimen, 'nframe': nframe}
+
+        def setup(nspecimen=nspecimen, nframe=nframe):
+            specimens = syntheticSpecimens(nspecimen, nframe)
+            return lambda: likelihood.SampleBlock(specimens, 2)
+        yield ('SampleBlock', size, setup)
+
+        def setup(nspecimen=nspecimen, nframe=nframe):
+            block = likelihood.SampleBlock(syntheticSpecimens(nspecimen, nframe), 2)
+            return lambda: block.logLikelihood('Lognormal', (0.3, 0.3), gradient=True)
+        yield ('logLikelihood', size, setup)
+
+        def setup(nspecimen=nspecimen, nframe=nframe):
+            block = likelihood.SampleBlock(syntheticSpecimens(nspecimen, nframe), 2)
+            n = int(numpy.sqrt(LIKELIHOOD_GRID))
+            (mu, sigma) = numpy.meshgrid(numpy.linspace(-0.5, 1.0, n),
+                                         numpy.linspace(0.1, 1.0, n))
+            params = (mu.ravel(), sigma.ravel())
+            return lambda: block.likelihoods('Lognormal', params)
+        yield ('likelihoodGrid', size, setup)
+    return
+
+def skippedKernels():
+    """
+    returns a dictionary of {kernel name: reason} of the kernels which
+    cannot be run in this environment
+    """
+    skipped = {}
+    if saveMAT.matlab is None:
+        skipped['_convert_dict_dtypes'] = 'the MATLAB engine is not installed'
+    return skipped
+
+def _sizeString(size):
+    """ returns a compact string of a size dictionary """
+    return ' '.join(['%s=%s' % (k, size[k]) for k in sorted(size.keys())])
+
+def runBenchmarks(quick=False, kernels=None, repeat=3, maxBytes=MAX_BENCH_BYTES,
+                  verbose=True):
+    """
+    runs the benchmarks (optionally only the kernels, sequence of names).
+    returns a dictionary of the 'environment', the 'results', a list
+    of dictionaries of the 'kernel', 'size', 'time', 'median' and
+    'peakBytes' of every case, and the 'skipped' kernels (see 
+    skippedKernels)
+    """
+    results = []
+    for (name, size, setup) in benchmarkCases(quick, maxBytes):
+        if kernels is not None and name not in kernels:
+            continue
+        kernel = setup()
+        result = {'kernel': name, 'size': size}
+        result.update(timeKernel(kernel, repeat))
+        results.append(result)
+        del kernel
+        if verbose:
+            print(formatResults([result], header=False))
+    skipped = dict([ (name, reason) for (name, reason) in skippedKernels().items()
+                     if kernels is None or name in kernels ])
+    if verbose:
+        for name in sorted(skipped):
+            print('%-22s skipped: %s' % (name, skipped[name]))
+    return {'environment': environment(), 'results': results, 'skipped': skipped}
+
+def environment():
+    """ returns a dictionary of the benchmark environment """
+    try:
+        commit = subprocess.check_output(['git', 'rev-parse', '--short', 'HEAD'],
+                                         cwd=os.path.dirname(os.path.abspath(__file__)),
+                                         stderr=subprocess.STDOUT)
+        commit = commit.decode('ascii').strip()
+    except (OSError, subprocess.CalledProcessError):
+        commit = None
+    return {'commit': commit, 'time': time.strftime('%Y-%m-%d %H:%M:%S'),
+            'python': platform.python_version(), 'numpy': numpy.__version__,
+            'platform': platform.platform(), 'processor': platform.processor()}
+
+def _resultsPath(name):
+    """ returns the file path of saved results (name or path) """
+    if not name.endswith('.json'):
+        name = name + '.json'
+    if os.path.dirname(name):
+        return name
+    return os.path.join(myPaths.benchmarkResults(), name)
+
+def saveResults(benchmarks, name):
+    """ saves benchmarks (see runBenchmarks) as JSON. returns the path """
+    path = _resultsPath(name)
+    if os.path.dirname(path) and not os.path.isdir(os.path.dirname(path)):
+        os.makedirs(os.path.dirname(path))
+    with open(path, 'w') as f:
+        json.dump(benchmarks, f, indent=1, sort_keys=True)
+    return path
+
+def loadResults(name):
+    """ returns the saved benchmarks (see saveResults) """
+    with open(_resultsPath(name), 'r') as f:
+        return json.load(f)
+
+def _megabytes(nbytes):
+    return '-' if nbytes is None else '%.1f' % (nbytes/2.0**20)
+
+def formatResults(results, header=True):
+    """ returns a string table of benchmark results """
+    lines = []
+    if header:
+        lines.append('%-22s %-36s %11s %11s %11s' % ('kernel', 'size', 'best [ms]',
+                                                   'median [ms]', 'peak [MB]'))
+    for r in results:
+        lines.append('%-22s %-36s %11.3f %11.3f %11s' % (r['kernel'], _sizeString(r['size']),
+                     r['time']*1e3, r['median']*1e3, _megabytes(r['peakBytes'])))
+    return '\n'.join(lines)
+
+def compareResults(old, new):
+    """
+    returns a string table comparing the benchmarks new to old (see
+    runBenchmarks). speedup > 1 means new is faster.
+    """
+    before = dict([ ((r['kernel'], _sizeString(r['size'])), r) for r in old['results'] ])
+    lines = ['%-22s %-36s %11s %11s %8s %11s' % ('kernel', 'size', 'old [ms]', 'new [ms]',
+                                                'speedup', 'peak [MB]')]
+    for r in new['results']:
+        key = (r['kernel'], _sizeString(r['size']))
+        if key not in before:
+            continue
+        b = before[key]
+        lines.append('%-22s %-36s %11.3f %11.3f %8.2f %11s' % (key[0], key[1],
+                     b['time']*1e3, r['time']*1e3, b['time']/max(r['time'], 1e-12),
+                     _megabytes(b['peakBytes']) + '>' + _megabytes(r['peakBytes'])))
+    lines.append('old: %s (%s), new: %s (%s)' % (old['environment']['commit'],
+                 old['environment']['time'], new['environment']['commit'],
+                 new['environment']['time']))
+    return '\n'.join(lines)
+
+#
+# script
+#
+if __name__ == '__main__':
+    import argparse
+    parser = argparse.ArgumentParser(description='FEM_VGPy kernel benchmarks')
+    parser.add_argument('--quick', action='store_true', help='small sizes only')
+    parser.add_argument('--kernels', default=None, help='comma separated kernel names')
+    parser.add_argument('--repeat', type=int, default=3, help='timed calls per case')
+    parser.add_argument('--max-bytes', type=int, default=MAX_BENCH_BYTES,
+                        help='largest input array (bytes)')
+    parser.add_argument('--save', default=None, help='save the results as name')
+    parser.add_argument('--compare', default=None, help='compare to the saved results name')
+    args = parser.parse_args()
+
+    kernels = None if args.kernels is None else args.kernels.split(',')
+    print(formatResults([], header=True))
+    benchmarks = runBenchmarks(args.quick, kernels, args.repeat, args.max_bytes)
+    if args.save is not None:
+        print('results saved to: ' + saveResults(benchmarks, args.save))
+    if args.compare is not None:
+        print('')
+        print(compareResults(loadResults(args.compare), benchmarks))
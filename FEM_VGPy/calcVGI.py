@@ -7,9 +7,10 @@ Calculates the Void Growth Index for micromechanical fracture
 
 # imports
 import numpy
+from instrumentation import instrumented
 
 # function definitions
-def __check_input_args(mises, pressure, PEEQ):
+def _check_input_args(mises, pressure, PEEQ):
     """ performs a rudimentary check on inputs """
     
     # rudimentary check on inputs
@@ -21,7 +22,19 @@ def __check_input_args(mises, pressure, PEEQ):
         raise Exception('calcVGI: inputs are not of type numpy.ndarray!')      
     return
 
-def calcMonotonicVGI(mises, pressure, PEEQ):
+def _check_out_arg(out, shape):
+    """ performs a rudimentary check on a caller-provided output buffer """
+    
+    if not isinstance(out, numpy.ndarray):
+        raise Exception('calcVGI: out is not of type numpy.ndarray!')
+    elif out.shape != shape:
+        raise Exception('calcVGI: out is not the same shape as the inputs!')
+    elif out.dtype.kind != 'f':
+        raise Exception('calcVGI: out must have a floating point dtype!')
+    return
+
+@instrumented('calcMonotonicVGI')
+def calcMonotonicVGI(mises, pressure, PEEQ, out=None, dtype=None):
     """
     Takes matrices of mises, pressure, PEEQ
     returns a matrix of monotonic VGI
@@ -31,48 +44,182 @@ def calcMonotonicVGI(mises, pressure, PEEQ):
     for rank-3 and higher arrays) are different "nodes"
     or other such distinctly different objects.
     
+    optional inputs:
+        out   = preallocated numpy.ndarray (same shape as the inputs)
+                in which to store the VGI. it may be the mises or
+                pressure array itself (which is then overwritten),
+                but it may NOT be the PEEQ array.
+        dtype = storage dtype of the VGI if out is not provided
+                (default = numpy.float64). numpy.float32 halves the
+                memory footprint at the cost of precision.
+    
+    the trapezoidal rule is evaluated as a cumulative sum along
+    the "history" axis, working in place on the output buffer.
+    only one temporary (one frame smaller than the inputs) is 
+    allocated. for float64 storage, the results are bit-identical 
+    to the original frame-by-frame loop.
+    
     Verified to produce accurate results: 09/21/2015
     """
     
     # check input args
-    __check_input_args(mises, pressure, PEEQ)
+    _check_input_args(mises, pressure, PEEQ)
     
-    # preallocate triax
-    triax = numpy.zeros(mises.shape, dtype=numpy.float64)
+    # obtain (or check) the output buffer
+    if out is None:
+        if dtype is None:
+            dtype = numpy.float64
+        out = numpy.empty(mises.shape, dtype=dtype)
+    else:
+        _check_out_arg(out, mises.shape)
+        if out is PEEQ:
+            raise Exception('calcVGI: out may not be the PEEQ array!')
+    
+    nrow = mises.shape[0]
+    if nrow == 0:
+        return out
+    
+    # calculate the stress triaxiality into out
+    # stress triaxiality is an element-wise divide of -pressure/mises
+    # skip first element (since division by zero), this will remain 0
+    # (the divide is done before the negation so out may alias mises)
+    numpy.divide(pressure[1:], mises[1:], out=out[1:])
+    numpy.negative(out[1:], out=out[1:])
+    
+    # calculate the integrand in place. 
+    # first row has zero triaxiality, so the integrand is exp(0) = 1
+    numpy.multiply(out[1:], 1.5, out=out[1:])
+    numpy.exp(out[1:], out=out[1:])
+    out[0] = 1.0
+    
+    # sum of adjacent integrands (the only temporary)
+    work = numpy.add(out[1:], out[:-1])
+    
+    # incremental VGI (trap rule numerical integration):
+    # dVGI = 0.5*(PEEQ[row] - PEEQ[row-1])*(integrand[row] + integrand[row-1])
+    numpy.subtract(PEEQ[1:], PEEQ[:-1], out=out[1:])
+    numpy.multiply(out[1:], 0.5, out=out[1:])
+    numpy.multiply(out[1:], work, out=out[1:])
+    del work
+    
+    # sum into VGI. the first row ("history" value) is zero.
+    out[0] = 0.0
+    numpy.cumsum(out, axis=0, out=out)
+    return out
+    
+def _cyclicIncrements(mises, pressure, PEEQ):
+    """
+    returns a tuple of (triax, dVGI, dPEEQ), where dVGI is the signed 
+    incremental VGI and dPEEQ is the incremental PEEQ. rows are the 
+    "history" values, and the first row (initial zero-frame) is zero.
+    """
     
     # calculate the stress triaxiality
     # stress triaxiality is an element-wise divide of -pressure/mises
     # skip first element (since division by zero), this will remain 0
+    triax = numpy.zeros(mises.shape, dtype=numpy.float64)
     triax[1:] = -pressure[1:]/mises[1:]
     
-    # calculate the integrand
-    integrand = numpy.exp(1.5*triax)
+    # calculate the integrand (with absolute value of triax)
+    integrand = numpy.exp(1.5*numpy.absolute(triax))
     
-    # preallocate
-    VGI  = numpy.zeros(mises.shape, dtype=numpy.float64)
-    nrow = mises.shape[0]
+    # incremental PEEQ and VGI (trap rule numerical integration)
+    # of the rows after the first, each with the integrand of the
+    # previous row (the first row is never summed with the last)
+    dPEEQ = numpy.zeros(mises.shape, dtype=numpy.float64)
+    dPEEQ[1:] = PEEQ[1:] - PEEQ[:-1]
+    dVGI = numpy.zeros(mises.shape, dtype=numpy.float64)
+    dVGI[1:] = 0.5 * dPEEQ[1:] * (integrand[1:] + integrand[:-1])
+    dVGI[1:] *= numpy.sign(triax[1:])
+    return (triax, dVGI, dPEEQ)
+
+def _cyclicScanNumPy(dVGI, VGI):
+    """
+    clamped running sum of dVGI into VGI (both rank-2).
+    scans the "history" rows, vectorized across the columns.
+    """
     
-    # trap rule numerical integration:
-    for row in range(1,nrow):
-        # for all rows ("history" values), except first row
-            
-        # incremental VGI
-        dVGI = 0.5*(PEEQ[row] - PEEQ[row-1])*(integrand[row] + integrand[row-1])
-        
+    VGI[0] = 0.0
+    for row in range(1, VGI.shape[0]):
         # sum into VGI
-        VGI[row] = VGI[row-1] + dVGI
+        numpy.add(VGI[row-1], dVGI[row], out=VGI[row])
+        # VGI can't be <= 0
+        numpy.copyto(VGI[row], 0.0, where=(VGI[row] <= 0.0))
     return VGI
+
+def _cyclicKernelNumba(mises, pressure, PEEQ, VGI, cumePEEQ):
+    """
+    fused (compiled) cyclic VGI kernel for rank-2 inputs. computes the
+    triaxiality, the clamped VGI running sum and the compression-only
+    damage in a single pass over the data.
+    """
     
-def calcCyclicVGI(mises, pressure, PEEQ):
+    nrow, ncol = VGI.shape
+    for col in range(ncol):
+        VGI[0,col]      = 0.0
+        cumePEEQ[0,col] = 0.0
+    
+    # integrand of the previous row. the first row has zero triaxiality
+    prevIntegrand = numpy.ones(ncol)
+    for row in range(1, nrow):
+        for col in range(ncol):
+            # stress triaxiality, and integrand with absolute value of triax
+            triax = -pressure[row,col]/mises[row,col]
+            integrand = numpy.exp(1.5*numpy.absolute(triax))
+            
+            # calculate incremental VGI (trap rule numerical integration)
+            dPEEQ = PEEQ[row,col] - PEEQ[row-1,col]
+            dVGI = 0.5 * dPEEQ * (integrand + prevIntegrand[col])
+            dVGI = dVGI * numpy.sign(triax)
+            prevIntegrand[col] = integrand
+            
+            # sum into VGI
+            value = VGI[row-1,col] + dVGI
+            if value <= 0.0:
+                # VGI can't be <= 0
+                value = 0.0
+            VGI[row,col] = value
+            
+            # calculate the corresponding damage
+            if triax < 0.0:
+                # compressive excursion, damage occurs
+                cumePEEQ[row,col] = cumePEEQ[row-1,col] + dPEEQ
+            else:
+                # tensile excursion, normal VGI behavior
+                cumePEEQ[row,col] = cumePEEQ[row-1,col]
+    return
+
+# the compiled kernel is optional
+try:
+    import numba
+    _cyclicKernelNumba = numba.njit(cache=True)(_cyclicKernelNumba)
+    HAS_NUMBA = True
+except ImportError:
+    HAS_NUMBA = False
+
+@instrumented('calcCyclicVGI')
+def calcCyclicVGI(mises, pressure, PEEQ, backend=None):
     """
-    Input: rank-2 matrices of mises, pressure, PEEQ.
+    Input: matrices of mises, pressure, PEEQ.
     
     Output: a tuple of
-    (rank-2 matrix of VGI, rank-2 matrix of cumulative damage PEEQ)
+    (matrix of VGI, matrix of cumulative damage PEEQ)
     
     input matrices must be ordered such that the rows are different
-    "history" values, and the columns are different "nodes"
-    or other such distinctly different objects.
+    "history" values, and the columns (or other dimensions, for 
+    rank-3 and higher arrays) are different "nodes" or other such 
+    distinctly different objects.
+    
+    optional input:
+        backend = 'numba' (fused compiled kernel) or 'numpy'.
+                  by default numba is used if it is installed.
+    
+    for the numpy backend, the increments are computed for all frames 
+    at once, and the cumulative damage PEEQ (compression-only) is a 
+    plain cumulative sum. only the clamped VGI running sum is scanned
+    frame by frame, vectorized across the columns. the numpy backend
+    is bit-identical to _calcCyclicVGI_reference(); the numba backend
+    agrees to within rounding (its exp() may differ in the last bit).
     
     This also works fine for monotonic loading, though it would
     perform unnecessary calcs and the cumulative damage PEEQ 
@@ -80,7 +227,52 @@ def calcCyclicVGI(mises, pressure, PEEQ):
     """
     
     # check input args
-    __check_input_args(mises, pressure, PEEQ)
+    _check_input_args(mises, pressure, PEEQ)
+    if backend is None:
+        backend = 'numba' if HAS_NUMBA else 'numpy'
+    elif backend == 'numba' and not HAS_NUMBA:
+        raise Exception('calcVGI: numba is not installed!')
+    elif backend not in ('numba', 'numpy'):
+        raise Exception('calcVGI: undefined backend ' + str(backend))
+    
+    nrow = mises.shape[0]
+    if nrow == 0:
+        return (numpy.zeros(mises.shape), numpy.zeros(mises.shape))
+    elif backend == 'numba':
+        # fused compiled kernel, working on rank-2 views of the data
+        VGI      = numpy.empty(mises.shape, dtype=numpy.float64)
+        cumePEEQ = numpy.empty(mises.shape, dtype=numpy.float64)
+        _cyclicKernelNumba(
+            numpy.asarray(mises, dtype=numpy.float64).reshape((nrow, -1)),
+            numpy.asarray(pressure, dtype=numpy.float64).reshape((nrow, -1)),
+            numpy.asarray(PEEQ, dtype=numpy.float64).reshape((nrow, -1)),
+            VGI.reshape((nrow, -1)), cumePEEQ.reshape((nrow, -1)) )
+        return (VGI, cumePEEQ)
+    
+    # calculate the increments for all frames
+    (triax, dVGI, dPEEQ) = _cyclicIncrements(mises, pressure, PEEQ)
+    
+    # calculate the corresponding damage
+    # only compressive excursions (triax < 0) accumulate damage
+    # (not a NaN triax, e.g. of zero stress, as the reference)
+    dPEEQ[~(triax < 0.0)] = 0.0
+    cumePEEQ = numpy.cumsum(dPEEQ, axis=0, out=dPEEQ)
+    del triax
+    
+    # calculate VGI. the scan works on rank-2 views of the data
+    VGI = numpy.empty(mises.shape, dtype=numpy.float64)
+    _cyclicScanNumPy(dVGI.reshape((nrow, -1)), VGI.reshape((nrow, -1)))
+    
+    return (VGI, cumePEEQ)
+
+def _calcCyclicVGI_reference(mises, pressure, PEEQ):
+    """
+    reference (scalar loop) implementation of calcCyclicVGI() for 
+    rank-2 matrices. very slow; only used to validate calcCyclicVGI().
+    """
+    
+    # check input args
+    _check_input_args(mises, pressure, PEEQ)
     
     # determine problem size
     nrow = mises.shape[0]
@@ -124,6 +316,148 @@ def calcCyclicVGI(mises, pressure, PEEQ):
                 # tensile excursion, normal VGI behavior
                 cumePEEQ[row,col] = cumePEEQ[row-1,col]
 
-    raise Exception('Damage cycle-counting has not been checked with Myers et al 2009')
     return (VGI, cumePEEQ)
 
+# class definitions
+class MonotonicVGIAccumulator(object):
+    """ a streaming (frame-by-frame) monotonic VGI calculator
+    
+    only the previous PEEQ and integrand of each point are kept
+    in memory (see UVARM/monovgi.for), so the entire "history" of 
+    mises, pressure and PEEQ is not needed at once. frames may be 
+    added one at a time, or as blocks of frames. the results are
+    bit-identical to calcMonotonicVGI() of the entire history.
+    
+    MonotonicVGIAccumulator(recordFrames=None, recordMax=False)
+    
+    Attributes:
+        recordFrames = optional iterable of (zero-based) frame indices
+                       for which the VGI of all points should be
+                       saved (e.g. the failure frames)
+        recordMax    = optional logical flag (default = False) to save
+                       the maximum VGI (over all points) of every frame
+        nframe       = number of frames consumed so far
+        VGI          = VGI of all points at the most recent frame
+        recorded     = dictionary of recorded VGI, keyed by frame index
+        maxHist      = list of the maximum VGI of every frame
+                       (only if recordMax is True)
+    """
+    
+    #
+    # Attributes (object initialization)
+    #
+    def __init__(self, recordFrames=None, recordMax=False):
+        """ return object with desired attributes """
+        
+        if recordFrames is None:
+            self.recordFrames = frozenset()
+        else:
+            self.recordFrames = frozenset([int(f) for f in recordFrames])
+        self.recordMax = recordMax
+        
+        # set from Methods
+        self.nframe   = 0
+        self.VGI      = None
+        self.recorded = {}
+        self.maxHist  = [] if recordMax else None
+        
+        # previous frame state
+        self._prevPEEQ      = None
+        self._prevIntegrand = None
+        return
+    
+    #
+    # Methods
+    #
+    def addFrame(self, mises, pressure, PEEQ):
+        """
+        add a single frame. inputs are arrays of mises, pressure, PEEQ
+        for all points (i.e. without the "history" dimension)
+        """
+        
+        self.addFrames(numpy.asarray(mises)[numpy.newaxis],
+                       numpy.asarray(pressure)[numpy.newaxis],
+                       numpy.asarray(PEEQ)[numpy.newaxis])
+        return
+    
+    def addFrames(self, mises, pressure, PEEQ):
+        """
+        add a block of frames. inputs are matrices of mises, pressure,
+        PEEQ ordered such that the rows are consecutive "history" 
+        values (see calcMonotonicVGI)
+        """
+        
+        # check input args
+        _check_input_args(mises, pressure, PEEQ)
+        if self.VGI is not None and mises.shape[1:] != self.VGI.shape:
+            raise Exception('calcVGI: frames do not match the previous frames!')
+        nrow = mises.shape[0]
+        if nrow == 0:
+            return
+        
+        # the first frame ever has zero triaxiality and zero VGI.
+        # otherwise, continue from the previous frame state
+        first = 1 if self.VGI is None else 0
+        if first:
+            self.VGI            = numpy.zeros(mises.shape[1:], dtype=numpy.float64)
+            self._prevPEEQ      = numpy.array(PEEQ[0], dtype=numpy.float64)
+            self._prevIntegrand = numpy.ones(mises.shape[1:], dtype=numpy.float64)
+        
+        # calculate the integrand (same operations as calcMonotonicVGI)
+        integrand = numpy.empty(mises.shape, dtype=numpy.float64)
+        integrand[0] = 1.0
+        numpy.divide(pressure[first:], mises[first:], out=integrand[first:])
+        numpy.negative(integrand[first:], out=integrand[first:])
+        numpy.multiply(integrand[first:], 1.5, out=integrand[first:])
+        numpy.exp(integrand[first:], out=integrand[first:])
+        
+        # incremental VGI (trap rule numerical integration)
+        dVGI = numpy.empty(mises.shape, dtype=numpy.float64)
+        numpy.subtract(PEEQ[0], self._prevPEEQ, out=dVGI[0])
+        numpy.subtract(PEEQ[1:], PEEQ[:-1], out=dVGI[1:])
+        numpy.multiply(dVGI, 0.5, out=dVGI)
+        dVGI[0]  *= integrand[0] + self._prevIntegrand
+        dVGI[1:] *= integrand[1:] + integrand[:-1]
+        
+        # sum into VGI, continuing from the previous frame
+        dVGI[0] += self.VGI
+        VGI = numpy.cumsum(dVGI, axis=0, out=dVGI)
+        
+        # record requested frames
+        for row in range(nrow):
+            if (self.nframe + row) in self.recordFrames:
+                self.recorded[self.nframe + row] = VGI[row].copy()
+        if self.recordMax:
+            self.maxHist.extend(VGI.reshape((nrow, -1)).max(axis=1).tolist())
+        
+        # save the state of the last frame
+        self.VGI            = VGI[-1].copy()
+        self._prevPEEQ      = numpy.array(PEEQ[-1], dtype=numpy.float64)
+        self._prevIntegrand = integrand[-1].copy()
+        self.nframe        += nrow
+        return
+    
+    def feed(self, mises, pressure, PEEQ):
+        """
+        add a block of frames from field variable objects (e.g. the
+        IntPtVariable objects of abaqus-odb-tools, after fetching), 
+        i.e. anything with a resultData attribute. plain arrays are
+        also accepted.
+        """
+        
+        self.addFrames(getattr(mises, 'resultData', mises),
+                       getattr(pressure, 'resultData', pressure),
+                       getattr(PEEQ, 'resultData', PEEQ))
+        return
+    
+    def recordedVGI(self):
+        """
+        returns a tuple of (frames, VGI), where frames is a sorted
+        tuple of the recorded frame indices, and VGI is an array of 
+        the recorded VGI (first dimension corresponds to frames)
+        """
+        
+        frames = tuple(sorted(self.recorded.keys()))
+        if not frames:
+            return (frames, None)
+        return (frames, numpy.array([self.recorded[f] for f in frames]))
@@ -0,0 +1,390 @@
+"""
+Maximum likelihood calibration of the failure distribution parameters,
+for homogeneous material properties with a deterministic l*. A python
+version of PredictFailure/Homogeneous/homog_optim_likelihood.m
+
+homog_optim_likelihood.m maximizes prod(lkhoods) using the Nelder-Mead
+simplex method, which underflows for large sets of samples. here, the
+log-likelihood and its exact gradient (see SampleBlock.logLikelihood)
+are used with a gradient-based method (default L-BFGS-B).
+
+    block  = SampleBlock(specimens, lstarIndex)
+    result = optimBlock(block, 'Lognormal')
+    print(formatBenchmark(benchmarkOptim(block, 'Lognormal')))
+
+the l* sweep (python version of driver_homog_optim.m) fits every l*
+candidate, sharing the packed samples and derivative operator:
+
+    (profile, best) = lstarSweep(specimens, 'Lognormal', processes=4)
+
+the parameter space map (python version of homog_param_space.m)
+evaluates a whole grid of distParams at once, in chunks:
+
+    (logLMap, best, profiles) = mapParamSpace(block, 'Lognormal', means, stdevs)
+"""
+
+#
+# imports
+#
+import time
+import copy
+import ctypes
+import multiprocessing
+import numpy
+from scipy import optimize
+from scipy import special
+from scipy import sparse
+from likelihood import SampleBlock, lstarBlocks, MAX_VGI_PREFIXES
+
+#
+# constants
+#
+
+# bounds of the distribution parameters (p1, p2). scale and shape
+# parameters must be positive.
+_POSITIVE = (1e-12, None)
+PARAM_BOUNDS = {'Normal'   : ((None, None), _POSITIVE),
+                'Lognormal': ((None, None), _POSITIVE),
+                'Weibull'  : (_POSITIVE, _POSITIVE),
+                'Gumbel'   : ((None, None), _POSITIVE)}
+
+# methods which do not use the gradient. these maximize prod(lkhoods),
+# the same objective as homog_optim_likelihood.m
+SIMPLEX_METHODS = ('Nelder-Mead',)
+
+# memory budget (bytes) of a chunk of the parameter space map
+MAP_CHUNK_BYTES = 2**27
+
+# ctypes of the numpy dtypes which are shared with sweep workers
+_CTYPES = {'f8': ctypes.c_double, 'i4': ctypes.c_int32, 'i8': ctypes.c_int64}
+
+# Euler-Mascheroni constant (mean of the standard Gumbel distribution)
+_EULER_GAMMA = 0.5772156649015329
+
+#
+# function defs
+#
+def initialParams(block, distType):
+    """
+    returns an initial guess of distParams (p1, p2), i.e. the moment
+    estimates from the VGI at the observed failures of a SampleBlock
+    """
+    VGI = block.failVGI
+    if distType == 'Lognormal':
+        VGI = numpy.log(numpy.maximum(VGI, 1e-12))
+    mean = numpy.mean(VGI)
+    std  = numpy.std(VGI)
+    if not std > 0.0:
+        std = max(abs(mean), 1.0)*0.1
+
+    if distType in ('Normal', 'Lognormal'):
+        return numpy.array([mean, std])
+    elif distType == 'Weibull':
+        # empirical shape from the coefficient of variation
+        B = max((std/mean)**-1.086, 0.1)
+        return numpy.array([mean/special.gamma(1.0 + 1.0/B), B])
+    elif distType == 'Gumbel':
+        beta = std*numpy.sqrt(6.0)/numpy.pi
+        return numpy.array([mean - _EULER_GAMMA*beta, beta])
+    raise Exception('calibration: undefined distType ' + str(distType))
+
+def _negLogLikelihood(distParams, block, distType):
+    """ objective (and gradient) of the gradient-based methods """
+    (logL, grad) = block.logLikelihood(distType, distParams, gradient=True)
+    return (-logL, -grad)
+
+def _negLikelihood(distParams, block, distType):
+    """ objective of the simplex methods (see homog_optim_likelihood.m) """
+    return -block.likelihood(distType, distParams)[0]
+
+def optimBlock(block, distType, params0=None, method='L-BFGS-B', options=None):
+    """
+    returns the scipy.optimize.OptimizeResult of the maximum likelihood
+    distParams (result.x) of a SampleBlock. result.nfev is the number of
+    likelihood evaluations.
+
+    optional inputs:
+        params0 = initial guess of distParams (default = initialParams)
+        method  = scipy.optimize.minimize method. SIMPLEX_METHODS maximize
+                  prod(lkhoods); all others maximize the log-likelihood
+                  using its gradient.
+        options = dictionary of scipy.optimize.minimize options
+    """
+    if params0 is None:
+        params0 = initialParams(block, distType)
+    params0 = numpy.asarray(params0, dtype=numpy.float64)
+
+    if method in SIMPLEX_METHODS:
+        if options is None:
+            # same as homog_optim_likelihood.m
+            options = {'maxiter': 1000, 'maxfev': 1000}
+        return optimize.minimize(_negLikelihood, params0, args=(block, distType),
+                                 method=method, options=options)
+
+    bounds = None
+    if method in ('L-BFGS-B', 'TNC', 'SLSQP', 'trust-constr'):
+        bounds = PARAM_BOUNDS[distType]
+    return optimize.minimize(_negLogLikelihood, params0, args=(block, distType),
+                             method=method, jac=True, bounds=bounds,
+                             options=options)
+
+def homogOptimLikelihood(specimens, lstarIndex, distType, params0=None,
+                         method='L-BFGS-B'):
+    """
+    returns the distParams (array) which achieve the highest likelihood
+    of observing the failure of specimens, for a deterministic l*
+    (zero-based lstarIndex) and homogeneous material properties.
+    see optimBlock()
+    """
+    block = SampleBlock(specimens, lstarIndex)
+    return optimBlock(block, distType, params0, method).x
+
+def benchmarkOptim(block, distType, params0=None,
+                   methods=('Nelder-Mead', 'L-BFGS-B', 'TNC')):
+    """
+    compare the optimization methods on a SampleBlock. returns a list
+    of dictionaries (one per method) with the 'method', 'nfev' (number
+    of likelihood evaluations), 'wallTime', 'distParams', 'logL' (of the
+    optimum) and 'success'.
+    """
+    if params0 is None:
+        params0 = initialParams(block, distType)
+
+    results = []
+    for method in methods:
+        tic = time.time()
+        res = optimBlock(block, distType, params0, method)
+        wallTime = time.time() - tic
+        results.append({'method': method, 'nfev': int(res.nfev),
+                        'wallTime': wallTime, 'distParams': res.x,
+                        'logL': block.logLikelihood(distType, res.x),
+                        'success': bool(res.success)})
+    return results
+
+def formatBenchmark(results):
+    """ returns a string table of benchmarkOptim results """
+    lines = ['%-14s %6s %10s %14s %24s' % ('method', 'nfev', 'wall [ms]',
+                                           'logL', 'distParams')]
+    for r in results:
+        lines.append('%-14s %6i %10.2f %14.6g %24s' % (r['method'], r['nfev'],
+                     r['wallTime']*1e3, r['logL'],
+                     '(%.5g, %.5g)' % tuple(r['distParams'])))
+    return '\n'.join(lines)
+
+def lstarCandidates(specimens):
+    """
+    returns a tuple of (lstarIndices, lstars) of the l* candidates of
+    specimens, i.e. the lstars of the (CT) specimens which have them 
+    (see CT.fetchDeterministicVGI), or the VGI columns of the others.
+    lstars is None if no specimen has the lstars attribute.
+    """
+    for s in specimens:
+        if getattr(s, 'lstars', None) is not None:
+            lstars = numpy.ravel(s.lstars)
+            return (list(range(lstars.shape[0])), lstars)
+    
+    ncol = 1
+    for s in specimens:
+        if not s.name.upper().startswith(MAX_VGI_PREFIXES):
+            VGI  = numpy.asarray(s.VGI)
+            ncol = max(ncol, VGI.reshape((VGI.shape[0], -1)).shape[1])
+    return (list(range(ncol)), None)
+
+def _sharedArray(value):
+    """ returns a tuple of (RawArray, dtype, shape) holding a copy of value """
+    value = numpy.ascontiguousarray(value)
+    dtype = value.dtype.str[1:]
+    raw   = multiprocessing.RawArray(_CTYPES[dtype], max(value.size, 1))
+    numpy.frombuffer(raw, dtype=dtype)[:value.size] = value.ravel()
+    return (raw, dtype, value.shape)
+
+def _fromShared(shared):
+    """ returns a numpy view (no copy) of a _sharedArray """
+    (raw, dtype, shape) = shared
+    size = int(numpy.prod(shape))
+    return numpy.frombuffer(raw, dtype=dtype)[:size].reshape(shape)
+
+# per-process state of the sweep and map workers
+_WORKER = {}
+
+def _initSweepWorker(template, operator, supportVGI, failVGI):
+    """ 
+    sweep worker initializer. the operator (CSR data, indices, indptr 
+    and shape) and the VGI of all l* are views of shared memory.
+    """
+    (data, indices, indptr, shape) = operator
+    _WORKER['template']   = template
+    _WORKER['operator']   = sparse.csr_matrix((_fromShared(data), _fromShared(indices),
+                                              _fromShared(indptr)), shape=shape, copy=False)
+    _WORKER['supportVGI'] = _fromShared(supportVGI)
+    _WORKER['failVGI']    = _fromShared(failVGI)
+    return
+
+def _likelihoodTemplate(block):
+    """
+    returns a (shallow) copy of a SampleBlock without the arrays which
+    are not needed to evaluate the likelihoods, to be sent to workers
+    """
+    template = copy.copy(block)
+    template.VGI = template.loadHist = template._fullOperator = None
+    return template
+
+def _sweepWorker(task):
+    """ sweep worker. fits the k^th l* candidate """
+    (k, distType, params0, method) = task
+    block = copy.copy(_WORKER['template'])
+    block.operator   = _WORKER['operator']
+    block.supportVGI = _WORKER['supportVGI'][:,k]
+    block.failVGI    = _WORKER['failVGI'][:,k]
+    return (k, _fitBlock(block, distType, params0, method))
+
+def _fitBlock(block, distType, params0, method):
+    """ returns a dictionary of the fit of a SampleBlock """
+    tic = time.time()
+    res = optimBlock(block, distType, params0, method)
+    return {'lstarIndex': block.lstarIndex, 'distParams': res.x,
+            'logL': float(block.logLikelihood(distType, res.x)),
+            'nfev': int(res.nfev), 'success': bool(res.success),
+            'wallTime': time.time() - tic}
+
+def lstarSweep(specimens, distType, lstarIndices=None, params0=None,
+               method='L-BFGS-B', processes=1):
+    """
+    fit the distParams of every l* candidate (a python version of 
+    driver_homog_optim.m). the samples are packed once, and the derivative
+    operator is shared by all candidates (see lstarBlocks). if processes
+    is greater than 1, the candidates are fit across a process pool,
+    and the operator and VGI are shared with the workers (not copied).
+    
+    returns a tuple of (profile, best), where profile is a list of 
+    dictionaries (one per l* candidate, in order) of the 'lstarIndex', 
+    'lstar', 'distParams', 'logL', 'nfev', 'success' and 'wallTime',
+    and best is the dictionary of the maximum logL.
+    
+    optional inputs:
+        lstarIndices = zero-based l* indices (default = lstarCandidates)
+        params0      = initial guess of distParams (default = initialParams)
+        method       = see optimBlock()
+        processes    = number of worker processes (default = 1)
+    """
+    specimens = list(specimens)
+    (candidates, lstars) = lstarCandidates(specimens)
+    if lstarIndices is None:
+        lstarIndices = candidates
+    blocks = lstarBlocks(specimens, lstarIndices)
+
+    processes = max(1, min(processes, len(blocks)))
+    if processes == 1:
+        profile = [_fitBlock(b, distType, params0, method) for b in blocks]
+    else:
+        # share the operator and the VGI of all candidates
+        op = blocks[0].operator
+        operator   = (_sharedArray(op.data), _sharedArray(op.indices),
+                      _sharedArray(op.indptr), op.shape)
+        supportVGI = _sharedArray(numpy.column_stack([b.supportVGI for b in blocks]))
+        failVGI    = _sharedArray(numpy.column_stack([b.failVGI for b in blocks]))
+        
+        # a template block without the arrays which are shared
+        template = _likelihoodTemplate(blocks[0])
+        template.operator = template.supportVGI = template.failVGI = None
+        
+        pool = multiprocessing.Pool(processes, _initSweepWorker,
+                                    (template, operator, supportVGI, failVGI))
+        try:
+            tasks   = [(k, distType, params0, method) for k in range(len(blocks))]
+            profile = [None]*len(blocks)
+            for (k, fit) in pool.imap_unordered(_sweepWorker, tasks):
+                fit['lstarIndex'] = blocks[k].lstarIndex
+                profile[k] = fit
+        finally:
+            pool.close()
+            pool.join()
+
+    for fit in profile:
+        fit['lstar'] = None if lstars is None else float(lstars[fit['lstarIndex']])
+    best = max(profile, key=lambda fit: fit['logL'])
+    return (profile, best)
+
+def formatSweep(profile):
+    """ returns a string table of an lstarSweep profile """
+    lines = ['%6s %10s %14s %24s %6s' % ('index', 'lstar', 'logL', 'distParams', 'nfev')]
+    for fit in profile:
+        lstar = '-' if fit['lstar'] is None else '%.4g' % fit['lstar']
+        lines.append('%6i %10s %14.6g %24s %6i' % (fit['lstarIndex'], lstar, fit['logL'],
+                     '(%.5g, %.5g)' % tuple(fit['distParams']), fit['nfev']))
+    return '\n'.join(lines)
+
+def _mapChunk(block, distType, P1, P2):
+    """ returns the logL of a chunk of the parameter space (P1, P2) """
+    return block.logLikelihood(distType, (P1, P2))
+
+def _initMapWorker(template):
+    """ map worker initializer """
+    _WORKER['template'] = template
+    return
+
+def _mapWorker(task):
+    """ map worker. returns (start, logL) of a chunk """
+    (start, distType, P1, P2) = task
+    return (start, _mapChunk(_WORKER['template'], distType, P1, P2))
+
+def mapParamSpace(block, distType, means, stdevs, maxBytes=MAP_CHUNK_BYTES,
+                  processes=1):
+    """
+    a map of the likelihood parameter space of a SampleBlock, i.e. the 
+    logL of every (means[m], stdevs[s]) pair of distParams. a python 
+    version of homog_param_space.m (which maps the likelihood, i.e.
+    exp(logL), but underflows for large sets).
+    
+    all grid points are evaluated at once, in chunks of about maxBytes
+    of temporary memory. if processes is greater than 1, the chunks are
+    evaluated across a process pool.
+    
+    returns a tuple of (logLMap, best, profiles), where:
+        logLMap  = array (len(means), len(stdevs)) of the logL
+        best     = tuple of (bestLogL, bestmean, beststdev)
+        profiles = tuple of the profile logL's of the means (maximum 
+                   over the stdevs), and of the stdevs (maximum over 
+                   the means)
+    """
+    means  = numpy.ravel(numpy.asarray(means, dtype=numpy.float64))
+    stdevs = numpy.ravel(numpy.asarray(stdevs, dtype=numpy.float64))
+    P1 = numpy.repeat(means, stdevs.shape[0])
+    P2 = numpy.tile(stdevs, means.shape[0])
+    
+    # temporary memory of a grid point: CDF (and log) of the support
+    # VGI, and the likelihoods of the observed failures
+    perPoint = 8*(3*block.supportVGI.shape[0] + 2*block.nfail)
+    chunk    = max(1, int(maxBytes//perPoint))
+    starts   = list(range(0, P1.shape[0], chunk))
+    
+    logL = numpy.empty(P1.shape, dtype=numpy.float64)
+    processes = max(1, min(processes, len(starts)))
+    if processes == 1:
+        for a in starts:
+            logL[a:a+chunk] = _mapChunk(block, distType, P1[a:a+chunk], P2[a:a+chunk])
+    else:
+        pool = multiprocessing.Pool(processes, _initMapWorker,
+                                    (_likelihoodTemplate(block),))
+        try:
+            tasks = [(a, distType, P1[a:a+chunk], P2[a:a+chunk]) for a in starts]
+            for (a, values) in pool.imap_unordered(_mapWorker, tasks):
+                logL[a:a+chunk] = values
+        finally:
+            pool.close()
+            pool.join()
+    
+    logLMap = logL.reshape((means.shape[0], stdevs.shape[0]))
+    (m, s) = numpy.unravel_index(numpy.argmax(logLMap), logLMap.shape)
+    best     = (logLMap[m,s], means[m], stdevs[s])
+    profiles = (logLMap.max(axis=1), logLMap.max(axis=0))
+    return (logLMap, best, profiles)
+
+def homogParamSpace(specimens, lstarIndex, distType, means, stdevs, 
+                    maxBytes=MAP_CHUNK_BYTES, processes=1):
+    """ 
+    map of the likelihood parameter space of specimens, for a 
+    deterministic l* (zero-based lstarIndex). see mapParamSpace()
+    """
+    block = SampleBlock(specimens, lstarIndex)
+    return mapParamSpace(block, distType, means, stdevs, maxBytes, processes)
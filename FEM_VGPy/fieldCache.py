@@ -0,0 +1,539 @@
+"""
+Caches of fetched ODB data (abaqus-odb-tools objects), shared by all 
+specimen classes. Repeated fetches of the same field are served from 
+memory (per-process) or from a persistent on-disk cache, instead of 
+re-reading the ODB.
+"""
+
+#
+# imports
+#
+import numpy
+import os
+import json
+import re
+import hashlib
+import myPaths
+from collections import OrderedDict
+
+#
+# function defs
+#
+def _nbytes(obj):
+    """ returns the number of bytes held by the numpy arrays of obj """
+    nbytes = 0
+    for value in vars(obj).values():
+        if isinstance(value, numpy.ndarray):
+            nbytes += value.nbytes
+    return nbytes
+
+def _sha1(text):
+    """ returns the hex sha1 digest of a string """
+    return hashlib.sha1(text.encode('utf-8')).hexdigest()
+
+def odbName(odbPath):
+    """ 
+    returns the file name of an ODB path (or name), i.e. without its
+    directory (of either path separator). fetches of the same ODB are
+    matched by it, since some are by the ODB path and some by its name
+    """
+    return re.split(r'[\\/]', str(odbPath))[-1]
+
+def odbFingerprint(odbPath):
+    """
+    returns a tuple of (absolute path, size, mtime) of the ODB file,
+    or None if the file cannot be found
+    """
+    try:
+        stat = os.stat(odbPath)
+    except (OSError, IOError):
+        return None
+    return (os.path.abspath(odbPath), stat.st_size, int(stat.st_mtime))
+
+def fieldKey(varClass, args, methods):
+    """
+    returns the (hashable) cache key of a fetch. e.g. for
+    IntPtVariable(odbPath, 'PEEQ', setName).fetchNodalAverage()
+    the key is:
+    ('IntPtVariable', (odbPath, 'PEEQ', setName), ('fetchNodalAverage',))
+    """
+    return (varClass.__name__, tuple(args), tuple(methods))
+
+def _odbPathOf(key):
+    """ 
+    returns the absolute ODB path of a memory cache key of FieldCache,
+    i.e. of the fingerprint, or of the first argument of the fetch
+    """
+    (field, fingerprint) = key
+    if fingerprint is not None:
+        return fingerprint[0]
+    return os.path.abspath(str(field[1][0])) if field[1] else None
+
+def _raggedArrays(name, values):
+    """
+    returns a dictionary of the (numeric) arrays of a ragged sequence of
+    arrays: the concatenated data, and the shapes of the elements
+    """
+    values = [numpy.asarray(v) for v in values]
+    if any([v.dtype.kind == 'O' for v in values]) or len(set([v.ndim for v in values])) > 1:
+        raise ValueError('fieldCache: ' + name + ' cannot be saved (nested objects)')
+    ndim = values[0].ndim if values else 1
+    return {name: numpy.concatenate([v.ravel() for v in values]) if values else numpy.zeros(0),
+            name + '__shapes': numpy.array([v.shape for v in values], 
+                                           dtype=numpy.int64).reshape((-1, ndim))}
+
+def _fromRagged(archive, name):
+    """ returns an object array of the ragged arrays of _raggedArrays """
+    data   = archive[name]
+    shapes = archive[name + '__shapes']
+    ends   = numpy.cumsum(numpy.prod(shapes, axis=1, dtype=numpy.int64))
+    value  = numpy.empty(shapes.shape[0], dtype=object)
+    for (i, shape) in enumerate(shapes):
+        start = ends[i-1] if i > 0 else 0
+        value[i] = data[start:ends[i]].reshape(tuple(shape))
+    return value
+
+def writeRecord(path, obj):
+    """
+    save the data attributes (arrays, lists, tuples and scalars) of a
+    fetched object to the compressed numpy (.npz) file path. object 
+    (e.g. ragged) arrays and sequences are saved as their concatenated
+    data and element shapes, so that no record needs to be unpickled.
+    """
+    arrays = {}
+    kinds  = {}
+    for (name, value) in vars(obj).items():
+        if name.startswith('_'):
+            continue
+        elif isinstance(value, numpy.ndarray):
+            kind = 'array'
+        elif isinstance(value, (list, tuple)):
+            kind = type(value).__name__
+        elif isinstance(value, (str, int, float, bool)):
+            kinds[name]  = 'scalar'
+            arrays[name] = numpy.asarray(value)
+            continue
+        else:
+            # e.g. None, or ODB objects. don't save.
+            continue
+        
+        try:
+            data = numpy.asarray(value)
+        except ValueError:
+            # (ragged sequences, for numpy >= 1.24)
+            data = None
+        if data is None or data.dtype.kind == 'O':
+            arrays.update(_raggedArrays(name, value))
+            kinds[name] = 'ragged-' + kind
+        else:
+            arrays[name] = data
+            kinds[name]  = kind
+    arrays['__kinds__'] = numpy.array(json.dumps(kinds))
+    
+    # write to a temporary file first, so that a partially written
+    # file is never mistaken for a saved record
+    tmpPath = path[:-4] + '.tmp'
+    try:
+        with open(tmpPath, 'wb') as f:
+            numpy.savez_compressed(f, **arrays)
+    except Exception:
+        if os.path.isfile(tmpPath):
+            os.remove(tmpPath)
+        raise
+    if os.path.isfile(path):
+        os.remove(path)
+    os.rename(tmpPath, path)
+    return
+
+def readRecord(path):
+    """ returns a dictionary of the attributes saved by writeRecord """
+    archive = numpy.load(path)
+    try:
+        kinds = json.loads(str(archive['__kinds__']))
+        attributes = {}
+        for (name, kind) in kinds.items():
+            if kind.startswith('ragged-'):
+                value = _fromRagged(archive, name)
+                kind  = kind[len('ragged-'):]
+            else:
+                value = archive[name]
+            if kind == 'scalar':
+                value = value.item()
+            elif kind in ('list', 'tuple'):
+                value = value.tolist()
+                if kind == 'tuple':
+                    value = tuple(value)
+            attributes[str(name)] = value
+    finally:
+        archive.close()
+    return attributes
+
+#
+# class definitions
+#
+class FieldRecord(object):
+    """ 
+    a read-only stand-in for a fetched object, restored from the on-disk
+    cache. it has the same (data) attributes as the fetched object, e.g.
+    resultData, nodeLabels, elementLabels, nodesCoords, etc.
+    """
+    def __init__(self, className, attributes):
+        self.__dict__.update(attributes)
+        self.recordOf = className
+        return
+        
+    def __repr__(self):
+        return 'FieldRecord(' + self.recordOf + ')'
+
+class DiskFieldCache(object):
+    """ a persistent on-disk cache of fetched ODB data
+
+    DiskFieldCache(cacheDir, maxBytes=20*1024**3)
+    
+    every fetched object is saved as a compressed numpy (.npz) file.
+    files are keyed by the fetch (see fieldKey) and the ODB fingerprint
+    (path, size, mtime), such that a re-run ODB is never served stale
+    data. when the cache grows beyond maxBytes, the least-recently-used 
+    files are deleted. the size of the cache is counted once, and then
+    kept up to date by the saves, so that the cache directory is only
+    walked when it is over maxBytes.
+
+    Attributes:
+        cacheDir = string location of the cache directory
+        maxBytes = maximum size of the cache directory (bytes)
+        hits     = number of fetches served from disk
+        misses   = number of fetches not found on disk
+    """
+
+    #
+    # Attributes (object initialization)
+    #
+    def __init__(self, cacheDir, maxBytes=20*1024**3):
+        """ return object with desired attributes """
+        
+        self.cacheDir = cacheDir
+        self.maxBytes = maxBytes
+        
+        # set from Methods
+        self.hits   = 0
+        self.misses = 0
+        self._nbytes = None # size of the cache directory (once counted)
+        return
+
+    #
+    # Methods
+    #
+    def _odbDir(self, odbPath):
+        """ returns the cache subdirectory of an ODB """
+        return os.path.join(self.cacheDir, 
+                            _sha1(os.path.abspath(odbPath))[:16])
+
+    def _filePath(self, key):
+        """ 
+        returns the file path of key, or None if the ODB (first 
+        argument of the fetch) cannot be found
+        """
+        odbPath     = key[1][0]
+        fingerprint = odbFingerprint(odbPath)
+        if fingerprint is None:
+            return None
+        fname = _sha1(repr(key))[:20] + '_' + _sha1(repr(fingerprint))[:8] + '.npz'
+        return os.path.join(self._odbDir(odbPath), fname)
+
+    def load(self, key):
+        """ returns the FieldRecord of key, or None if it is not cached """
+        
+        path = self._filePath(key)
+        if path is None or not os.path.isfile(path):
+            self.misses += 1
+            return None
+        
+        try:
+            attributes = readRecord(path)
+        except Exception:
+            # unreadable (e.g. partially written) file. ignore it.
+            self.misses += 1
+            return None
+        
+        # touch, such that the file is recently used
+        os.utime(path, None)
+        self.hits += 1
+        return FieldRecord(key[0], attributes)
+
+    def save(self, key, obj):
+        """ save the (data) attributes of a fetched object to disk """
+        
+        path = self._filePath(key)
+        if path is None:
+            return
+        
+        if self._nbytes is None:
+            self._nbytes = self.size()
+        
+        # remove stale files of the same fetch (i.e. the ODB was re-run)
+        odbDir = os.path.dirname(path)
+        prefix = os.path.basename(path).split('_')[0]
+        if os.path.isdir(odbDir):
+            for fname in os.listdir(odbDir):
+                if fname.startswith(prefix):
+                    self._nbytes -= os.path.getsize(os.path.join(odbDir, fname))
+                    os.remove(os.path.join(odbDir, fname))
+        else:
+            os.makedirs(odbDir)
+        
+        writeRecord(path, obj)
+        self._nbytes += os.path.getsize(path)
+        if self.maxBytes is not None and self._nbytes > self.maxBytes:
+            self.prune()
+        return
+
+    def size(self):
+        """ returns the size of the cache directory (bytes) """
+        return sum([f[2] for f in self._files()])
+
+    def _files(self):
+        """ returns a list of (path, mtime, size) of all cached files """
+        files = []
+        if not os.path.isdir(self.cacheDir):
+            return files
+        for (dirpath, _, fnames) in os.walk(self.cacheDir):
+            for fname in fnames:
+                if fname.endswith('.npz'):
+                    path = os.path.join(dirpath, fname)
+                    stat = os.stat(path)
+                    files.append((path, stat.st_mtime, stat.st_size))
+        return files
+
+    def prune(self):
+        """ delete least-recently-used files until within maxBytes """
+        
+        files = sorted(self._files(), key=lambda f: f[1])
+        total = sum([f[2] for f in files])
+        for (path, _, nbytes) in files:
+            if self.maxBytes is None or total <= self.maxBytes:
+                break
+            os.remove(path)
+            total -= nbytes
+        self._nbytes = total
+        return
+
+    def invalidate(self, odbPath=None):
+        """
+        delete all cached files (of odbPath, if it is given, including
+        the fetches by its ODB name, see odbName)
+        """
+        
+        if odbPath is None:
+            roots = [self.cacheDir]
+        else:
+            roots = set([self._odbDir(odbPath), self._odbDir(odbName(odbPath))])
+        for root in roots:
+            if not os.path.isdir(root):
+                continue
+            for (dirpath, _, fnames) in os.walk(root, topdown=False):
+                for fname in fnames:
+                    os.remove(os.path.join(dirpath, fname))
+                if dirpath != self.cacheDir:
+                    os.rmdir(dirpath)
+        self._nbytes = None
+        return
+
+class FieldCache(object):
+    """ a size-bounded, least-recently-used cache of fetched ODB data
+
+    FieldCache(maxBytes=2*1024**3, maxEntries=None, disk=None)
+
+    Attributes:
+        maxBytes   = maximum number of bytes (of numpy arrays) to hold.
+                     fetched objects which are larger are not cached.
+        maxEntries = optional maximum number of cached objects
+        disk       = optional DiskFieldCache, which is checked before
+                     reading from the ODB (and saved to after reading)
+        hits       = number of fetches served from the cache
+        misses     = number of fetches read from the ODB
+        evictions  = number of cached objects evicted
+        nbytes     = number of bytes currently held
+        diskErrors = number of fetched objects which could not be saved
+                     to disk (see self._save)
+    """
+
+    #
+    # Attributes (object initialization)
+    #
+    def __init__(self, maxBytes=2*1024**3, maxEntries=None, disk=None):
+        """ return object with desired attributes """
+
+        self.maxBytes   = maxBytes
+        self.maxEntries = maxEntries
+        self.disk       = disk
+
+        # set from Methods
+        self.hits      = 0
+        self.misses    = 0
+        self.evictions  = 0
+        self.nbytes     = 0
+        self.diskErrors = 0
+        self._entries   = OrderedDict() # key: (object, nbytes)
+        return
+
+    def __len__(self):
+        return len(self._entries)
+
+    def __contains__(self, key):
+        return key in self._entries
+
+    #
+    # Methods
+    #
+    def fetch(self, varClass, args, methods):
+        """
+        returns the fetched object varClass(*args), where each of the
+        methods (names, in order) has already been called. e.g.
+
+        cache.fetch(IntPtVariable, (odbPath, 'PEEQ', setName),
+                    ('fetchNodalAverage',))
+
+        the returned object is shared by all callers, so it (and its
+        arrays) must be treated as read-only. objects are cached in
+        memory under (fieldKey, odbFingerprint), such that a re-run 
+        ODB is never served stale data.
+        """
+
+        field = fieldKey(varClass, args, methods)
+        key   = (field, odbFingerprint(args[0]))
+        obj   = self.get(key)
+        if obj is not None:
+            return obj
+
+        # not cached in memory; try the disk, then read from the ODB
+        self.misses += 1
+        if self.disk is not None:
+            obj = self.disk.load(field)
+        if obj is None:
+            obj = varClass(*args)
+            for method in methods:
+                getattr(obj, method)()
+            if self.disk is not None:
+                self._save(field, obj)
+        self.put(key, obj)
+        return obj
+
+    def _save(self, key, obj):
+        """
+        save a fetched object to the on-disk cache. the data was read
+        successfully, so a failed save (e.g. a full disk, or attributes
+        which cannot be saved) only prints a warning, and the object is
+        cached in memory only.
+        """
+        try:
+            self.disk.save(key, obj)
+        except (IOError, OSError, ValueError, TypeError) as err:
+            self.diskErrors += 1
+            print('\n!! WARNING: fieldCache: ' + key[0] + str(key[1][1:]) + 
+                  ' is not saved to the on-disk cache (' + str(err) + ') !!\n')
+        return
+
+    def get(self, key):
+        """ returns the cached object of key (or None), and counts a hit """
+
+        if key not in self._entries:
+            return None
+
+        # move to the most-recently-used position
+        entry = self._entries.pop(key)
+        self._entries[key] = entry
+        self.hits += 1
+        return entry[0]
+
+    def put(self, key, obj):
+        """ cache obj under key, evicting the least-recently-used objects """
+
+        nbytes = _nbytes(obj)
+        if key in self._entries:
+            self.nbytes -= self._entries.pop(key)[1]
+        if self.maxBytes is not None and nbytes > self.maxBytes:
+            # too large to be cached at all
+            return
+
+        self._entries[key] = (obj, nbytes)
+        self.nbytes += nbytes
+
+        # evict least-recently-used objects (but never the newest)
+        while len(self._entries) > 1 and (
+                (self.maxBytes is not None and self.nbytes > self.maxBytes) or
+                (self.maxEntries is not None and len(self._entries) > self.maxEntries) ):
+            (_, (_, oldBytes)) = self._entries.popitem(last=False)
+            self.nbytes    -= oldBytes
+            self.evictions += 1
+        return
+
+    def invalidate(self, odbPath=None):
+        """ 
+        remove all cached objects (of odbPath, if it is given), 
+        from memory and from disk. fetches by the ODB path and by the 
+        ODB name (see odbName, which is relative to the working 
+        directory) are both removed, but not those of a same-named ODB
+        in another directory.
+        """
+
+        if odbPath is not None:
+            paths = set([os.path.abspath(odbPath), os.path.abspath(odbName(odbPath))])
+        for key in list(self._entries.keys()):
+            if odbPath is None or _odbPathOf(key) in paths:
+                self.nbytes -= self._entries.pop(key)[1]
+        if self.disk is not None:
+            self.disk.invalidate(odbPath)
+        return
+
+    def clear(self):
+        """ remove all cached objects and reset the counters """
+
+        self._entries.clear()
+        self.hits       = 0
+        self.misses     = 0
+        self.evictions  = 0
+        self.nbytes     = 0
+        self.diskErrors = 0
+        return
+
+    def stats(self):
+        """ returns a dictionary of the cache statistics """
+        stats = {'hits':self.hits, 'misses':self.misses,
+                 'evictions':self.evictions, 'entries':len(self._entries),
+                 'nbytes':self.nbytes, 'maxBytes':self.maxBytes}
+        if self.disk is not None:
+            stats['diskHits']   = self.disk.hits
+            stats['diskMisses'] = self.disk.misses
+            stats['diskErrors'] = self.diskErrors
+        return stats
+
+#
+# the shared (per-process) cache, backed by the on-disk cache
+#
+if myPaths.fieldCache() is None:
+    FIELD_CACHE = FieldCache()
+else:
+    FIELD_CACHE = FieldCache(disk=DiskFieldCache(myPaths.fieldCache()))
+
+def fetchField(varClass, args, methods):
+    """ fetch through the shared cache. see FieldCache.fetch() """
+    return FIELD_CACHE.fetch(varClass, args, methods)
+
+def setDiskCache(cacheDir, maxBytes=20*1024**3):
+    """
+    set the on-disk cache directory (and size limit) of the shared
+    cache. a cacheDir of None disables the on-disk cache.
+    """
+    if cacheDir is None:
+        FIELD_CACHE.disk = None
+    else:
+        FIELD_CACHE.disk = DiskFieldCache(cacheDir, maxBytes)
+    return
+
+def invalidate(odbPath=None):
+    """ 
+    remove all cached data (of odbPath, if it is given) from the 
+    shared cache, in memory and on disk
+    """
+    FIELD_CACHE.invalidate(odbPath)
+    return
@@ -0,0 +1,169 @@
+"""
+Numerical differentiation on non-uniform grids using Fornberg's
+algorithm. A (vectorized) python version of PredictFailure/mderiv_fornberg.m
+
+    B. Fornberg, "Calculation of weights in finite difference formulas",
+    SIAM Review 40 (1998), pp. 685-691.
+"""
+
+#
+# imports
+#
+import numpy
+
+#
+# constants
+#
+
+# default (interior) stencil width. interior points use centered
+# stencils of STENCIL_WIDTH points, and boundary points use one-sided
+# stencils of STENCIL_WIDTH+1 points (same as mderiv_fornberg.m)
+STENCIL_WIDTH = 5
+
+#
+# function defs
+#
+def fornbergWeights(m, xbar, x):
+    """
+    returns the finite difference weights c of the m^th derivative at
+    xbar, based on the grid values at points x. i.e. sum(c*u(x)) is the
+    approximation of the m^th derivative of u at xbar.
+
+    vectorized: x may be an array of shape (..., n) with xbar of
+    shape (...), in which case c is of shape (..., n).
+
+    Requires n > m. The x values need not be equally spaced,
+    but must be distinct.
+    """
+    x    = numpy.asarray(x, dtype=numpy.float64)
+    xbar = numpy.asarray(xbar, dtype=numpy.float64)
+    n    = x.shape[-1]
+    if m >= n:
+        raise Exception('fornberg: length(x) must be larger than m')
+
+    # C[..., i, s] is the weight of x[i] for the s^th derivative
+    C = numpy.zeros(x.shape + (m+1,), dtype=numpy.float64)
+    C[...,0,0] = 1.0
+    c1 = 1.0
+    c4 = x[...,0] - xbar
+    for i in range(1, n):
+        mn = min(i, m)
+        c2 = 1.0
+        c5 = c4
+        c4 = x[...,i] - xbar
+        for j in range(i):
+            c3 = x[...,i] - x[...,j]
+            c2 = c2*c3
+            if j == i-1:
+                for s in range(mn, 0, -1):
+                    C[...,i,s] = c1*(s*C[...,i-1,s-1] - c5*C[...,i-1,s])/c2
+                C[...,i,0] = -c1*c5*C[...,i-1,0]/c2
+            for s in range(mn, 0, -1):
+                C[...,j,s] = (c4*C[...,j,s] - s*C[...,j,s-1])/c3
+            C[...,j,0] = c4*C[...,j,0]/c3
+        c1 = c2
+    return C[...,m]
+
+def stencilIndices(nx, width=STENCIL_WIDTH):
+    """
+    returns an int array (nx, width+1) of the grid indices used for the
+    derivative at every point. for the default width (5), these are the 
+    same stencils as mderiv_fornberg.m. interior points repeat their 
+    last index in the (unused) last column.
+    """
+    if width < 3 or width % 2 == 0:
+        raise Exception('fornberg: stencil width must be odd and >= 3')
+    if nx < width + 1:
+        raise Exception('fornberg: length(X) must be equal to or greater than ' + 
+                        str(width + 1))
+    half = width//2
+    idx  = numpy.empty((nx, width + 1), dtype=numpy.intp)
+
+    # low boundary points, and upper boundary points
+    idx[:half]  = numpy.arange(width + 1)
+    idx[-half:] = numpy.arange(nx - width - 1, nx)
+
+    # interior points (centered stencils)
+    interior = numpy.arange(half, nx - half)
+    idx[half:nx-half,:width] = interior[:,numpy.newaxis] + numpy.arange(-half, half + 1)
+    idx[half:nx-half,width]  = interior + half
+    return idx
+
+def derivWeights(m, X, width=STENCIL_WIDTH, rows=None):
+    """
+    returns a tuple (idx, w) of the stencil indices and the weights of
+    the m^th derivative at every point of the (sorted) grid X, such that
+    du = sum(w*u[idx], axis=-1)
+    
+    optional inputs:
+        width = interior stencil width (odd). default = 5
+        rows  = sequence of the point indices at which the derivative 
+                is needed (default = all points)
+    """
+    X   = numpy.ravel(numpy.asarray(X, dtype=numpy.float64))
+    idx = stencilIndices(X.shape[0], width)
+    if rows is None:
+        rows = numpy.arange(X.shape[0])
+    else:
+        rows = numpy.asarray(rows, dtype=numpy.intp).ravel()
+    idx = idx[rows]
+    w   = numpy.zeros(idx.shape, dtype=numpy.float64)
+    
+    # boundary points use all stencil points, and
+    # interior points use the first width stencil points
+    half     = width//2
+    boundary = (rows < half) | (rows >= X.shape[0] - half)
+    w[boundary]  = fornbergWeights(m, X[rows[boundary]], X[idx[boundary]])
+    w[~boundary,:width] = fornbergWeights(m, X[rows[~boundary]], X[idx[~boundary,:width]])
+    return (idx, w)
+
+def derivMatrix(m, X, width=STENCIL_WIDTH, rows=None):
+    """
+    returns the sparse (banded) differentiation matrix D of the m^th
+    derivative on the (sorted) grid X, such that du = D*u. u may be a
+    vector, or a matrix whose rows correspond to X (i.e. any number
+    of vectors can be differentiated at once).
+    
+    D is a scipy.sparse.csr_matrix of shape (len(rows), len(X)).
+    see derivWeights() for the optional inputs. rows may also be 
+    fractional (e.g. sub-frame positions), in which case the rows are
+    linearly interpolated between the bracketing points.
+    """
+    from scipy import sparse
+    
+    X = numpy.ravel(X)
+    if rows is not None and numpy.asarray(rows).dtype.kind == 'f':
+        rows = numpy.ravel(rows)
+        lo = numpy.clip(numpy.floor(rows).astype(numpy.intp), 0, X.shape[0] - 1)
+        hi = numpy.minimum(lo + 1, X.shape[0] - 1)
+        t  = rows - lo
+        D  = (sparse.diags(1.0 - t).dot(derivMatrix(m, X, width, lo)) + 
+              sparse.diags(t).dot(derivMatrix(m, X, width, hi)))
+        D  = D.tocsr()
+        D.eliminate_zeros()
+        return D
+    (idx, w) = derivWeights(m, X, width, rows)
+    nrow = idx.shape[0]
+    D = sparse.csr_matrix((w.ravel(), idx.ravel(), 
+                           numpy.arange(0, w.size + 1, w.shape[1])), 
+                          shape=(nrow, X.shape[0]))
+    # the padded (zero weight) stencil entries are summed into
+    # the last interior stencil point, so there is nothing to remove
+    D.sum_duplicates()
+    return D
+
+def mderivFornberg(m, X, u):
+    """
+    returns the m^th derivative of u, defined on the set of (sorted)
+    points X. u may be a vector, or a matrix whose rows correspond
+    to X (in which case every column is differentiated).
+
+    Requires m < length(X), and length(X) >= 6
+    """
+    u = numpy.asarray(u, dtype=numpy.float64)
+    (idx, w) = derivWeights(m, X)
+    if u.shape[0] != idx.shape[0]:
+        raise Exception('fornberg: length(x) must be equal length(u)')
+    if u.ndim == 1:
+        return numpy.sum(w*u[idx], axis=-1)
+    return numpy.einsum('ik,ik...->i...', w, u[idx])
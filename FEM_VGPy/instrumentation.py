@@ -0,0 +1,309 @@
+"""
+Opt-in, per-stage timing and memory instrumentation of the specimen
+pipeline (ODB extraction, VGI integration, failure index search, MAT
+saving, etc.).
+
+Instrumentation is enabled by setting the environment variable
+VGPY_INSTRUMENT to the path of a JSON lines file, or by the context
+manager
+
+    with instrumentation.instrument('C:\\Temp\\VGPy_stages.jsonl'):
+        batchRunner.runBatch('manifest.json')
+    print(instrumentation.formatSummary(
+              instrumentation.summarize('C:\\Temp\\VGPy_stages.jsonl')))
+
+every stage appends one JSON line (record) to the file, of the keys
+
+    'stage'    = string name of the stage (e.g. 'fetch', 'VGI')
+    'specimen' = string name of the specimen (None if not known)
+    'parent'   = string name of the enclosing stage (None if outermost)
+    'wallTime' = wall time of the stage [s], including nested stages
+    'bytes'    = bytes of the arrays fetched, computed or saved
+    'cached'   = (fetch stages only) True if the fetch was served from
+                 the memory cache (of 0 bytes), see fieldCache
+    'shapes'   = array shapes of the stage output
+    'peakRSS'  = peak resident memory of the process [bytes] at the end
+                 of the stage (None if not available)
+    'pid'      = process id, 'time' = (unix) time at the end of the stage
+
+the environment variable is inherited by (batchRunner) worker processes,
+which append to the same file. when not enabled, stages cost a single
+environment lookup.
+"""
+
+#
+# imports
+#
+import os
+import sys
+import json
+import time
+import functools
+import numpy
+try:
+    import resource
+except ImportError:
+    # windows
+    resource = None
+
+#
+# constants
+#
+
+# environment variable of the JSON lines file path (enables instrumentation)
+ENV_VAR = 'VGPY_INSTRUMENT'
+
+# the stack of open stage records (of this process)
+_STACK = []
+
+#
+# function defs
+#
+def enabled():
+    """ returns the JSON lines file path, or None if not enabled """
+    return os.environ.get(ENV_VAR) or None
+
+def peakRSS():
+    """
+    returns the peak resident memory (bytes) of this process, or None
+    if it is not available
+    """
+    if resource is not None:
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        # kilobytes, except on macOS
+        return int(peak) if sys.platform == 'darwin' else 1024*int(peak)
+    try:
+        import ctypes
+        from ctypes import wintypes
+        class PROCESS_MEMORY_COUNTERS(ctypes.Structure):
+            _fields_ = [('cb', wintypes.DWORD), ('PageFaultCount', wintypes.DWORD),
+                        ('PeakWorkingSetSize', ctypes.c_size_t),
+                        ('WorkingSetSize', ctypes.c_size_t),
+                        ('QuotaPeakPagedPoolUsage', ctypes.c_size_t),
+                        ('QuotaPagedPoolUsage', ctypes.c_size_t),
+                        ('QuotaPeakNonPagedPoolUsage', ctypes.c_size_t),
+                        ('QuotaNonPagedPoolUsage', ctypes.c_size_t),
+                        ('PagefileUsage', ctypes.c_size_t),
+                        ('PeakPagefileUsage', ctypes.c_size_t)]
+        counters = PROCESS_MEMORY_COUNTERS()
+        counters.cb = ctypes.sizeof(counters)
+        process = ctypes.windll.kernel32.GetCurrentProcess()
+        if ctypes.windll.psapi.GetProcessMemoryInfo(process, ctypes.byref(counters),
+                                                    counters.cb):
+            return int(counters.PeakWorkingSetSize)
+    except Exception:
+        pass
+    return None
+
+def nbytes(value):
+    """
+    returns the number of bytes of the arrays of value (an array, or
+    a dictionary, list, tuple or object of arrays)
+    """
+    if isinstance(value, numpy.ndarray):
+        return int(value.nbytes)
+    elif isinstance(value, dict):
+        return sum([nbytes(v) for v in value.values()])
+    elif isinstance(value, (list, tuple)):
+        return sum([nbytes(v) for v in value])
+    elif hasattr(value, '__dict__'):
+        return sum([nbytes(v) for v in vars(value).values()
+                    if isinstance(v, numpy.ndarray)])
+    return 0
+
+def shapes(value):
+    """
+    returns the (JSON serializable) array shapes of value: a list of
+    an array, a dictionary or list of those of a dictionary or
+    list/tuple of arrays, or None
+    """
+    if isinstance(value, numpy.ndarray):
+        return list(value.shape)
+    elif isinstance(value, dict):
+        found = dict([ (str(k), shapes(v)) for (k, v) in value.items() ])
+        return dict([ (k, v) for (k, v) in found.items() if v is not None ]) or None
+    elif isinstance(value, (list, tuple)):
+        found = [shapes(v) for v in value]
+        return found if any([v is not None for v in found]) else None
+    return None
+
+def _specimenName(obj):
+    """ returns the name of a specimen instance, or None """
+    try:
+        return str(obj.name)
+    except Exception:
+        return None
+
+def instrumented(name, outputs=None):
+    """
+    decorator of a function (or method) which records it as stage name.
+    the output shapes and bytes of the stage are those of the return
+    value, or of the attributes (tuple of string names) outputs of the
+    method instance. the specimen of a method is its self.name
+    """
+    def decorator(function):
+        @functools.wraps(function)
+        def wrapper(*args, **kwargs):
+            if not enabled():
+                return function(*args, **kwargs)
+            specimen = _specimenName(args[0]) if args and hasattr(args[0], 'odbPath') else None
+            with stage(name, specimen) as record:
+                result = function(*args, **kwargs)
+                if outputs is not None:
+                    output = dict([ (attr, args[0].__dict__.get(attr)) for attr in outputs ])
+                else:
+                    output = result
+                if record.get('bytes') is None:
+                    record['bytes']  = nbytes(output)
+                if record.get('shapes') is None:
+                    record['shapes'] = shapes(output)
+            return result
+        return wrapper
+    return decorator
+
+def readRecords(path):
+    """ returns a list of the records of a JSON lines file """
+    records = []
+    if not os.path.isfile(path):
+        return records
+    with open(path, 'r') as f:
+        for line in f:
+            line = line.strip()
+            if line:
+                records.append(json.loads(line))
+    return records
+
+def summarize(records):
+    """
+    returns the summary of the records (list, or JSON lines file path):
+    a list of dictionaries of the 'stage', 'calls', 'specimens',
+    'wallTime' (total), 'meanTime', 'bytes' (total), 'cached' (number
+    of calls served from the memory cache) and 'peakRSS' (max), in order
+    of total wall time
+    """
+    if not isinstance(records, list):
+        records = readRecords(records)
+    stages = {}
+    for r in records:
+        s = stages.setdefault(r['stage'], {'stage': r['stage'], 'calls': 0,
+                                           'specimens': set(), 'wallTime': 0.0,
+                                           'bytes': 0, 'cached': 0, 'peakRSS': None})
+        s['calls']    += 1
+        s['wallTime'] += r['wallTime']
+        s['bytes']    += r.get('bytes') or 0
+        s['cached']   += 1 if r.get('cached') else 0
+        if r.get('specimen') is not None:
+            s['specimens'].add(r['specimen'])
+        if r.get('peakRSS') is not None:
+            s['peakRSS'] = max(s['peakRSS'] or 0, r['peakRSS'])
+
+    summary = sorted(stages.values(), key=lambda s: -s['wallTime'])
+    for s in summary:
+        s['specimens'] = len(s['specimens'])
+        s['meanTime']  = s['wallTime']/s['calls']
+    return summary
+
+def formatSummary(summary):
+    """ returns a string table of a summary (see summarize) """
+    lines = ['%-24s %7s %7s %9s %10s %10s %10s %10s' % ('stage', 'calls', 'cached',
+             'specimens', 'total [s]', 'mean [s]', 'MB', 'peak MB')]
+    for s in summary:
+        peak = '-' if s['peakRSS'] is None else '%.1f' % (s['peakRSS']/1024.0**2)
+        lines.append('%-24s %7i %7i %9i %10.3f %10.4f %10.1f %10s' % (s['stage'], s['calls'],
+                     s.get('cached', 0), s['specimens'], s['wallTime'], s['meanTime'], 
+                     s['bytes']/1024.0**2, peak))
+    return '\n'.join(lines)
+
+#
+# class definitions
+#
+class stage(object):
+    """ context manager of an instrumented stage
+
+    stage(name, specimen=None)
+
+        with stage('fetch', specimen.name) as record:
+            obj = ...
+            record['bytes'] = nbytes(obj)
+
+    the record (dictionary) may be updated within the stage, e.g. with
+    'bytes', 'shapes' or any other (JSON serializable) information.
+    the specimen of a nested stage defaults to that of the enclosing
+    stage. nothing is recorded if instrumentation is not enabled.
+
+    Attributes:
+        path   = string JSON lines file path (None if not enabled)
+        record = dictionary of the stage record
+    """
+    def __init__(self, name, specimen=None):
+        self.path   = enabled()
+        self.record = {'stage': name, 'specimen': specimen}
+        return
+
+    def __enter__(self):
+        if self.path is not None:
+            if _STACK:
+                if self.record['specimen'] is None:
+                    self.record['specimen'] = _STACK[-1]['specimen']
+                self.record['parent'] = _STACK[-1]['stage']
+            else:
+                self.record['parent'] = None
+            _STACK.append(self.record)
+            self._tic = time.time()
+        return self.record
+
+    def __exit__(self, *args):
+        if self.path is None:
+            return False
+        toc = time.time()
+        _STACK.pop()
+        self.record['wallTime'] = toc - self._tic
+        self.record['peakRSS']  = peakRSS()
+        self.record['pid']      = os.getpid()
+        self.record['time']     = toc
+        self.record.setdefault('bytes', None)
+        self.record.setdefault('shapes', None)
+        if args[0] is not None:
+            self.record['error'] = args[0].__name__
+
+        # one (short) line per write, such that processes may append
+        # to the same file
+        with open(self.path, 'a') as f:
+            f.write(json.dumps(self.record, sort_keys=True) + '\n')
+        return False
+
+class instrument(object):
+    """ context manager which enables instrumentation
+
+    instrument(path)
+
+    records all stages (of this process, and of processes started
+    within) to the JSON lines file path, by setting the environment
+    variable ENV_VAR. it is restored on exit.
+
+    Attributes:
+        path = string JSON lines file path
+    """
+    def __init__(self, path):
+        self.path = os.path.abspath(path)
+        return
+
+    def __enter__(self):
+        self._previous = os.environ.get(ENV_VAR)
+        os.environ[ENV_VAR] = self.path
+        return self
+
+    def __exit__(self, *args):
+        if self._previous is None:
+            del os.environ[ENV_VAR]
+        else:
+            os.environ[ENV_VAR] = self._previous
+        return False
+
+    def records(self):
+        """ returns the list of the records """
+        return readRecords(self.path)
+
+    def summary(self):
+        """ returns the summary of the records (see summarize) """
+        return summarize(self.path)
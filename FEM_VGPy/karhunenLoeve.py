@@ -0,0 +1,314 @@
+"""
+Truncated Karhunen-Loeve (KL) expansions of stationary random fields on
+(irregular) meshes, e.g. CT crack-front refinements or BB/BH bolt holes,
+for which a regular FFT grid (see randomField) is wasteful.
+
+The KL eigenpairs of the covariance are solved with the nodal volumes as
+quadrature weights, by Lanczos iteration (small meshes) or the Nystrom
+method (large meshes). The basis is saved to an on-disk cache (see
+myPaths.basisCache), keyed by the mesh and covariance parameters, so that
+later runs load it instantly. A batch of realizations is then a single
+matrix-matrix product.
+
+    weights = lumpedWeights(nodeLabels, elemConnect, elemVol)
+    gen = KLGenerator(coords, weights, 'matern', corrLength=0.5, nu=1.5,
+                      distType='Lognormal', distParams=(mu, sigma))
+    fields = gen.sample(1000)   # fields[realization, node]
+"""
+
+#
+# imports
+#
+import os
+import hashlib
+import numpy
+from scipy import linalg
+from scipy.sparse import linalg as sparseLinalg
+import myPaths
+from randomField import covariance, marginalTransform, COVARIANCE_TYPES
+
+#
+# constants
+#
+
+# meshes with more nodes than this use the Nystrom method
+LANCZOS_MAX_NODES = 4000
+
+# number of (landmark) points of the Nystrom method
+NYSTROM_POINTS = 2000
+
+# maximum number of KL terms
+KL_MAX_TERMS = 1000
+
+# number of nodes of a chunk of the covariance (Nystrom extension)
+_CHUNK_NODES = 4096
+
+#
+# function defs
+#
+def lumpedWeights(nodeLabels, elemConnect, elemVol):
+    """
+    returns the quadrature weights (nnode) of the nodes, i.e. the volume
+    of every element split equally between its nodes.
+
+    input:
+        nodeLabels  = node labels (nnode) of the coordinates
+        elemConnect = array (nelem, nodes per element) of the node labels
+                      of every element (labels which are not in nodeLabels,
+                      e.g. padding, are ignored)
+        elemVol     = element volumes (nelem), of the same elements
+    """
+    nodeLabels  = numpy.ravel(nodeLabels)
+    elemConnect = numpy.atleast_2d(elemConnect)
+    elemVol     = numpy.ravel(elemVol).astype(numpy.float64)
+    if elemConnect.shape[0] != elemVol.shape[0]:
+        raise Exception('karhunenLoeve: elemConnect and elemVol must be the same elements!')
+
+    order = numpy.argsort(nodeLabels)
+    pos   = numpy.clip(numpy.searchsorted(nodeLabels[order], elemConnect), 0,
+                       nodeLabels.shape[0] - 1)
+    valid = nodeLabels[order][pos] == elemConnect
+    share = elemVol/numpy.maximum(valid.sum(axis=1), 1)
+
+    weights = numpy.zeros(nodeLabels.shape[0], dtype=numpy.float64)
+    numpy.add.at(weights, order[pos[valid]],
+                 numpy.repeat(share[:,numpy.newaxis], elemConnect.shape[1], axis=1)[valid])
+    return weights
+
+def _distances(a, b):
+    """ returns the distances (len(a), len(b)) between two sets of points """
+    d2 = numpy.zeros((a.shape[0], b.shape[0]), dtype=numpy.float64)
+    for k in range(a.shape[1]):
+        d = a[:,k,numpy.newaxis] - b[numpy.newaxis,:,k]
+        d2 += d*d
+    return numpy.sqrt(d2)
+
+def _nterms(eigenvalues, total, nterms, varianceFraction):
+    """ returns the number of KL terms to keep """
+    if nterms is not None:
+        return min(nterms, eigenvalues.shape[0])
+    captured = numpy.cumsum(eigenvalues)/total
+    return min(int(numpy.searchsorted(captured, varianceFraction)) + 1,
+               eigenvalues.shape[0])
+
+def basisKey(coords, weights, covType, corrLength, nu, nterms, varianceFraction, method):
+    """ returns the (hex sha1) cache key of a KL basis """
+    h = hashlib.sha1()
+    h.update(numpy.ascontiguousarray(coords, dtype=numpy.float64).tobytes())
+    h.update(numpy.ascontiguousarray(weights, dtype=numpy.float64).tobytes())
+    h.update(repr((covType, float(corrLength), float(nu), nterms,
+                   float(varianceFraction), method, NYSTROM_POINTS)).encode('utf-8'))
+    return h.hexdigest()
+
+def lanczosBasis(coords, weights, covType, corrLength, nu=1.5, nterms=None,
+                 varianceFraction=0.95):
+    """
+    returns a tuple of (eigenvalues, basis) of the truncated KL expansion
+    at coords, by Lanczos iteration of the (dense) weighted covariance.
+    basis is an array (ncoord, nterms) of the eigenfunctions scaled by the
+    square root of their eigenvalues (i.e. a field is basis*xi).
+    """
+    sqrtw = numpy.sqrt(weights)
+    A = covariance(covType, _distances(coords, coords), corrLength, nu)
+    A *= sqrtw[:,numpy.newaxis]
+    A *= sqrtw[numpy.newaxis,:]
+    total = weights.sum()
+
+    nmax = min(KL_MAX_TERMS, coords.shape[0] - 1)
+    k = nmax if nterms is None else min(nterms, nmax)
+    if varianceFraction is not None and nterms is None:
+        k = min(64, nmax)
+    while True:
+        (lam, U) = sparseLinalg.eigsh(A, k=k, which='LM')
+        order = numpy.argsort(lam)[::-1]
+        (lam, U) = (numpy.maximum(lam[order], 0.0), U[:,order])
+        if nterms is not None or k == nmax or lam.sum() >= varianceFraction*total:
+            break
+        k = min(2*k, nmax)
+
+    n = _nterms(lam, total, nterms, varianceFraction)
+    (lam, U) = (lam[:n], U[:,:n])
+    return (lam, U*(numpy.sqrt(lam)/sqrtw[:,numpy.newaxis]))
+
+def nystromBasis(coords, weights, covType, corrLength, nu=1.5, nterms=None,
+                 varianceFraction=0.95, seed=0):
+    """
+    returns a tuple of (eigenvalues, basis) of the truncated KL expansion
+    at coords, by the Nystrom method. the eigenpairs are solved at
+    NYSTROM_POINTS landmark points (sampled with probability proportional
+    to the weights), and are extended to all coords. see lanczosBasis()
+    """
+    rng = numpy.random.RandomState(seed)
+    total = weights.sum()
+    m = min(NYSTROM_POINTS, coords.shape[0])
+    landmarks = rng.choice(coords.shape[0], m, replace=False, p=weights/total)
+    landmarks.sort()
+    L = coords[landmarks]
+
+    # equal quadrature weights of the landmarks
+    wL = total/m
+    A = covariance(covType, _distances(L, L), corrLength, nu)*wL
+    (lam, U) = linalg.eigh(A)
+    order = numpy.argsort(lam)[::-1][:KL_MAX_TERMS]
+    (lam, U) = (numpy.maximum(lam[order], 0.0), U[:,order])
+    n = _nterms(lam, total, nterms, varianceFraction)
+    (lam, U) = (lam[:n], U[:,:n])
+
+    # Nystrom extension: phi(x) = sum_j C(x,x_j)*sqrt(wL)*u_j/lam, and the
+    # basis is phi*sqrt(lam). chunked over the coords.
+    keep = lam > 0.0
+    ext  = numpy.zeros(U.shape, dtype=numpy.float64)
+    ext[:,keep] = U[:,keep]*(numpy.sqrt(wL)/numpy.sqrt(lam[keep]))
+    basis = numpy.empty((coords.shape[0], n), dtype=numpy.float64)
+    for a in range(0, coords.shape[0], _CHUNK_NODES):
+        C = covariance(covType, _distances(coords[a:a+_CHUNK_NODES], L), corrLength, nu)
+        basis[a:a+_CHUNK_NODES] = C.dot(ext)
+    return (lam, basis)
+
+#
+# class definitions
+#
+class KLGenerator(object):
+    """ a generator of random fields from a (cached) truncated KL expansion
+
+    KLGenerator(coords, weights=None, covType='exponential', corrLength=1.0,
+                distType='Normal', distParams=(0.0, 1.0), nu=1.5, nterms=None,
+                varianceFraction=0.95, method=None, cacheDir=None, seed=None)
+
+    coords is an array (ncoord, ndim) of the (nodal) coordinates, and
+    weights are their quadrature weights (e.g. lumpedWeights), default
+    equal weights. the KL expansion keeps nterms terms, or (if nterms is
+    None) the terms which capture varianceFraction of the total variance.
+    method is 'lanczos' or 'nystrom' (default: by the number of coords,
+    see LANCZOS_MAX_NODES). the basis is cached in cacheDir (default =
+    myPaths.basisCache(); a cacheDir of False disables the cache).
+
+    Attributes:
+        coords      = array (ncoord, ndim) of the coordinates
+        covType     = string covariance type (see COVARIANCE_TYPES)
+        corrLength  = correlation length
+        nu          = smoothness of the Matern covariance
+        distType    = string marginal distribution (see likelihood.DIST_TYPES)
+        distParams  = tuple of the marginal distribution parameters
+        method      = string eigen-solver, 'lanczos' or 'nystrom'
+        key         = string cache key of the basis
+        eigenvalues = array (nterms) of the KL eigenvalues
+        basis       = array (ncoord, nterms) of the eigenfunctions, scaled
+                      by the square root of their eigenvalues
+        rowNorm     = array (ncoord) of the row norms of basis, i.e. the
+                      standard deviation of the truncated expansion
+        cached      = logical, True if the basis was loaded from the cache
+        rng         = numpy.random.RandomState of the realizations
+    """
+
+    #
+    # Attributes (object initialization)
+    #
+    def __init__(self, coords, weights=None, covType='exponential', corrLength=1.0,
+                 distType='Normal', distParams=(0.0, 1.0), nu=1.5, nterms=None,
+                 varianceFraction=0.95, method=None, cacheDir=None, seed=None):
+        """ return object with desired attributes """
+
+        coords = numpy.asarray(coords, dtype=numpy.float64)
+        if coords.ndim == 1:
+            coords = coords[:,numpy.newaxis]
+        if weights is None:
+            weights = numpy.ones(coords.shape[0])
+        weights = numpy.ravel(weights).astype(numpy.float64)
+        if weights.shape[0] != coords.shape[0]:
+            raise Exception('karhunenLoeve: coords and weights must be the same length!')
+        if covType not in COVARIANCE_TYPES:
+            raise Exception('karhunenLoeve: undefined covType ' + str(covType))
+        if method is None:
+            method = 'lanczos' if coords.shape[0] <= LANCZOS_MAX_NODES else 'nystrom'
+        if method not in ('lanczos', 'nystrom'):
+            raise Exception('karhunenLoeve: undefined method ' + str(method))
+
+        self.coords     = coords
+        self.covType    = covType
+        self.corrLength = corrLength
+        self.nu         = nu
+        self.distType   = distType
+        self.distParams = tuple(distParams)
+        self.method     = method
+        self.rng        = numpy.random.RandomState(seed)
+        self.key = basisKey(coords, weights, covType, corrLength, nu, nterms,
+                            varianceFraction, method)
+
+        # load the basis from the cache, or solve for it
+        if cacheDir is None:
+            cacheDir = myPaths.basisCache()
+        path = None
+        if cacheDir:
+            path = os.path.join(cacheDir, 'kl_' + self.key[:24] + '.npz')
+        self.cached = path is not None and os.path.isfile(path)
+        if self.cached:
+            archive = numpy.load(path)
+            self.eigenvalues = archive['eigenvalues']
+            self.basis       = archive['basis']
+            archive.close()
+        elif method == 'lanczos':
+            (self.eigenvalues, self.basis) = lanczosBasis(coords, weights, covType,
+                                                          corrLength, nu, nterms, varianceFraction)
+        else:
+            (self.eigenvalues, self.basis) = nystromBasis(coords, weights, covType,
+                                                          corrLength, nu, nterms, varianceFraction)
+        if path is not None and not self.cached:
+            if not os.path.isdir(cacheDir):
+                os.makedirs(cacheDir)
+            # write to a temporary file first, so that a partially
+            # written file is never mistaken for a cached basis
+            tmpPath = path[:-4] + '.tmp'
+            with open(tmpPath, 'wb') as f:
+                numpy.savez(f, eigenvalues=self.eigenvalues, basis=self.basis)
+            os.rename(tmpPath, path)
+        
+        # the truncated expansion has variance <= 1. the fields are 
+        # rescaled to unit variance (as assumed by marginalTransform)
+        self.rowNorm = numpy.sqrt(numpy.einsum('ij,ij->i', self.basis, self.basis))
+        self.rowNorm = numpy.maximum(self.rowNorm, numpy.finfo(numpy.float64).tiny)
+        return
+
+    #
+    # Dependent Properties
+    #
+    @property
+    def ncoord(self):
+        """ number of coordinates """
+        return self.basis.shape[0]
+
+    @property
+    def nterms(self):
+        """ number of KL terms """
+        return self.basis.shape[1]
+
+    #
+    # Methods
+    #
+    def standard(self, nreal):
+        """
+        returns an array (nreal, ncoord) of standard Gaussian fields
+        at the coordinates. the truncated expansion (variance <= 1) is
+        divided by self.rowNorm, such that every coordinate has unit
+        variance.
+        """
+        xi = self.rng.standard_normal((nreal, self.nterms))
+        G = xi.dot(self.basis.T)
+        G /= self.rowNorm
+        return G
+
+    def sample(self, nreal):
+        """
+        returns an array (nreal, ncoord) of realizations of the critical
+        VGI field, with the marginal distribution distType(distParams)
+        """
+        return marginalTransform(self.distType, self.distParams, self.standard(nreal))
+
+    def batches(self, nreal, batchSize=1000):
+        """ generator of nreal realizations, in arrays of batchSize """
+        done = 0
+        while done < nreal:
+            n = min(batchSize, nreal - done)
+            yield self.sample(n)
+            done += n
+        return
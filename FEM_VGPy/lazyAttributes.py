@@ -0,0 +1,166 @@
+"""
+Lazily computed, memoized attributes with explicit dependency tracking.
+
+A class declares its attributes as descriptors, and a DEPENDENCIES
+dictionary of {attribute: tuple of the attributes it is computed from}.
+A LazyAttribute is computed (by a method of the class) on first access,
+and is then memoized. assigning to an Input (e.g. a set name) or to a
+LazyAttribute invalidates everything computed from it (transitively),
+such that it is recomputed on its next access.
+
+    class Specimen(object):
+        DEPENDENCIES = {'VGI': ('setName',)}
+        setName = Input('setName')
+        VGI     = LazyAttribute('VGI', '_computeVGI')
+        def _computeVGI(self):
+            setComputed(self, VGI=...)
+
+the values are stored in the instance __dict__ under the same names,
+(None if not computed), so that instances pickle and save as before.
+"""
+
+#
+# imports
+#
+import numpy
+
+#
+# constants
+#
+
+# instance attribute of the set of the computed (memoized) attributes
+COMPUTED = '_computed'
+
+# inverted dependency graphs, {class: {attribute: dependents}}
+_DEPENDENTS = {}
+
+#
+# function defs
+#
+def _computedSet(obj):
+    """ returns the set of computed attributes of obj """
+    return obj.__dict__.setdefault(COMPUTED, set())
+
+def dependents(cls, name):
+    """
+    returns a tuple of all attributes of cls which are computed from
+    attribute name (directly or transitively), per cls.DEPENDENCIES
+    """
+    if cls not in _DEPENDENTS:
+        graph = {}
+        for (attribute, inputs) in getattr(cls, 'DEPENDENCIES', {}).items():
+            for key in inputs:
+                graph.setdefault(key, []).append(attribute)
+        _DEPENDENTS[cls] = graph
+    graph = _DEPENDENTS[cls]
+
+    found = []
+    stack = list(graph.get(name, ()))
+    while stack:
+        attribute = stack.pop()
+        if attribute not in found:
+            found.append(attribute)
+            stack.extend(graph.get(attribute, ()))
+    return tuple(found)
+
+def invalidate(obj, names):
+    """
+    invalidate (reset to None) every attribute of obj computed from
+    any of names, except names themselves
+    """
+    computed = _computedSet(obj)
+    for name in names:
+        for attribute in dependents(type(obj), name):
+            if attribute in names:
+                continue
+            obj.__dict__[attribute] = None
+            computed.discard(attribute)
+    return
+
+def setComputed(obj, **values):
+    """
+    save the computed values (attribute=value) of obj, e.g. all outputs
+    of one computation at once. they are memoized (even if None), and
+    everything computed from them is invalidated
+    """
+    obj.__dict__.update(values)
+    _computedSet(obj).update(values.keys())
+    invalidate(obj, values.keys())
+    return
+
+def _changed(old, new):
+    """ returns True if the values old and new differ """
+    if old is new:
+        return False
+    try:
+        return bool(old != new)
+    except ValueError:
+        # e.g. arrays
+        return not numpy.array_equal(old, new)
+
+#
+# class definitions
+#
+class Input(object):
+    """ an input attribute. changing it invalidates its dependents
+
+    Input(name)
+
+    Attributes:
+        name = string name of the attribute
+    """
+    def __init__(self, name):
+        self.name = name
+        return
+
+    def __get__(self, obj, cls=None):
+        if obj is None:
+            return self
+        try:
+            return obj.__dict__[self.name]
+        except KeyError:
+            raise AttributeError(self.name)
+
+    def __set__(self, obj, value):
+        changed = _changed(obj.__dict__.get(self.name), value)
+        obj.__dict__[self.name] = value
+        if changed:
+            invalidate(obj, (self.name,))
+        return
+
+class LazyAttribute(object):
+    """ a lazily computed, memoized attribute
+
+    LazyAttribute(name, compute)
+
+    on first access, the method compute (string name) of the instance is
+    called, which must save the attribute (e.g. with setComputed).
+    assigning a value saves it as computed, while assigning None resets
+    it (i.e. it is recomputed on next access).
+
+    Attributes:
+        name    = string name of the attribute
+        compute = string name of the method computing the attribute
+    """
+    def __init__(self, name, compute):
+        self.name    = name
+        self.compute = compute
+        return
+
+    def __get__(self, obj, cls=None):
+        if obj is None:
+            return self
+        computed = _computedSet(obj)
+        if self.name not in computed:
+            getattr(obj, self.compute)()
+            computed.add(self.name)
+        return obj.__dict__.get(self.name)
+
+    def __set__(self, obj, value):
+        obj.__dict__[self.name] = value
+        if value is None:
+            _computedSet(obj).discard(self.name)
+        else:
+            _computedSet(obj).add(self.name)
+        invalidate(obj, (self.name,))
+        return
@@ -0,0 +1,373 @@
+"""
+Vectorized likelihood of observing failure, for homogeneous material
+properties with a deterministic l*. A python version of
+PredictFailure/Homogeneous/homog_likelihood_failure.m
+
+The specimens (their VGI, loadHist and failureIndex) are packed once
+(SampleBlock) into a sparse derivative operator of the failure rows,
+acting on the VGI at the few frames within the stencils of the observed
+failures. the likelihood of all samples is then a CDF evaluation of
+those frames, and a single sparse matrix product.
+
+    block = SampleBlock(specimens, lstarIndex)
+    (lkhood, lkhoods) = block.likelihood('Lognormal', (mu, sigma))
+    (logL, grad) = block.logLikelihood('Lognormal', (mu, sigma), gradient=True)
+"""
+
+#
+# imports
+#
+import copy
+import numpy
+from scipy import special
+from scipy import sparse
+import fornberg
+
+#
+# constants
+#
+
+# defined failure distribution types, and their parameters
+DIST_TYPES = {'Normal'   : ('mu', 'sigma'),   # mean, standard deviation
+              'Lognormal': ('mu', 'sigma'),   # mean, stdev of log(VGI)
+              'Weibull'  : ('A', 'B'),        # scale, shape
+              'Gumbel'   : ('mu', 'beta')}    # location, scale (largest extreme value)
+
+# specimen name prefixes whose VGI is reduced to the maximum over all
+# locations (see PredictFailure/Homogeneous/deterministic_pre.m)
+MAX_VGI_PREFIXES = ('BB_', 'BH_')
+
+# floor of the likelihoods in the log-likelihood. the numerical PDF
+# may be zero (or slightly negative) at an observed failure.
+MIN_LKHOOD = numpy.finfo(numpy.float64).tiny
+
+# 1/sqrt(2*pi), of the standard normal PDF
+_INV_SQRT_2PI = 1.0/numpy.sqrt(2.0*numpy.pi)
+
+#
+# function defs
+#
+def failureCDF(distType, x, distParams):
+    """
+    returns the CDF of distType (see DIST_TYPES) with parameters
+    distParams = (p1, p2), evaluated at x (any shape).
+    same as the MATLAB cdf(distType, x, p1, p2)
+    """
+    x = numpy.asarray(x, dtype=numpy.float64)
+    (p1, p2) = distParams
+
+    if distType == 'Normal':
+        return special.ndtr((x - p1)/p2)
+    elif distType == 'Lognormal':
+        with numpy.errstate(divide='ignore'):
+            logx = numpy.log(numpy.maximum(x, 0.0))
+        return special.ndtr((logx - p1)/p2)
+    elif distType == 'Weibull':
+        t = (numpy.maximum(x, 0.0)/p1)**p2
+        return -numpy.expm1(-t)
+    elif distType == 'Gumbel':
+        return numpy.exp(-numpy.exp(-(x - p1)/p2))
+    raise Exception('likelihood: undefined distType ' + str(distType))
+
+def failureCDFGrad(distType, x, distParams):
+    """
+    returns a tuple of (CDF, dCDF/dp1, dCDF/dp2), the CDF of distType
+    (see failureCDF) and its (analytic) derivatives w.r.t. the 
+    parameters distParams = (p1, p2), evaluated at x (any shape)
+    """
+    x = numpy.asarray(x, dtype=numpy.float64)
+    (p1, p2) = distParams
+
+    if distType in ('Normal', 'Lognormal'):
+        if distType == 'Lognormal':
+            with numpy.errstate(divide='ignore'):
+                x = numpy.log(numpy.maximum(x, 0.0))
+        z   = (x - p1)/p2
+        CDF = special.ndtr(z)
+        phi = _INV_SQRT_2PI*numpy.exp(-0.5*z*z)
+        # phi*z is zero for log(0) = -inf
+        zphi = numpy.where(phi > 0.0, phi*numpy.where(numpy.isfinite(z), z, 0.0), 0.0)
+        return (CDF, -phi/p2, -zphi/p2)
+    elif distType == 'Weibull':
+        x = numpy.maximum(x, 0.0)
+        t = (x/p1)**p2
+        survive = numpy.exp(-t)
+        # t*log(x/A) is zero for x = 0
+        with numpy.errstate(divide='ignore', invalid='ignore'):
+            tlog = numpy.where(t > 0.0, t*numpy.log(x/p1), 0.0)
+        return (-numpy.expm1(-t), -survive*t*p2/p1, survive*tlog)
+    elif distType == 'Gumbel':
+        y   = (x - p1)/p2
+        u   = numpy.exp(-y)
+        CDF = numpy.exp(-u)
+        return (CDF, -CDF*u/p2, -CDF*u*y/p2)
+    raise Exception('likelihood: undefined distType ' + str(distType))
+
+def sampleVGI(specimen, lstarIndex):
+    """
+    returns the VGI history (vector) of a specimen to be used for the
+    likelihood. i.e. the VGI at l* index lstarIndex (zero-based) for
+    specimens with multiple locations, or the maximum VGI over all
+    locations for BB/BH specimens.
+    """
+    VGI = numpy.asarray(specimen.VGI, dtype=numpy.float64)
+    VGI = VGI.reshape((VGI.shape[0], -1))
+    if specimen.name.upper().startswith(MAX_VGI_PREFIXES):
+        return VGI.max(axis=1)
+    elif VGI.shape[1] == 1:
+        return VGI[:,0]
+    return VGI[:,lstarIndex]
+
+def failurePositions(specimen):
+    """
+    returns an array of the (fractional) frame positions of the observed
+    failures of a specimen, i.e. its failureFrame, or its failureIndex
+    if it has no failureFrame
+    """
+    frames = getattr(specimen, 'failureFrame', None)
+    if frames is None:
+        frames = specimen.failureIndex
+    return numpy.ravel(numpy.asarray(frames, dtype=numpy.float64))
+
+#
+# class definitions
+#
+class SampleBlock(object):
+    """ specimens packed into padded arrays, for vectorized likelihoods
+
+    SampleBlock(specimens, lstarIndex=0)
+
+    specimens are objects (e.g. superSpecimen subclasses) with the
+    attributes name, material, VGI, loadHist, failureIndex (and, optionally,
+    the interpolated failureFrame, see failurePositions).
+    all specimens must be of the same material.
+
+    Attributes:
+        names      = tuple of the sample names
+        material   = string material of the samples
+        lstarIndex = int (zero-based) l* index
+        nframe     = int array (nsample) of the number of frames
+        VGI        = array (nsample, maxframe) of VGI histories,
+                     padded with the last value
+        loadHist   = array (nsample, maxframe) of load histories,
+                     padded with the last value
+        failSample = int array (nfail) of the sample index of every
+                     observed failure
+        failFrame  = int array (nfail) of the (nearest) frame index of
+                     every observed failure
+        failPosition = array (nfail) of the (fractional) frame position
+                     of every observed failure, i.e. the failureFrame of
+                     the specimens (or their failureIndex, if they have
+                     no failureFrame)
+        failVGI    = array (nfail) of the VGI at every observed failure,
+                     linearly interpolated at failPosition
+        support    = int array (nsupport) of the frames (indices of the
+                     concatenated histories of all samples) within the
+                     derivative stencils of the observed failures
+        supportVGI = array (nsupport) of the VGI at the support frames
+        operator   = sparse matrix (nfail, nsupport) of the derivative
+                     w.r.t. load at the observed failures (interpolated
+                     at failPosition), acting on the CDF at the support
+                     frames (of supportVGI)
+    """
+
+    #
+    # Attributes (object initialization)
+    #
+    def __init__(self, specimens, lstarIndex=0):
+        """ return object with desired attributes """
+
+        specimens = list(specimens)
+        if not specimens:
+            raise Exception('likelihood: no samples!')
+
+        # check the material type
+        self.material = specimens[0].material
+        for s in specimens:
+            if s.material != self.material:
+                # halt execution if they vary.
+                raise Exception('likelihood: Multiple Material Types Defined!')
+
+        self.names      = tuple([s.name for s in specimens])
+        self.lstarIndex = lstarIndex
+
+        # obtain the VGI and load history of every sample
+        histories = [sampleVGI(s, lstarIndex) for s in specimens]
+        loads     = [numpy.ravel(s.loadHist).astype(numpy.float64) for s in specimens]
+        self.nframe = numpy.array([h.shape[0] for h in histories], dtype=numpy.intp)
+        nsample  = len(specimens)
+        maxframe = self.nframe.max()
+
+        # pack into padded arrays
+        self.loadHist = numpy.empty((nsample, maxframe), dtype=numpy.float64)
+        for (i, n) in enumerate(self.nframe):
+            if loads[i].shape[0] != n:
+                raise Exception('likelihood: ' + self.names[i] +
+                                ': VGI and loadHist are not the same length!')
+            self.loadHist[i,:n] = loads[i]
+            self.loadHist[i,n:] = loads[i][-1]
+
+        # flatten the observed failures, and obtain the derivative
+        # (d/dload) operator of the failure rows of every sample
+        # (the same sub-frame positions for all inputs, see failPosition)
+        failSample = []
+        positions  = []
+        operators  = []
+        for (i, s) in enumerate(specimens):
+            frames = failurePositions(s)
+            failSample.extend([i]*frames.shape[0])
+            positions.append(frames)
+            if hasattr(s, 'derivOperator'):
+                # cached with the specimen (of the same positions)
+                operators.append(s.derivOperator(1, failureRows=True))
+            else:
+                operators.append(fornberg.derivMatrix(1, loads[i], rows=frames))
+        self.failSample   = numpy.array(failSample, dtype=numpy.intp)
+        self.failPosition = numpy.concatenate(positions) if positions else numpy.zeros(0)
+        self.failFrame    = numpy.rint(self.failPosition).astype(numpy.intp)
+
+        # stack the operators (columns are the concatenated frames of all
+        # samples), and keep only the columns within the failure stencils
+        operator = sparse.block_diag(operators, format='csr')
+        self.support  = numpy.unique(operator.indices)
+        self.operator = operator[:,self.support]
+        self._fullOperator = None
+        
+        self._setVGI(histories)
+        return
+
+    def _setVGI(self, histories):
+        """ pack the VGI histories (list of vectors) of the samples """
+        
+        self.VGI = numpy.empty(self.loadHist.shape, dtype=numpy.float64)
+        for (i, n) in enumerate(self.nframe):
+            self.VGI[i,:n] = histories[i]
+            self.VGI[i,n:] = histories[i][-1]
+        
+        # the VGI at the (sub-frame) failure positions
+        last = self.nframe[self.failSample] - 1
+        lo   = numpy.minimum(numpy.floor(self.failPosition).astype(numpy.intp), last)
+        lo   = numpy.maximum(lo, 0)
+        hi   = numpy.minimum(lo + 1, last)
+        t    = self.failPosition - lo
+        self.failVGI    = ((1.0 - t)*self.VGI[self.failSample, lo] + 
+                           t*self.VGI[self.failSample, hi])
+        self.supportVGI = numpy.concatenate(histories)[self.support]
+        return
+
+    #
+    # Dependent Properties
+    #
+    @property
+    def nsample(self):
+        """ number of samples """
+        return self.VGI.shape[0]
+
+    @property
+    def nfail(self):
+        """ number of observed failures """
+        return self.failFrame.shape[0]
+
+    #
+    # Methods
+    #
+    def failCDF(self, distType, distParams):
+        """ returns the failure CDF (nsample, maxframe) of every sample """
+        return failureCDF(distType, self.VGI, distParams)
+
+    def failPDF(self, distType, distParams):
+        """
+        returns the failure PDF (nsample, maxframe) of every sample,
+        i.e. the numerical derivative of the failure CDF w.r.t. load.
+        (zero for padded frames)
+        """
+        if self._fullOperator is None:
+            self._fullOperator = sparse.block_diag(
+                [fornberg.derivMatrix(1, self.loadHist[i,:n])
+                 for (i, n) in enumerate(self.nframe)], format='csr')
+        
+        CDF   = self.failCDF(distType, distParams)
+        valid = numpy.arange(CDF.shape[1]) < self.nframe[:,numpy.newaxis]
+        PDF   = numpy.zeros(CDF.shape, dtype=numpy.float64)
+        PDF[valid] = self._fullOperator.dot(CDF[valid])
+        return PDF
+
+    def likelihoods(self, distType, distParams):
+        """
+        returns an array (nfail) of the likelihood of every observed
+        failure, i.e. the failure PDF at the failure position. only the CDF
+        at the frames within the derivative stencils is evaluated.
+        
+        distParams may also be a tuple of arrays (n_params), in which
+        case an array (nfail, n_params) is returned.
+        """
+        x = self.supportVGI
+        if numpy.ndim(distParams[0]) > 0 or numpy.ndim(distParams[1]) > 0:
+            x = x[:,numpy.newaxis]
+        return self.operator.dot(failureCDF(distType, x, distParams))
+
+    def likelihood(self, distType, distParams):
+        """
+        returns a tuple of (lkhood, lkhoods), where lkhoods is an array
+        of the likelihood of every observed failure, and lkhood is their
+        product (i.e. the likelihood of observing failure of the entire set)
+        """
+        lkhoods = self.likelihoods(distType, distParams)
+        return (numpy.prod(lkhoods, axis=0), lkhoods)
+
+    def logLikelihood(self, distType, distParams, gradient=False):
+        """
+        returns the log of the likelihood of observing failure of the
+        entire set, i.e. sum(log(lkhoods)), which does not underflow
+        for large sets. likelihoods are floored at MIN_LKHOOD.
+        
+        if gradient is True, returns a tuple of (logL, grad), where grad
+        is an array (2) of the exact derivatives of logL w.r.t. the 
+        distParams (p1, p2). floored likelihoods do not contribute.
+        """
+        if not gradient:
+            # (distParams may be arrays, see self.likelihoods)
+            lkhoods = self.likelihoods(distType, distParams)
+            return numpy.sum(numpy.log(numpy.maximum(lkhoods, MIN_LKHOOD)), axis=0)
+        
+        # the derivative operator is linear, so the derivatives of the
+        # likelihoods are the operator applied to the CDF derivatives
+        (CDF, dp1, dp2) = failureCDFGrad(distType, self.supportVGI, distParams)
+        lkhoods  = self.operator.dot(CDF)
+        dlkhoods = self.operator.dot(numpy.column_stack((dp1, dp2)))
+        
+        floored = lkhoods <= MIN_LKHOOD
+        lkhoods[floored]  = MIN_LKHOOD
+        dlkhoods[floored] = 0.0
+        grad = numpy.sum(dlkhoods/lkhoods[:,numpy.newaxis], axis=0)
+        return (numpy.sum(numpy.log(lkhoods)), grad)
+
+def lstarBlocks(specimens, lstarIndices):
+    """
+    returns a list of SampleBlocks, one per (zero-based) l* index of
+    lstarIndices. the load histories, the observed failures and the 
+    derivative operator are packed once, and shared by all blocks
+    (i.e. only the VGI of the blocks differ).
+    """
+    specimens    = list(specimens)
+    lstarIndices = list(lstarIndices)
+    
+    block  = SampleBlock(specimens, lstarIndices[0])
+    blocks = [block]
+    for lstarIndex in lstarIndices[1:]:
+        b = copy.copy(block)
+        b.lstarIndex = lstarIndex
+        b._setVGI([sampleVGI(s, lstarIndex) for s in specimens])
+        blocks.append(b)
+    return blocks
+
+def homogLikelihoodFailure(specimens, lstarIndex, distType, distParams):
+    """
+    the likelihood of observing the failure of specimens, under the
+    assumptions of deterministic l* (zero-based lstarIndex) with
+    homogeneous material properties defined by distType and distParams.
+    returns a tuple of (lkhood, lkhoods). see SampleBlock.likelihood()
+
+    when evaluating many distParams, build the SampleBlock once instead.
+    """
+    return SampleBlock(specimens, lstarIndex).likelihood(distType, distParams)
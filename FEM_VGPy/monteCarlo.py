@@ -0,0 +1,213 @@
+"""
+Monte Carlo failure prediction for heterogeneous material properties.
+
+Given the VGI history of a specimen (VGI[frame, node]) and many
+realizations of the (spatially varying) critical VGI capacity[real, node],
+e.g. of randomField.RandomFieldGenerator, the failure of a realization is
+the first frame at which the VGI of any node reaches its capacity. the
+failure frames are mapped to failure loads through loadHist, providing
+an empirical failure load distribution.
+
+    gen = RandomFieldGenerator(coords, 'matern', 0.5, 'Lognormal', (mu, sigma))
+    (loads, frames) = monteCarloFailure(specimen.VGI, specimen.loadHist,
+                                        gen, 10000, seed=0, processes=4)
+    (x, F) = empiricalCDF(loads)
+"""
+
+#
+# imports
+#
+import multiprocessing
+import numpy
+from calibration import _sharedArray, _fromShared
+
+#
+# constants
+#
+
+# memory budget (bytes) of a batch of realizations
+MC_BATCH_BYTES = 2**27
+
+#
+# function defs
+#
+def _firstFrames(envelope, capacity, frameBlock=None):
+    """
+    returns the first failure frames (see failureFrames) given the
+    running maximum (envelope) of the VGI history.
+
+    the frames are scanned in blocks. at the end of every block, the
+    realizations which have failed are found, and their failure frame
+    is found by bisection within the block. the scan stops once all
+    realizations have failed.
+    """
+    (nframe, nnode) = envelope.shape
+    nreal = capacity.shape[0]
+    if frameBlock is None:
+        frameBlock = max(1, int(numpy.sqrt(nframe)))
+
+    frames = numpy.empty(nreal, dtype=numpy.intp)
+    frames.fill(-1)
+    alive = numpy.arange(nreal)
+    for start in range(0, nframe, frameBlock):
+        end = min(start + frameBlock, nframe) - 1
+        failed = numpy.any(envelope[end] >= capacity[alive], axis=1)
+        index  = alive[failed]
+
+        # bisection within the block. the envelope is non-decreasing,
+        # so "any node has failed" is monotonic in the frames
+        lo = numpy.empty(index.shape[0], dtype=numpy.intp)
+        hi = numpy.empty(index.shape[0], dtype=numpy.intp)
+        lo.fill(start)
+        hi.fill(end)
+        active = lo < hi
+        while numpy.any(active):
+            i   = index[active]
+            mid = (lo[active] + hi[active])//2
+            hit = numpy.any(envelope[mid] >= capacity[i], axis=1)
+            hi[active] = numpy.where(hit, mid, hi[active])
+            lo[active] = numpy.where(hit, lo[active], mid + 1)
+            active = lo < hi
+        frames[index] = lo
+
+        alive = alive[~failed]
+        if alive.shape[0] == 0:
+            break
+    return frames
+
+def failureFrames(VGI, capacity, frameBlock=None):
+    """
+    returns an int array (nreal) of the first frame at which the VGI of
+    any node reaches its capacity (-1 if it never does), for every
+    realization.
+
+    input:
+        VGI        = array [frame, node] of the VGI history (any trailing
+                     dimensions are flattened into nodes)
+        capacity   = array [real, node] of the critical VGI realizations
+        frameBlock = optional number of frames scanned at once
+    """
+    VGI = numpy.asarray(VGI, dtype=numpy.float64)
+    VGI = VGI.reshape((VGI.shape[0], -1))
+    capacity = numpy.asarray(capacity, dtype=numpy.float64)
+    if capacity.ndim == 1:
+        capacity = capacity[numpy.newaxis,:]
+    if capacity.shape[1] != VGI.shape[1]:
+        raise Exception('monteCarlo: VGI and capacity must have the same nodes!')
+    return _firstFrames(numpy.maximum.accumulate(VGI, axis=0), capacity, frameBlock)
+
+def failureLoads(frames, loadHist):
+    """ returns the loads (nreal) of the failure frames (nan for -1) """
+    loadHist = numpy.ravel(loadHist).astype(numpy.float64)
+    loads = loadHist[numpy.maximum(frames, 0)]
+    loads[frames < 0] = numpy.nan
+    return loads
+
+def empiricalCDF(loads):
+    """
+    returns a tuple of (x, F) of the empirical CDF of the failure loads.
+    realizations which do not fail (nan) are included in the total
+    (i.e. F may not reach 1).
+    """
+    loads = numpy.ravel(loads)
+    x = numpy.sort(loads[~numpy.isnan(loads)])
+    F = numpy.arange(1, x.shape[0] + 1, dtype=numpy.float64)/loads.shape[0]
+    return (x, F)
+
+# per-process state of the workers
+_WORKER = {}
+
+def _initWorker(envelope, fields, seed, frameBlock):
+    """ 
+    worker initializer. the envelope, and the fields of an array, are
+    views of shared memory (see calibration._sharedArray). a generator
+    is copied to every worker.
+    """
+    _WORKER['envelope']   = _fromShared(envelope)
+    _WORKER['fields']     = fields if hasattr(fields, 'sample') else _fromShared(fields)
+    _WORKER['seed']       = seed
+    _WORKER['frameBlock'] = frameBlock
+    return
+
+def _batchFrames(batch, start, n, envelope, fields, seed, frameBlock):
+    """ returns the failure frames of the batch^th batch of realizations """
+    if hasattr(fields, 'sample'):
+        # every batch has its own random stream, such that the results
+        # do not depend on the number of processes. the generator's own
+        # stream is restored, so the caller's stream is not changed
+        rng = fields.rng
+        fields.rng = numpy.random.RandomState([seed, batch])
+        try:
+            capacity = fields.sample(n)
+        finally:
+            fields.rng = rng
+    else:
+        capacity = fields[start:start+n]
+    return _firstFrames(envelope, capacity, frameBlock)
+
+def _worker(task):
+    """ worker. returns (start, frames) of a batch """
+    (batch, start, n) = task
+    return (start, _batchFrames(batch, start, n, _WORKER['envelope'], _WORKER['fields'],
+                                _WORKER['seed'], _WORKER['frameBlock']))
+
+def monteCarloFailure(VGI, loadHist, fields, nreal=None, seed=0, batchSize=None,
+                      processes=1, frameBlock=None):
+    """
+    Monte Carlo failure prediction. returns a tuple of (loads, frames),
+    arrays (nreal) of the failure load (nan if no failure) and failure
+    frame (-1 if no failure) of every realization.
+
+    input:
+        VGI      = array [frame, node] of the VGI history of a specimen
+        loadHist = load history (frame) of the specimen
+        fields   = realizations [real, node] of the critical VGI, or a
+                   generator of them (e.g. RandomFieldGenerator, or any
+                   object with rng and sample(n) attributes)
+
+    optional inputs:
+        nreal      = number of realizations (default = len(fields) of an array)
+        seed       = seed of the realizations of a generator
+        batchSize  = realizations per batch (default: within MC_BATCH_BYTES)
+        processes  = number of worker processes (default = 1)
+        frameBlock = number of frames scanned at once (see failureFrames)
+    
+    with processes > 1, the VGI envelope and an array of fields are 
+    shared with the workers (not copied). a generator is copied to 
+    every worker (once), i.e. the memory of its basis (e.g. the 
+    circulant embedding of a RandomFieldGenerator) is per worker.
+    """
+    VGI = numpy.asarray(VGI, dtype=numpy.float64)
+    VGI = VGI.reshape((VGI.shape[0], -1))
+    envelope = numpy.maximum.accumulate(VGI, axis=0)
+    if not hasattr(fields, 'sample'):
+        fields = numpy.asarray(fields, dtype=numpy.float64)
+        if nreal is None:
+            nreal = fields.shape[0]
+    if nreal is None:
+        raise Exception('monteCarlo: nreal must be defined for a generator!')
+
+    if batchSize is None:
+        # capacity, and gathered envelope (bisection) of a realization
+        batchSize = max(1, int(MC_BATCH_BYTES//(16*VGI.shape[1])))
+    tasks = [(k, start, min(batchSize, nreal - start))
+             for (k, start) in enumerate(range(0, nreal, batchSize))]
+
+    frames = numpy.empty(nreal, dtype=numpy.intp)
+    processes = max(1, min(processes, len(tasks)))
+    if processes == 1:
+        for (k, start, n) in tasks:
+            frames[start:start+n] = _batchFrames(k, start, n, envelope, fields,
+                                                 seed, frameBlock)
+    else:
+        shared = fields if hasattr(fields, 'sample') else _sharedArray(fields)
+        pool = multiprocessing.Pool(processes, _initWorker,
+                                    (_sharedArray(envelope), shared, seed, frameBlock))
+        try:
+            for (start, values) in pool.imap_unordered(_worker, tasks):
+                frames[start:start+values.shape[0]] = values
+        finally:
+            pool.close()
+            pool.join()
+
+    return (failureLoads(frames, loadHist), frames)
@@ -11,3 +11,33 @@ def OdbTools():
 def saveResults():
     """ returns the path to the VGPy save location """
     return "C:\\Temp\\VGPy_Databases"
+
+def fieldCache():
+    """ 
+    returns the path to the on-disk cache of extracted ODB data 
+    (return None to disable the on-disk cache)
+    """
+    return "C:\\Temp\\VGPy_Cache"
+
+def basisCache():
+    """ 
+    returns the path to the on-disk cache of random field (Karhunen-Loeve)
+    bases (return None to disable the on-disk cache)
+    """
+    return "C:\\Temp\\VGPy_Cache\\KL"
+
+def benchmarkResults():
+    """ returns the path to the saved kernel benchmark results """
+    return "C:\\Temp\\VGPy_Benchmarks"
+
+def odbBackend():
+    """ 
+    returns the ODB access backend: 'abaqus' (abaqus-odb-tools), 
+    'record' (abaqus-odb-tools, recording to odbArchive), or 'replay'
+    (replay of odbArchive, no Abaqus required). see odbBackend.py
+    """
+    return "abaqus"
+
+def odbArchive():
+    """ returns the path to the recorded (or synthetic) ODB archives """
+    return "C:\\Temp\\VGPy_OdbArchive"
@@ -0,0 +1,170 @@
+"""
+Nonlocal (characteristic length, l*) averaging of VGI histories.
+
+A KD-tree is built once over the coordinates of the VGI locations (nodes
+or integration points), from which sparse, volume-weighted averaging
+matrices are assembled for any radius (uniform kernel) or Gaussian
+kernel width. The neighbor pairs are queried once for the largest
+radius, so that an l* sweep does not query the tree again. Averaging a
+whole VGI history is a single sparse-dense product.
+
+    averager = NonlocalAverager(coords, weights)
+    for (lstar, VGI) in zip(lstars, averager.sweep(specimen.VGI, lstars)):
+        ...
+"""
+
+#
+# imports
+#
+import numpy
+from scipy import sparse
+from scipy import spatial
+
+#
+# constants
+#
+
+# defined averaging kernels
+KERNEL_TYPES = ('uniform', 'gaussian')
+
+# the Gaussian kernel is truncated at GAUSSIAN_CUTOFF kernel widths
+GAUSSIAN_CUTOFF = 3.0
+
+#
+# function defs
+#
+def kernelCutoff(kernel, radius):
+    """ returns the (truncation) distance of a kernel of radius (width) """
+    if kernel == 'uniform':
+        return radius
+    elif kernel == 'gaussian':
+        return GAUSSIAN_CUTOFF*radius
+    raise Exception('nonlocalAverage: undefined kernel ' + str(kernel))
+
+def kernelWeights(kernel, d, radius):
+    """ returns the kernel values at the distances d """
+    if kernel == 'uniform':
+        return (d <= radius).astype(numpy.float64)
+    elif kernel == 'gaussian':
+        r = d/radius
+        return numpy.exp(-0.5*r*r)
+    raise Exception('nonlocalAverage: undefined kernel ' + str(kernel))
+
+#
+# class definitions
+#
+class NonlocalAverager(object):
+    """ sparse nonlocal averaging operators over a set of points
+
+    NonlocalAverager(coords, weights=None)
+
+    coords is an array (npoint, ndim) of the coordinates of the VGI
+    locations, and weights are their volumes (default = equal weights).
+    the nonlocal average at point i is sum_j(w_j*K(d_ij)*VGI_j) /
+    sum_j(w_j*K(d_ij)), over the points j within the kernel cutoff.
+
+    Attributes:
+        coords    = array (npoint, ndim) of the coordinates
+        weights   = array (npoint) of the volumes (quadrature weights)
+        tree      = scipy.spatial.cKDTree of the coordinates
+        operators = dictionary of the assembled averaging matrices,
+                    keyed by (kernel, radius)
+    """
+
+    #
+    # Attributes (object initialization)
+    #
+    def __init__(self, coords, weights=None):
+        """ return object with desired attributes """
+
+        coords = numpy.asarray(coords, dtype=numpy.float64)
+        if coords.ndim == 1:
+            coords = coords[:,numpy.newaxis]
+        if weights is None:
+            weights = numpy.ones(coords.shape[0])
+        weights = numpy.ravel(weights).astype(numpy.float64)
+        if weights.shape[0] != coords.shape[0]:
+            raise Exception('nonlocalAverage: coords and weights must be the same length!')
+
+        self.coords    = coords
+        self.weights   = weights
+        self.tree      = spatial.cKDTree(coords)
+        self.operators = {}
+
+        # neighbor pairs (i < j) and distances, within self._cutoff
+        self._cutoff = -1.0
+        self._pairs  = None
+        return
+
+    #
+    # Dependent Properties
+    #
+    @property
+    def npoint(self):
+        """ number of points """
+        return self.coords.shape[0]
+
+    #
+    # Methods
+    #
+    def _neighbors(self, cutoff):
+        """
+        returns a tuple of (i, j, d) of all pairs of points within cutoff,
+        (both i,j and j,i, excluding i,i). the tree is only queried if
+        cutoff is larger than that of any previous query.
+        """
+        if cutoff > self._cutoff:
+            pairs = self.tree.query_pairs(cutoff, output_type='ndarray')
+            (i, j) = (pairs[:,0], pairs[:,1])
+            d = numpy.sqrt(numpy.sum((self.coords[i] - self.coords[j])**2, axis=1))
+            self._cutoff = cutoff
+            self._pairs  = (i, j, d)
+
+        (i, j, d) = self._pairs
+        if cutoff < self._cutoff:
+            within = d <= cutoff
+            (i, j, d) = (i[within], j[within], d[within])
+        return (numpy.concatenate((i, j)), numpy.concatenate((j, i)),
+                numpy.concatenate((d, d)))
+
+    def operator(self, radius, kernel='uniform'):
+        """
+        returns the sparse averaging matrix (npoint, npoint) of radius
+        (uniform kernel), or of Gaussian kernel width radius. the matrix
+        is assembled once, and cached in self.operators.
+        """
+        key = (kernel, float(radius))
+        if key not in self.operators:
+            (i, j, d) = self._neighbors(kernelCutoff(kernel, radius))
+
+            # include every point itself
+            n = self.npoint
+            i = numpy.concatenate((numpy.arange(n), i))
+            j = numpy.concatenate((numpy.arange(n), j))
+            d = numpy.concatenate((numpy.zeros(n), d))
+
+            values = kernelWeights(kernel, d, radius)*self.weights[j]
+            A = sparse.csr_matrix((values, (i, j)), shape=(n, n))
+            norm = numpy.asarray(A.sum(axis=1)).ravel()
+            self.operators[key] = sparse.diags(1.0/norm).dot(A).tocsr()
+        return self.operators[key]
+
+    def average(self, VGI, radius, kernel='uniform'):
+        """
+        returns the nonlocal average of VGI[frame, point] (any trailing
+        dimensions are flattened into points), of the same shape
+        """
+        VGI = numpy.asarray(VGI, dtype=numpy.float64)
+        shape = VGI.shape
+        VGI = VGI.reshape((shape[0], -1))
+        if VGI.shape[1] != self.npoint:
+            raise Exception('nonlocalAverage: VGI must be of the averager points!')
+        return self.operator(radius, kernel).dot(VGI.T).T.reshape(shape)
+
+    def sweep(self, VGI, radii, kernel='uniform'):
+        """
+        returns a list of the nonlocal averages of VGI, one for every
+        radius of radii. the tree is queried once, for the largest radius.
+        """
+        self._neighbors(max([kernelCutoff(kernel, r) for r in radii]))
+        return [self.average(VGI, r, kernel) for r in radii]
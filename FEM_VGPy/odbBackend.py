@@ -0,0 +1,53 @@
+"""
+Selects the ODB access backend (see myPaths.odbBackend):
+
+    'abaqus' = abaqus-odb-tools (requires the Abaqus python interpreter)
+    'record' = abaqus-odb-tools, recording every fetch to the archive
+               myPaths.odbArchive(). the on-disk field cache (see 
+               fieldCache) is disabled, since its hits are not read
+               from the ODB, and so would not be recorded
+    'replay' = replay of the archive myPaths.odbArchive(), see odbReplay
+               (no Abaqus required)
+
+provides IntPtVariable, NodalVariable, ElementVariable, CrackVariable and
+InstanceMesh of the selected backend, and VARIABLE_NOT_FOUND, the tuple of
+exceptions raised by a fetch of a variable which is not output to the ODB
+(the KeyError of the ODB field outputs, or odbReplay.NoRecordError). i.e. use
+
+    from odbBackend import *
+
+instead of importing abaqus-odb-tools directly.
+"""
+
+#
+# imports
+#
+import sys
+import myPaths
+
+#
+# script
+#
+BACKEND = myPaths.odbBackend()
+
+if BACKEND in ('abaqus', 'record'):
+    sys.path.append(myPaths.OdbTools())
+    from odbFieldVariableClasses import *
+    from odbHistoryVariableClasses import *
+    from odbInstanceMeshClasses import *
+    if BACKEND == 'record':
+        import odbReplay
+        import fieldCache
+        fieldCache.setDiskCache(None)
+        IntPtVariable   = odbReplay.recordingClass(IntPtVariable)
+        NodalVariable   = odbReplay.recordingClass(NodalVariable)
+        ElementVariable = odbReplay.recordingClass(ElementVariable)
+        CrackVariable   = odbReplay.recordingClass(CrackVariable)
+        InstanceMesh    = odbReplay.recordingClass(InstanceMesh)
+    VARIABLE_NOT_FOUND = (KeyError,)
+elif BACKEND == 'replay':
+    from odbReplay import IntPtVariable, NodalVariable, ElementVariable, \
+                          CrackVariable, InstanceMesh, NoRecordError
+    VARIABLE_NOT_FOUND = (NoRecordError,)
+else:
+    raise Exception('odbBackend: undefined backend ' + str(BACKEND))
@@ -0,0 +1,255 @@
+"""
+Replayable stand-in for abaqus-odb-tools (no Abaqus required).
+
+IntPtVariable, NodalVariable, ElementVariable, CrackVariable and
+InstanceMesh are replayed from NumPy archives: every fetch (the object
+arguments, and the fetch methods called so far) is a record of the
+fetched data attributes (resultData, nodeLabels, etc.). the archives are
+either recorded from real extractions once (see recordingClass, and the
+'record' backend of odbBackend), or synthetic (see synthesizeArchive).
+
+    # on the Abaqus machine, with myPaths.odbBackend() = 'record'
+    CT(odbPath, 'AP50', J1c).fetchDeterministicVGI()
+    # then, on any machine, with myPaths.odbBackend() = 'replay'
+    CT(odbPath, 'AP50', J1c).fetchDeterministicVGI()
+
+the archive of an ODB is keyed by the ODB name (not its full path), so
+that archives can be moved between machines.
+"""
+
+#
+# imports
+#
+import os
+import re
+import hashlib
+import numpy
+import myPaths
+import fieldCache
+
+#
+# constants
+#
+
+# the fetch methods (of abaqus-odb-tools) of the classes
+FETCH_METHODS = {
+    'IntPtVariable'   : ('fetchNodalExtrap', 'fetchIntPtData',
+                         'fetchNodalAverage', 'fetchElementAverage'),
+    'NodalVariable'   : ('fetchNodalOutput', 'avgNodalOutput'),
+    'ElementVariable' : ('fetchInitialElementVolume',),
+    'CrackVariable'   : ('fetchJintegral',),
+    'InstanceMesh'    : ('fetchMesh',),
+    }
+
+#
+# exceptions
+#
+class NoRecordError(KeyError):
+    """ 
+    the fetch is not in the archive. a KeyError, as abaqus-odb-tools
+    raises for a variable (or set) which is not output to the ODB
+    """
+    pass
+
+#
+# function defs
+#
+def _normalize(value):
+    """ returns value with (unicode) strings as str, for portable keys """
+    if isinstance(value, (list, tuple)):
+        return tuple([_normalize(v) for v in value])
+    elif hasattr(value, 'upper'):
+        return str(value)
+    return value
+
+def odbKey(odbPath):
+    """ returns the archive name of an ODB (file name without extension) """
+    return os.path.splitext(re.split(r'[\\/]', odbPath)[-1])[0]
+
+def recordPath(className, args, methods, archiveDir=None):
+    """
+    returns the file path of the record of className(*args), after the
+    methods (names, in order) have been called. the first argument is
+    the ODB path (or name), which is keyed by odbKey only.
+    """
+    if archiveDir is None:
+        archiveDir = myPaths.odbArchive()
+    key  = repr((className, _normalize(args[1:]), _normalize(methods)))
+    name = className + '_' + hashlib.sha1(key.encode('utf-8')).hexdigest()[:20] + '.npz'
+    return os.path.join(archiveDir, odbKey(args[0]), name)
+
+def writeRecord(className, args, methods, obj, archiveDir=None):
+    """ save the data attributes of obj as the record of a fetch """
+    path = recordPath(className, args, methods, archiveDir)
+    if not os.path.isdir(os.path.dirname(path)):
+        os.makedirs(os.path.dirname(path))
+    fieldCache.writeRecord(path, obj)
+    return path
+
+def _replayMethod(method):
+    """ returns a replaying fetch method """
+    def replay(self):
+        self._methods = self._methods + (method,)
+        path = recordPath(type(self).__name__, self._args, self._methods, self._archiveDir)
+        if not os.path.isfile(path):
+            raise NoRecordError('odbReplay: no record of ' + type(self).__name__ +
+                            str(_normalize(self._args)) + '.' + '().'.join(self._methods) + '()')
+        self.__dict__.update(fieldCache.readRecord(path))
+        return
+    replay.__name__ = method
+    replay.__doc__  = ' replays ' + method + '() from the archive '
+    return replay
+
+def _recordMethod(varClass, method):
+    """ returns a fetch method of varClass, which records its result """
+    def record(self, *args, **kwargs):
+        result = getattr(varClass, method)(self, *args, **kwargs)
+        self._methods = self._methods + (method,)
+        writeRecord(varClass.__name__, self._args, self._methods, self, self._archiveDir)
+        return result
+    record.__name__ = method
+    record.__doc__  = getattr(varClass, method).__doc__
+    return record
+
+def recordingClass(varClass, archiveDir=None):
+    """
+    returns a subclass of (abaqus-odb-tools) varClass, of the same name,
+    which records every fetch to the archive (see writeRecord)
+    """
+    def __init__(self, *args):
+        varClass.__init__(self, *args)
+        self._args       = args
+        self._methods    = ()
+        self._archiveDir = archiveDir
+        return
+
+    attributes = {'__init__': __init__, '__doc__': varClass.__doc__}
+    for method in FETCH_METHODS[varClass.__name__]:
+        if hasattr(varClass, method):
+            attributes[method] = _recordMethod(varClass, method)
+    return type(varClass)(varClass.__name__, (varClass,), attributes)
+
+#
+# class definitions
+#
+class _ReplayVariable(object):
+    """ a fetched object, replayed from the archive myPaths.odbArchive() """
+    def __init__(self, *args):
+        self._args       = args
+        self._methods    = ()
+        self._archiveDir = None
+        return
+
+class IntPtVariable(_ReplayVariable):
+    """ replays odbFieldVariableClasses.IntPtVariable(odbPath, dataName, setName) """
+    fetchNodalExtrap    = _replayMethod('fetchNodalExtrap')
+    fetchIntPtData      = _replayMethod('fetchIntPtData')
+    fetchNodalAverage   = _replayMethod('fetchNodalAverage')
+    fetchElementAverage = _replayMethod('fetchElementAverage')
+
+class NodalVariable(_ReplayVariable):
+    """ replays odbFieldVariableClasses.NodalVariable(odbPath, dataName, setName) """
+    fetchNodalOutput = _replayMethod('fetchNodalOutput')
+    avgNodalOutput   = _replayMethod('avgNodalOutput')
+
+class ElementVariable(_ReplayVariable):
+    """ replays odbFieldVariableClasses.ElementVariable(odbPath, dataName, setName) """
+    fetchInitialElementVolume = _replayMethod('fetchInitialElementVolume')
+
+class CrackVariable(_ReplayVariable):
+    """ replays odbHistoryVariableClasses.CrackVariable(odbPath, stepName, crackName) """
+    fetchJintegral = _replayMethod('fetchJintegral')
+
+class InstanceMesh(_ReplayVariable):
+    """ replays odbInstanceMeshClasses.InstanceMesh(odbPath, instanceName, exactKey) """
+    def __init__(self, odbPath, instanceName, exactKey=False):
+        _ReplayVariable.__init__(self, odbPath, instanceName, exactKey)
+        return
+    fetchMesh = _replayMethod('fetchMesh')
+
+class _Record(object):
+    """ the data attributes of a synthetic record """
+    def __init__(self, **attributes):
+        self.__dict__.update(attributes)
+        return
+
+#
+# synthetic archives
+#
+def synthesizeArchive(specimen, nframe=100, nnode=50, nelem=20, maxLoad=1.0,
+                      seed=0, uvarm=False, archiveDir=None):
+    """
+    writes a synthetic archive of the fetches of the specimen workflows
+    (VGI of every vgiMode, load history, coordinates, volumes, mesh and,
+    for CT, the J-integral), such that specimen (any superSpecimen
+    subclass) can be run with the 'replay' backend. the histories are
+    monotonic (see benchmarks.monotonicHistories), with nnode nodes in
+    specimen.setName, and nelem elements (of 8 IPs, or nodes). the load
+    history (displacement, or J-integral) increases from 0 to maxLoad.
+    if uvarm is True, the in-solver VGI (UVARM3, see UVARM/monovgi.for)
+    is also written, as integrated from the fields by calcVGI.
+    """
+    import benchmarks
+    import calcVGI
+    npoint = benchmarks.POINTS_PER_ELEM
+    odbPath = specimen.odbPath
+    rng = numpy.random.RandomState(seed)
+
+    def write(className, args, methods, **attributes):
+        writeRecord(className, (odbPath,) + tuple(args), methods, _Record(**attributes),
+                    archiveDir)
+
+    # MISES, PRESS and PEEQ (and UVARM3) of every averaging mode
+    nodeLabels = numpy.arange(1, nnode + 1)
+    elemLabels = numpy.arange(1, nelem + 1)
+    modes = (('fetchNodalAverage',   nnode, 2, {'nodeLabels': nodeLabels}),
+             ('fetchElementAverage', nelem, 2, {'elementLabels': elemLabels}),
+             ('fetchNodalExtrap',    nelem*npoint, 3, {'elementLabels': elemLabels,
+                 'nodeLabels': numpy.arange(1, nelem*npoint + 1).reshape((npoint, nelem))}),
+             ('fetchIntPtData',      nelem*npoint, 3, {'elementLabels': elemLabels,
+                 'intPtLabels': numpy.arange(1, npoint + 1)}))
+    for (method, npts, rank, labels) in modes:
+        histories = benchmarks.monotonicHistories(nframe, npts, rank, seed)
+        for (var, data) in zip(('MISES', 'PRESS', 'PEEQ'), histories):
+            write('IntPtVariable', (var, specimen.setName), (method,),
+                  resultData=data, **labels)
+        if uvarm:
+            write('IntPtVariable', ('UVARM3', specimen.setName), (method,),
+                  resultData=calcVGI.calcMonotonicVGI(*histories), **labels)
+
+    # coordinates of specimen.setName, a line along x (and the crack
+    # tip, at x = 0). specimen.odbName is of the same archive
+    coords = numpy.zeros((nframe, nnode, 3))
+    coords[:,:,0] = numpy.linspace(0.0, 0.05, nnode)
+    write('NodalVariable', ('COORD', specimen.setName), ('fetchNodalOutput',),
+          resultData=coords, nodeLabels=nodeLabels)
+    if hasattr(specimen, 'crackTipSet'):
+        write('NodalVariable', ('COORD', specimen.crackTipSet), ('fetchNodalOutput',),
+              resultData=numpy.zeros((nframe, 1, 3)), nodeLabels=numpy.array([nnode + 1]))
+
+    # displacement of the load sets (opposite signs of a pair of sets)
+    loadSetName = getattr(specimen, 'loadSetName', None)
+    if loadSetName is not None:
+        loadSets = (loadSetName,) if hasattr(loadSetName, 'upper') else tuple(loadSetName)
+        ramp = numpy.linspace(0.0, maxLoad, nframe)
+        for (k, setName) in enumerate(loadSets):
+            U = numpy.zeros((nframe, 3, 3))
+            U[:,:,1] = (0.5 if len(loadSets) > 1 else 1.0)*(-1)**k*ramp[:,numpy.newaxis]
+            write('NodalVariable', ('U', setName), ('fetchNodalOutput',),
+                  resultData=U, nodeLabels=numpy.arange(1, 4))
+            write('NodalVariable', ('U', setName), ('fetchNodalOutput', 'avgNodalOutput'),
+                  resultData=U.mean(axis=1)[:,numpy.newaxis,:], nodeLabels=numpy.arange(1, 4))
+
+    # J-integral (history output, i.e. without frame 0) of 5 contours
+    if hasattr(specimen, 'crackName'):
+        J = maxLoad*numpy.linspace(0.0, 1.0, nframe)[1:]**2
+        write('CrackVariable', (specimen.stepName, specimen.crackName), ('fetchJintegral',),
+              resultData=J[:,numpy.newaxis]*(1.0 + 0.01*numpy.arange(5)))
+
+    # element volumes, and the mesh
+    write('ElementVariable', ('EVOL', specimen.setName), ('fetchInitialElementVolume',),
+          resultData=rng.uniform(0.5, 1.5, nelem)*1e-9, elementLabels=elemLabels)
+    connect = numpy.arange(1, nelem*npoint + 1).reshape((nelem, npoint))
+    write('InstanceMesh', (specimen.instanceName, False), ('fetchMesh',),
+          nodesCoords=rng.rand(nelem*npoint, 3), elemConnect=connect, elemType='C3D8')
+    return
@@ -0,0 +1,394 @@
+"""
+Stationary random fields of critical VGI, for spatially varying
+(heterogeneous) material properties.
+
+Standard Gaussian fields with a configurable covariance are sampled on a
+regular grid by circulant embedding (FFT), and are interpolated (multi-
+linearly) to arbitrary coordinates, e.g. the nodesCoords of
+superSpecimen.fetchMeshInfo(), keeping the unit variance between the
+grid nodes. no dense covariance matrices are formed. The Gaussian
+fields are then transformed to the marginal distribution of the
+critical VGI (see likelihood.DIST_TYPES).
+
+    gen = RandomFieldGenerator(coords, 'matern', corrLength=0.5, nu=1.5,
+                               distType='Lognormal', distParams=(mu, sigma))
+    for fields in gen.batches(10000):
+        ...   # fields[realization, node]
+
+    C. R. Dietrich and G. N. Newsam, "Fast and exact simulation of
+    stationary Gaussian processes through circulant embedding of the
+    covariance matrix", SIAM J. Sci. Comput. 18 (1997), pp. 1088-1107.
+"""
+
+#
+# imports
+#
+import itertools
+import numpy
+from scipy import special
+from scipy import sparse
+
+#
+# constants
+#
+
+# defined covariance types (correlation functions of distance)
+COVARIANCE_TYPES = ('exponential', 'squaredExponential', 'matern')
+
+# default grid spacing (as a fraction of corrLength) of the covariance
+# types. the multi-linear interpolation between the grid nodes smooths
+# the field, so the correlation of the interpolated field is in error
+# by up to about (max. over pairs of points, after the unit-variance
+# rescaling):
+#                      corrLength/4   corrLength/8   corrLength/16
+#   exponential           0.11           0.06           0.03
+#   squaredExponential    0.02           0.006          0.001
+#   matern (nu = 1.5)     0.03           0.008          0.002
+# a rough Matern covariance (nu < 1) is spaced as the exponential.
+DEFAULT_SPACING = {'exponential': 1.0/8.0, 'squaredExponential': 1.0/4.0,
+                   'matern': 1.0/4.0}
+
+# memory budget (bytes) of a batch of realizations
+FIELD_BATCH_BYTES = 2**28
+
+# number of times the circulant embedding is enlarged (doubled) to
+# reduce its negative eigenvalues
+MAX_EMBEDDING_DOUBLINGS = 3
+
+# accepted fraction (sum of negative / sum of all) of the negative
+# eigenvalues of the circulant embedding, which are set to zero. this 
+# is about the relative error of the variance of the fields.
+EMBEDDING_TOLERANCE = 1e-3
+
+# maximum number of points of the circulant embedding (e.g. of a 3-D
+# bounding box much larger than the correlation length). the embedding
+# is not enlarged beyond it, and a grid whose embedding exceeds it is 
+# an error (use a larger spacing)
+MAX_EMBEDDING_POINTS = 2**25
+
+#
+# function defs
+#
+def covariance(covType, r, corrLength, nu=1.5):
+    """
+    returns the correlation of covType (see COVARIANCE_TYPES) at the
+    distances r (any shape), for the correlation length corrLength.
+    nu is the smoothness of the Matern covariance.
+    """
+    r = numpy.asarray(r, dtype=numpy.float64)/corrLength
+
+    if covType == 'exponential':
+        return numpy.exp(-r)
+    elif covType == 'squaredExponential':
+        return numpy.exp(-r*r)
+    elif covType == 'matern':
+        s = numpy.sqrt(2.0*nu)*r
+        with numpy.errstate(invalid='ignore'):
+            c = (2.0**(1.0 - nu)/special.gamma(nu))*(s**nu)*special.kv(nu, s)
+        return numpy.where(s > 0.0, c, 1.0)
+    raise Exception('randomField: undefined covType ' + str(covType))
+
+def marginalTransform(distType, distParams, g):
+    """
+    returns the values of distType (see likelihood.DIST_TYPES) with
+    parameters distParams = (p1, p2), of the standard Gaussian values g
+    (i.e. the inverse CDF of the standard normal CDF of g)
+    """
+    (p1, p2) = distParams
+    if distType == 'Normal':
+        return p1 + p2*g
+    elif distType == 'Lognormal':
+        return numpy.exp(p1 + p2*g)
+    elif distType == 'Weibull':
+        # -log(1 - ndtr(g)) = -log(ndtr(-g))
+        return p1*(-special.log_ndtr(-g))**(1.0/p2)
+    elif distType == 'Gumbel':
+        return p1 - p2*numpy.log(-special.log_ndtr(g))
+    raise Exception('randomField: undefined distType ' + str(distType))
+
+def _fastLength(n):
+    """ returns the smallest 2^a * 3^b * 5^c >= n (fast FFT lengths) """
+    best = 1
+    while best < n:
+        best *= 2
+    for p5 in (1, 5, 25, 125):
+        for p3 in (1, 3, 9, 27, 81):
+            m = p5*p3
+            while m < n:
+                m *= 2
+            best = min(best, m)
+    return best
+
+def embeddingShape(gridShape, pad=1):
+    """
+    returns the shape of the circulant embedding of a regular grid of
+    gridShape (tuple), at least 2*pad times the grid along every axis
+    """
+    return tuple([1 if n == 1 else _fastLength(2*pad*(n - 1)) for n in gridShape])
+
+def circulantEigenvalues(covType, corrLength, spacing, gridShape, nu=1.5, pad=1):
+    """
+    returns the eigenvalues (array of the embedding shape) of the
+    circulant embedding of the covariance of a regular grid of gridShape
+    (tuple) and spacing (sequence). see embeddingShape
+    """
+    embedShape = embeddingShape(gridShape, pad)
+
+    # periodic distances of the embedding
+    r2 = numpy.zeros(embedShape, dtype=numpy.float64)
+    for (d, m) in enumerate(embedShape):
+        k  = numpy.arange(m)
+        dk = numpy.minimum(k, m - k)*spacing[d]
+        shape = [1]*len(embedShape)
+        shape[d] = m
+        r2 = r2 + (dk*dk).reshape(shape)
+    return numpy.fft.fftn(covariance(covType, numpy.sqrt(r2), corrLength, nu)).real
+
+def interpMatrix(coords, origin, spacing, gridShape):
+    """
+    returns the sparse matrix (ncoord, ngrid) of the multi-linear
+    interpolation of a regular grid (C-ordered, flattened) to coords
+    """
+    (ncoord, ndim) = coords.shape
+    lower = []
+    frac  = []
+    for d in range(ndim):
+        if gridShape[d] == 1:
+            lower.append(numpy.zeros(ncoord, dtype=numpy.intp))
+            frac.append(numpy.zeros(ncoord, dtype=numpy.float64))
+            continue
+        t = (coords[:,d] - origin[d])/spacing[d]
+        i = numpy.clip(numpy.floor(t).astype(numpy.intp), 0, gridShape[d] - 2)
+        lower.append(i)
+        frac.append(numpy.clip(t - i, 0.0, 1.0))
+
+    # the 2^ndim corners of the cells
+    rows = []
+    cols = []
+    vals = []
+    for corner in itertools.product((0, 1), repeat=ndim):
+        w = numpy.ones(ncoord, dtype=numpy.float64)
+        index = [None]*ndim
+        for d in range(ndim):
+            if corner[d]:
+                w = w*frac[d]
+                index[d] = numpy.minimum(lower[d] + 1, gridShape[d] - 1)
+            else:
+                w = w*(1.0 - frac[d])
+                index[d] = lower[d]
+        rows.append(numpy.arange(ncoord))
+        cols.append(numpy.ravel_multi_index(index, gridShape))
+        vals.append(w)
+    W = sparse.csr_matrix((numpy.concatenate(vals), (numpy.concatenate(rows),
+                          numpy.concatenate(cols))), shape=(ncoord, int(numpy.prod(gridShape))))
+    W.eliminate_zeros()
+    return W
+
+def interpVariance(W, spacing, gridShape, covType, corrLength, nu=1.5, chunk=2**16):
+    """
+    returns the variance (ncoord) of the interpolation W (see interpMatrix)
+    of a standard (unit variance) Gaussian field of covType on the grid,
+    i.e. w'*C*w of every row w of W. it is one at the grid nodes, and
+    less than one between them.
+    """
+    W = sparse.csr_matrix(W)
+    W.sort_indices()
+    spacing  = numpy.asarray(spacing, dtype=numpy.float64)
+    counts   = numpy.diff(W.indptr)
+    ncorner  = max(1, int(counts.max())) if counts.size else 1
+    variance = numpy.empty(W.shape[0], dtype=numpy.float64)
+    for start in range(0, W.shape[0], chunk):
+        stop = min(start + chunk, W.shape[0])
+        
+        # the (zero-padded) weights and grid nodes of the rows
+        n    = counts[start:stop]
+        lo   = W.indptr[start]
+        pos  = numpy.arange(W.indptr[stop] - lo) - numpy.repeat(W.indptr[start:stop] - lo, n)
+        row  = numpy.repeat(numpy.arange(stop - start), n)
+        vals = numpy.zeros((stop - start, ncorner), dtype=numpy.float64)
+        cols = numpy.zeros((stop - start, ncorner), dtype=numpy.intp)
+        vals[row, pos] = W.data[lo:W.indptr[stop]]
+        cols[row, pos] = W.indices[lo:W.indptr[stop]]
+        
+        # covariance of every pair of the grid nodes of a row
+        x  = numpy.stack(numpy.unravel_index(cols, gridShape), axis=-1)*spacing
+        dx = x[:,:,numpy.newaxis,:] - x[:,numpy.newaxis,:,:]
+        C  = covariance(covType, numpy.sqrt((dx*dx).sum(axis=-1)), corrLength, nu)
+        variance[start:stop] = numpy.einsum('ia,iab,ib->i', vals, C, vals)
+    return variance
+
+#
+# class definitions
+#
+class RandomFieldGenerator(object):
+    """ a generator of stationary random fields at a set of coordinates
+
+    RandomFieldGenerator(coords, covType='exponential', corrLength=1.0,
+                         distType='Normal', distParams=(0.0, 1.0), nu=1.5,
+                         spacing=None, seed=None)
+
+    coords is an array (ncoord, ndim) of the (nodal) coordinates, e.g.
+    superSpecimen.nodesCoords. the grid spacing defaults to that of
+    DEFAULT_SPACING (see there for the correlation accuracy); a coarser
+    spacing prints a warning.
+
+    Attributes:
+        coords     = array (ncoord, ndim) of the coordinates
+        covType    = string covariance type (see COVARIANCE_TYPES)
+        corrLength = correlation length
+        nu         = smoothness of the Matern covariance
+        distType   = string marginal distribution (see likelihood.DIST_TYPES)
+        distParams = tuple of the marginal distribution parameters
+        origin     = array (ndim) of the grid origin
+        spacing    = array (ndim) of the grid spacing
+        gridShape  = tuple of the grid shape
+        embedShape = tuple of the circulant embedding shape
+        sqrtEigs   = array (embedShape) of the scaled square root of the
+                     circulant embedding eigenvalues
+        interp     = sparse matrix (ncoord, ngrid) of the interpolation,
+                     with rows scaled to unit variance (see interpVariance)
+        rng        = numpy.random.RandomState of the realizations
+    """
+
+    #
+    # Attributes (object initialization)
+    #
+    def __init__(self, coords, covType='exponential', corrLength=1.0,
+                 distType='Normal', distParams=(0.0, 1.0), nu=1.5,
+                 spacing=None, seed=None):
+        """ return object with desired attributes """
+
+        coords = numpy.asarray(coords, dtype=numpy.float64)
+        if coords.ndim == 1:
+            coords = coords[:,numpy.newaxis]
+        if coords.shape[1] > 3:
+            raise Exception('randomField: coords must be (ncoord, ndim<=3)!')
+        if covType not in COVARIANCE_TYPES:
+            raise Exception('randomField: undefined covType ' + str(covType))
+
+        self.coords     = coords
+        self.covType    = covType
+        self.corrLength = corrLength
+        self.nu         = nu
+        self.distType   = distType
+        self.distParams = tuple(distParams)
+        self.rng        = numpy.random.RandomState(seed)
+
+        # the regular grid enclosing the coordinates
+        fraction = DEFAULT_SPACING[covType]
+        if covType == 'matern' and nu < 1.0:
+            fraction = DEFAULT_SPACING['exponential']
+        if spacing is None:
+            spacing = corrLength*fraction
+        elif numpy.max(spacing) > corrLength*fraction*(1.0 + 1e-9):
+            print('\n!! WARNING: randomField: the grid spacing ' + str(numpy.max(spacing)) + 
+                  ' is coarser than corrLength*' + '%.4g' % fraction + ' (the interpolated ' + 
+                  covType + ' correlation is less accurate, see DEFAULT_SPACING) !!\n')
+        self.spacing = numpy.ones(coords.shape[1])*spacing
+        self.origin  = coords.min(axis=0)
+        extent = coords.max(axis=0) - self.origin
+        self.gridShape = tuple([1 if e == 0.0 else int(numpy.ceil(e/h)) + 1
+                                for (e, h) in zip(extent, self.spacing)])
+
+        embedSize = int(numpy.prod(embeddingShape(self.gridShape)))
+        if embedSize > MAX_EMBEDDING_POINTS:
+            raise Exception('randomField: the circulant embedding of the grid ' + 
+                            str(self.gridShape) + ' has ' + str(embedSize) + 
+                            ' points (more than MAX_EMBEDDING_POINTS). use a larger spacing')
+
+        # eigenvalues of the circulant embedding. if too many are negative
+        # (i.e. the embedding is not positive semi-definite), enlarge it
+        for doubling in range(MAX_EMBEDDING_DOUBLINGS + 1):
+            if doubling > 0 and (numpy.prod(embeddingShape(self.gridShape, 2**doubling)) > 
+                                 MAX_EMBEDDING_POINTS):
+                # (warned below)
+                continue
+            eigs = circulantEigenvalues(covType, corrLength, self.spacing,
+                                        self.gridShape, nu, 2**doubling)
+            negative = -eigs[eigs < 0.0].sum()/eigs.sum()
+            if negative <= EMBEDDING_TOLERANCE:
+                break
+        else:
+            print('\n!! WARNING: randomField: negative circulant eigenvalues ' +
+                  '(fraction %.3g) are set to zero !!\n' % negative)
+        self.embedShape = eigs.shape
+        self.sqrtEigs   = numpy.sqrt(numpy.maximum(eigs, 0.0)/eigs.size)
+
+        # multi-linear interpolation, scaled to unit variance, since the
+        # interpolated field has less variance between the grid nodes
+        interp = interpMatrix(coords, self.origin, self.spacing, self.gridShape)
+        scale  = 1.0/numpy.sqrt(interpVariance(interp, self.spacing, self.gridShape,
+                                               covType, corrLength, nu))
+        self.interp = sparse.diags(scale).dot(interp).tocsr()
+        return
+
+    #
+    # Dependent Properties
+    #
+    @property
+    def ncoord(self):
+        """ number of coordinates """
+        return self.coords.shape[0]
+
+    @property
+    def batchSize(self):
+        """ number of realizations per batch within FIELD_BATCH_BYTES """
+        perField = 8*(self.sqrtEigs.size + 2*int(numpy.prod(self.gridShape)) + 2*self.ncoord)
+        return max(2, int(FIELD_BATCH_BYTES//perField))
+
+    #
+    # Methods
+    #
+    def standardGrid(self, nreal):
+        """
+        returns an array (nreal, gridShape) of independent standard
+        Gaussian fields on the grid. every complex FFT of the embedding
+        provides two realizations (its real and imaginary parts).
+        """
+        nfft  = (nreal + 1)//2
+        shape = (nfft,) + self.embedShape
+        axes  = tuple(range(1, len(shape)))
+        # complex standard normals (real and imaginary parts interleaved)
+        xi = self.rng.standard_normal(shape + (2,)).view(numpy.complex128)[...,0]
+        xi *= self.sqrtEigs
+        Y = numpy.fft.fftn(xi, axes=axes)
+        del xi
+
+        window = (slice(None),) + tuple([slice(0, n) for n in self.gridShape])
+        return numpy.concatenate((Y.real[window], Y.imag[window]))[:nreal]
+
+    def standard(self, nreal):
+        """
+        returns an array (nreal, ncoord) of standard Gaussian fields
+        at the coordinates. the grid fields are generated in batches of
+        (up to) self.batchSize realizations, so that only the returned
+        array grows with nreal.
+        """
+        fields = numpy.empty((nreal, self.ncoord), dtype=numpy.float64)
+        batchSize = self.batchSize
+        for start in range(0, nreal, batchSize):
+            n = min(batchSize, nreal - start)
+            G = self.standardGrid(n).reshape((n, -1))
+            fields[start:start+n] = self.interp.dot(G.T).T
+        return fields
+
+    def sample(self, nreal):
+        """
+        returns an array (nreal, ncoord) of realizations of the critical
+        VGI field, with the marginal distribution distType(distParams)
+        """
+        return marginalTransform(self.distType, self.distParams, self.standard(nreal))
+
+    def batches(self, nreal, batchSize=None):
+        """
+        generator of nreal realizations (see self.sample), in arrays of
+        (up to) batchSize realizations (default = self.batchSize)
+        """
+        if batchSize is None:
+            batchSize = self.batchSize
+        done = 0
+        while done < nreal:
+            n = min(batchSize, nreal - done)
+            yield self.sample(n)
+            done += n
+        return
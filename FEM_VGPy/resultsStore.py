@@ -0,0 +1,284 @@
+"""
+Chunked, compressed, lazily-loadable HDF5 store of FEM_VGPy results.
+
+An alternative to the saveMAT databases: each specimen is a group
+holding one dataset per array attribute (chunked along the frame and
+node axes, and compressed), so that a reader can slice e.g.
+VGI[:, lstarIndex] or loadHist without loading the rest.
+
+    saveStore(specimens, 'Deterministic')
+    with ResultsStore('Deterministic') as store:
+        for name in store.names():
+            VGI = store.VGIAt(name, lstarIndex)
+"""
+
+#
+# imports
+#
+import numpy
+import os
+import myPaths
+try:
+    import h5py
+except ImportError:
+    h5py = None
+
+#
+# constants
+#
+
+# target size (bytes) of a single dataset chunk
+CHUNK_BYTES = 2**18
+
+# maximum number of frames in a single dataset chunk
+CHUNK_FRAMES = 512
+
+#
+# function defs
+#
+def _check_h5py():
+    """ raise an exception if h5py is not installed """
+    if h5py is None:
+        raise Exception('resultsStore: h5py is required!')
+    return
+
+def _storePath(storeKey):
+    """ returns the file path of a store (name or path) """
+    if not storeKey.endswith('.h5'):
+        storeKey = storeKey + '.h5'
+    if os.path.dirname(storeKey):
+        return storeKey
+    return os.path.join(myPaths.saveResults(), storeKey)
+
+def _chunkShape(shape, itemsize):
+    """
+    returns the chunk shape of an array dataset. the first (frame)
+    axis is chunked by up to CHUNK_FRAMES, and the second (node) axis
+    is chunked such that a chunk is about CHUNK_BYTES. any remaining
+    axes (e.g. elements of rank-3 VGI) are chunked by 1.
+    """
+    nframe = max(1, min(shape[0], CHUNK_FRAMES))
+    if len(shape) == 1:
+        return (max(1, min(shape[0], CHUNK_BYTES//itemsize)),)
+    nnode = max(1, min(shape[1], CHUNK_BYTES//(itemsize*nframe)))
+    return (nframe, nnode) + (1,)*(len(shape) - 2)
+
+def _writeValue(group, name, value):
+    """ write an attribute value of a specimen to an HDF5 group """
+
+    if value is None:
+        return
+    elif isinstance(value, dict):
+        # e.g. VGI of calcAllMonoVGI()
+        sub = group.create_group(name)
+        for key in value.keys():
+            _writeValue(sub, key, value[key])
+    elif isinstance(value, (str, bool, int, float)):
+        group.attrs[name] = value
+    else:
+        data = numpy.asarray(value)
+        if data.dtype.kind in 'SUO':
+            # e.g. tuples of set names
+            group.attrs[name] = [str(v) for v in data.ravel()]
+        elif data.ndim == 0 or data.size < 1024:
+            group.create_dataset(name, data=data)
+        else:
+            group.create_dataset(name, data=data,
+                                 chunks=_chunkShape(data.shape, data.dtype.itemsize),
+                                 compression='gzip', compression_opts=4, shuffle=True)
+    return
+
+def _specimenDicts(inputData):
+    """
+    returns a dictionary of {name: attribute dict} of the specimens.
+    private (underscore) attributes, e.g. cached operators, are skipped.
+    """
+    if isinstance(inputData, (list, tuple)):
+        specimens = [(s.name, s.__dict__) for s in inputData]
+    elif isinstance(inputData, dict):
+        specimens = [(inputData['name'], inputData)]
+    else:
+        specimens = [(inputData.name, inputData.__dict__)]
+    return dict([ (name, dict([ (k, v) for (k, v) in attributes.items()
+                                if not k.startswith('_') ]))
+                  for (name, attributes) in specimens ])
+
+def saveStore(inputData, storeKey, append=False):
+    """
+    saves a FEM_VGPy object instance (or list/tuple of instances) to a
+    chunked HDF5 results store
+
+    input:
+        inputData = single or list/tuple of VGPy objects
+        storeKey  = string name of the store (saved to myPaths.saveResults),
+                    or full path of the store .h5 file
+        append    = optional logical flag (default = False) to add the
+                    specimens to an existing store. existing specimens
+                    of the same name are replaced.
+    """
+    _check_h5py()
+    path = _storePath(storeKey)
+
+    f = h5py.File(path, 'a' if append else 'w')
+    try:
+        for (name, attributes) in _specimenDicts(inputData).items():
+            if name in f:
+                del f[name]
+            group = f.create_group(name)
+            for key in attributes.keys():
+                _writeValue(group, key, attributes[key])
+    finally:
+        f.close()
+    return
+
+#
+# class definitions
+#
+class StoredSpecimen(object):
+    """ a lazy view of a specimen in a ResultsStore
+
+    attribute access returns:
+        h5py datasets for arrays (not loaded; slice to read, e.g.
+        specimen.VGI[:, 3] or specimen.loadHist[()])
+        StoredSpecimen views for dictionaries (e.g. specimen.VGI['ELEM_IP'])
+        values for scalars and strings
+    """
+    def __init__(self, group):
+        self._group = group
+        return
+
+    def __getattr__(self, name):
+        if name.startswith('_'):
+            raise AttributeError(name)
+        if name in self._group:
+            item = self._group[name]
+            if isinstance(item, h5py.Group):
+                return StoredSpecimen(item)
+            return item
+        elif name in self._group.attrs:
+            value = self._group.attrs[name]
+            if isinstance(value, bytes) and not isinstance(value, str):
+                value = value.decode('utf-8')
+            return value
+        raise AttributeError(name)
+
+    def __getitem__(self, name):
+        return self.__getattr__(name)
+
+    def __contains__(self, name):
+        return (name in self._group) or (name in self._group.attrs)
+
+    def keys(self):
+        """ returns a list of the attribute names """
+        return list(self._group.keys()) + list(self._group.attrs.keys())
+
+    def load(self, name):
+        """ returns the entire array of name (loaded into memory) """
+        return self._group[name][()]
+
+class ResultsStore(object):
+    """ a reader of a chunked HDF5 results store
+
+    ResultsStore(storeKey)
+
+    storeKey = string name of the store (in myPaths.saveResults),
+               or full path of the store .h5 file
+
+    can be used as a context manager, in which case the store is
+    closed on exit.
+    """
+
+    #
+    # Attributes (object initialization)
+    #
+    def __init__(self, storeKey):
+        """ return object with desired attributes """
+        _check_h5py()
+        self.path = _storePath(storeKey)
+        self._file = h5py.File(self.path, 'r')
+        return
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+        return False
+
+    def __contains__(self, name):
+        return name in self._file
+
+    def __getitem__(self, name):
+        return self.specimen(name)
+
+    #
+    # Methods
+    #
+    def names(self):
+        """ returns a list of the specimen names in the store """
+        return list(self._file.keys())
+
+    def specimen(self, name):
+        """ returns a lazy StoredSpecimen view of specimen name """
+        return StoredSpecimen(self._file[name])
+
+    def _VGIDataset(self, name):
+        """ returns the VGI dataset of specimen name (not loaded) """
+        VGI = self._file[name]['VGI']
+        if isinstance(VGI, h5py.Group):
+            # e.g. VGI of calcAllMonoVGI()
+            raise Exception('resultsStore: ' + name + ': the VGI is a dictionary of ' +
+                            str(list(VGI.keys())) + '. use specimen(name).VGI[key]')
+        return VGI
+
+    def VGIAt(self, name, lstarIndex):
+        """
+        returns the VGI history of specimen name at a single location
+        (e.g. the l* index of a deterministic VGI), i.e. the column 
+        lstarIndex of the VGI as a matrix [frames, locations]. only the
+        chunks of that column are read. for single-location VGI, that
+        location is returned regardless of lstarIndex.
+        """
+        VGI = self._VGIDataset(name)
+        if VGI.ndim == 1:
+            return VGI[()]
+        nloc = int(numpy.prod(VGI.shape[1:]))
+        if nloc == 1:
+            lstarIndex = 0
+        # (e.g. the deterministic VGI of CT is [frames, 1, l*])
+        index = numpy.unravel_index(lstarIndex, VGI.shape[1:])
+        return VGI[(slice(None),) + tuple([int(i) for i in index])]
+
+    def VGIAtFailure(self, name):
+        """
+        returns the VGI (of all locations) at every observed failure,
+        linearly interpolated at the failure frames (failureFrame, or
+        failureIndex if it was not saved). only the bracketing frames
+        are read.
+        """
+        group  = self._file[name]
+        VGI    = self._VGIDataset(name)
+        frames = group['failureFrame'] if 'failureFrame' in group else group['failureIndex']
+        frames = numpy.ravel(numpy.asarray(frames[()], dtype=numpy.float64))
+        
+        last = VGI.shape[0] - 1
+        lo   = numpy.clip(numpy.floor(frames).astype(numpy.intp), 0, last)
+        hi   = numpy.minimum(lo + 1, last)
+        t    = (frames - lo).reshape((-1,) + (1,)*(VGI.ndim - 1))
+        rows = dict([ (f, VGI[f]) for f in numpy.union1d(lo, hi).tolist() ])
+        VGIlo = numpy.array([rows[f] for f in lo.tolist()]).reshape((-1,) + VGI.shape[1:])
+        VGIhi = numpy.array([rows[f] for f in hi.tolist()]).reshape((-1,) + VGI.shape[1:])
+        return (1.0 - t)*VGIlo + t*VGIhi
+
+    def loadHist(self, name):
+        """ returns the load history of specimen name """
+        return self._file[name]['loadHist'][()]
+
+    def labels(self, name, labelName='nodeLabelSet'):
+        """ returns a label array (e.g. nodeLabelSet) of specimen name """
+        return self._file[name][labelName][()]
+
+    def close(self):
+        """ close the store file """
+        self._file.close()
+        return
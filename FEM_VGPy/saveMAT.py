@@ -11,14 +11,76 @@ UC Davis
 import numpy
 import sys
 import os
+import time
+import array
+import atexit
 import myPaths
+import instrumentation
 sys.path.append( myPaths.PyMATLAB() )
-import matlab
-import matlab.engine
+try:
+    import matlab
+    import matlab.engine
+except ImportError:
+    # the MATLAB engine is only needed for VGPy(..., useEngine=True)
+    matlab = None
+
+#
+# constants
+#
+
+# largest variable (bytes) which can be saved to a v5 MAT-file
+MAT5_MAX_BYTES = 2**31 - 1
+
+# MATLAB class names of numpy dtypes (for v7.3 MAT-files)
+_MAT73_CLASSES = {'float64':'double', 'float32':'single',
+                  'int8':'int8',   'int16':'int16',   'int32':'int32',   'int64':'int64',
+                  'uint8':'uint8', 'uint16':'uint16', 'uint32':'uint32', 'uint64':'uint64'}
 
 #
 # function defs
 #
+_LEGACY_MLARRAY = None
+
+def _legacy_mlarray():
+    """
+    returns True if the MATLAB engine uses the (older) pure-Python
+    mlarray, which stores its data in a (column-major) array.array
+    """
+    global _LEGACY_MLARRAY
+    if _LEGACY_MLARRAY is None:
+        _LEGACY_MLARRAY = isinstance(getattr(matlab.double([0.0]), '_data', None), 
+                                     array.array)
+    return _LEGACY_MLARRAY
+
+def _to_matlab_double(value):
+    """
+    converts a numpy array to matlab.double without a tolist() round
+    trip. vectors (and scalars) are converted to row vectors, which is
+    the same as matlab.double(value.tolist())
+    """
+    value = numpy.asarray(value, dtype=numpy.float64)
+    if value.ndim < 2:
+        value = value.reshape((1,-1))
+    
+    if not _legacy_mlarray():
+        # newer engines (R2022a+) accept buffer-protocol objects directly
+        return matlab.double(value)
+    
+    try:
+        # older engines: fill the internal column-major buffer with a
+        # single copy, instead of walking nested python lists
+        data = array.array('d')
+        if hasattr(data, 'frombytes'):
+            data.frombytes(value.tobytes(order='F'))
+        else:
+            data.fromstring(value.tostring(order='F'))
+        mdouble = matlab.double(size=(1, value.size))
+        mdouble._data = data
+        mdouble.reshape(value.shape)
+        return mdouble
+    except (AttributeError, TypeError, ValueError):
+        return matlab.double(value.tolist())
+
 def _convert_dict_dtypes(dictionary):
     """
     takes in dictionary of numpy/python dtypes, and returns 
@@ -57,12 +119,8 @@ def _convert_dict_dtypes(dictionary):
 
         elif type(value) is numpy.ndarray:
             # we want to convert to an equivalent matlab matrix...
-
-            #convert data to equivalent list
-            data_list = value.tolist()
-            
-            #change dtype to matlab double and save
-            dict_out[key] = matlab.double(data_list)
+            # (directly from the numpy buffer)
+            dict_out[key] = _to_matlab_double(value)
             
         elif type(value) is float:
             # matlab considers floats to be matrices as well.
@@ -80,15 +138,395 @@ def _convert_dict_dtypes(dictionary):
             # undefined. alert user, then save as-is.
             # if there is a problem, matlab engine will
             # throw the proper exceptions
-            print "\n!!! undefined type ",
-            print type(value),
-            print "... saving anyway\n"
+            print("\n!!! undefined type " + str(type(value)) + " ... saving anyway\n")
+            dict_out[key] = value
+    
+    return dict_out
+
+
+def _convert_dict_numpy(dictionary):
+    """
+    takes in dictionary of numpy/python dtypes, and returns dictionary
+    of numpy values which save to the same MATLAB dtypes (and shapes)
+    as _convert_dict_dtypes() does through the MATLAB engine.
+    this is used by the native MAT-file writers.
+    """
+    dict_out = {}
+    
+    for key in dictionary.keys():
+        # walk through all keys, checking the type
+        value = dictionary[key]
+
+        # first if-elif ladder (initial checks)
+        if value is None:
+            #don't add it to the output
+            continue
+        elif type(value) is str:
+            # saved as char
             dict_out[key] = value
+            continue
+        elif type(value) is list:
+            # attempt to convert this to a tuple. element
+            # dtypes will be taken care of in 2nd ladder
+            value = tuple(value)
+        
+        # second if-elif ladder (convert dtypes)
+        if type(value) is tuple:
+            #iterable type; convert to (row) array
+            if len(value) == 0:
+                dict_out[key] = numpy.zeros((0,0), dtype=numpy.float64)
+            elif type(value[0]) is int:
+                dict_out[key] = numpy.array(value, dtype=numpy.int32, ndmin=2)
+            elif type(value[0]) is float:
+                dict_out[key] = numpy.array(value, dtype=numpy.float64, ndmin=2)
+
+        elif type(value) is numpy.ndarray:
+            # equivalent to a matlab double matrix.
+            # vectors are saved as row vectors
+            value = value.astype(numpy.float64, copy=False)
+            if value.ndim < 2:
+                value = value.reshape((1,-1))
+            dict_out[key] = value
+            
+        elif type(value) is float:
+            # matlab considers floats to be matrices as well.
+            dict_out[key] = numpy.array([[value]], dtype=numpy.float64)
+
+        elif type(value) is int:
+            # matlab considers ints to be matrices as well.
+            dict_out[key] = numpy.array([[value]], dtype=numpy.int32)
+
+        elif type(value) is dict:
+            # use recursion to take care of this
+            dict_out[key] = _convert_dict_numpy(value)
+            
+        else:
+            # undefined. alert user, then attempt to save
+            # as an equivalent numpy array.
+            valueType = str(type(value))
+            value = numpy.array(value, ndmin=2)
+            if value.dtype.kind in 'biuf':
+                print("\n!!! undefined type " + valueType + " ... saving anyway\n")
+                dict_out[key] = value
+            else:
+                print("\n!!! undefined type " + valueType + " ... not saved\n")
     
     return dict_out
 
+def _public_attributes(attributes):
+    """
+    returns a copy of an instance.__dict__ without the private 
+    (underscore) attributes, e.g. cached operators. these are not
+    results, and are not valid MATLAB field names.
+    """
+    return dict([ (k, v) for (k, v) in attributes.items() if not k.startswith('_') ])
+
+def _collect_instances(inputData):
+    """
+    returns a dictionary of {instance.name: instance.__dict__} for a
+    single (or list/tuple of) FEM_VGPy object instance(s). a single
+    instance.__dict__ is also accepted.
+    """
+    
+    if (type(inputData) is list) or (type(inputData) is tuple):
+        #if we have a list or tuple
+        #then assume the elements are VGIPy classes
+        return dict([ (instance.name, _public_attributes(instance.__dict__))
+                      for instance in inputData ])
+    
+    #assume input is a VGIPy class or otherwise has a name attribute
+    try:
+        #this works if inputData is an instance
+        return {inputData.name: _public_attributes(inputData.__dict__)}
+    except:
+        #this works if inputData is an instance.__dict__
+        return {inputData["name"]: _public_attributes(inputData)}
+
+def _nbytes(value):
+    """ returns the (approximate) number of bytes of converted data """
+    if isinstance(value, dict):
+        return sum([_nbytes(v) for v in value.values()])
+    elif isinstance(value, numpy.ndarray):
+        return value.nbytes
+    return len(value)
+
+def _mat_file_version(path):
+    """ returns the version ('5' or '7.3') of an existing MAT-file """
+    with open(path, 'rb') as f:
+        header = f.read(128)
+    if header.startswith(b'MATLAB 7.3'):
+        return '7.3'
+    return '5'
 
-def VGPy(inputData, saveKey, append=False):
+def _write_mat5(path, saveData, append):
+    """
+    write (or append) saveData to a compressed v5 MAT-file.
+    each key of saveData is saved as a separate variable.
+    """
+    import scipy.io
+    try:
+        from scipy.io.matlab._mio5 import MatFile5Writer
+    except ImportError:
+        from scipy.io.matlab.mio5 import MatFile5Writer
+    
+    options = {'do_compression':True, 'oned_as':'row', 'long_field_names':True}
+    if not (append and os.path.isfile(path)):
+        scipy.io.savemat(path, saveData, **options)
+        return
+    
+    existing = [info[0] for info in scipy.io.whosmat(path)]
+    if any([name in existing for name in saveData]):
+        # same as MATLAB -append, existing variables are replaced.
+        # this requires the file to be rewritten
+        merged = scipy.io.loadmat(path)
+        for key in ('__header__', '__version__', '__globals__'):
+            merged.pop(key, None)
+        merged.update(saveData)
+        scipy.io.savemat(path, merged, **options)
+    else:
+        # v5 variables are sequential, so new ones are simply
+        # written to the end of the file
+        with open(path, 'ab') as f:
+            writer = MatFile5Writer(f, **options)
+            writer.put_variables(saveData, write_header=False)
+    return
+
+def _write_h5_value(parent, name, value):
+    """ write a converted value to an HDF5 group, as MATLAB v7.3 does """
+    
+    if isinstance(value, dict):
+        # struct
+        group = parent.create_group(name)
+        group.attrs['MATLAB_class'] = numpy.bytes_('struct')
+        for key in value.keys():
+            _write_h5_value(group, key, value[key])
+        return
+    
+    if isinstance(value, str):
+        # char (1xN row of UTF-16 code units)
+        data = numpy.array([ord(c) for c in value], dtype=numpy.uint16).reshape((1,-1))
+        mclass = 'char'
+    else:
+        data = numpy.asarray(value)
+        if data.dtype == numpy.bool_:
+            data   = data.astype(numpy.uint8)
+            mclass = 'logical'
+        elif data.dtype.name in _MAT73_CLASSES:
+            mclass = _MAT73_CLASSES[data.dtype.name]
+        else:
+            raise Exception('saveMAT: cannot save dtype ' + str(data.dtype))
+        if data.ndim < 2:
+            data = data.reshape((1,-1))
+    
+    # MATLAB arrays are column-major, so the dimensions are reversed
+    if data.size == 0:
+        dset = parent.create_dataset(name, data=numpy.array(data.shape[::-1], dtype=numpy.uint64))
+        dset.attrs['MATLAB_empty'] = numpy.uint8(1)
+    elif data.size >= 4096:
+        dset = parent.create_dataset(name, data=data.transpose(), 
+                                     compression='gzip', compression_opts=4)
+    else:
+        dset = parent.create_dataset(name, data=data.transpose())
+    dset.attrs['MATLAB_class'] = numpy.bytes_(mclass)
+    if mclass == 'char':
+        dset.attrs['MATLAB_int_decode'] = numpy.int32(2)
+    elif mclass == 'logical':
+        dset.attrs['MATLAB_int_decode'] = numpy.int32(1)
+    return
+
+def _write_mat73(path, saveData, append):
+    """
+    write (or append) saveData to a v7.3 (HDF5) MAT-file. 
+    each key of saveData is saved as a separate variable.
+    """
+    try:
+        import h5py
+    except ImportError:
+        raise Exception('saveMAT: h5py is required to save v7.3 MAT-files!')
+    
+    newFile = not (append and os.path.isfile(path))
+    if newFile:
+        # the MATLAB header lives in the (512 byte) HDF5 user block
+        f = h5py.File(path, 'w', userblock_size=512)
+    else:
+        f = h5py.File(path, 'a')
+    try:
+        for name in saveData.keys():
+            if name in f:
+                # same as MATLAB -append, existing variables are replaced
+                del f[name]
+            _write_h5_value(f, name, saveData[name])
+    finally:
+        f.close()
+    
+    if newFile:
+        text = ('MATLAB 7.3 MAT-file, Platform: GLNXA64, Created on: ' + 
+                time.strftime('%a %b %d %H:%M:%S %Y') + ' HDF5 schema 1.00 .')
+        header = text.ljust(116).encode('ascii') + b' '*8 + b'\x00\x02' + b'IM'
+        with open(path, 'r+b') as f:
+            f.write(header.ljust(512, b'\x00'))
+    return
+
+def _save_native(saveData, path, append=False, version=None):
+    """
+    save saveData (dictionary of {name: instance dict}) to the MAT-file
+    path, without MATLAB. version is '5', '7.3', or None (automatic: 
+    v7.3 for variables larger than MAT5_MAX_BYTES, otherwise v5)
+    """
+    
+    # convert to numpy dtypes
+    saveData = dict([ (name, _convert_dict_numpy(data)) 
+                      for (name, data) in saveData.items() ])
+    largest  = max([0] + [_nbytes(data) for data in saveData.values()])
+    
+    # determine the MAT-file version
+    if append and os.path.isfile(path):
+        fileVersion = _mat_file_version(path)
+        if version not in (None, fileVersion):
+            raise Exception('saveMAT: cannot append v' + str(version) + 
+                            ' data to a v' + fileVersion + ' MAT-file!')
+        version = fileVersion
+    elif version is None:
+        version = '7.3' if largest > MAT5_MAX_BYTES else '5'
+    
+    if version == '5':
+        if largest > MAT5_MAX_BYTES:
+            raise Exception('saveMAT: data is too large for a v5 MAT-file!')
+        _write_mat5(path, saveData, append)
+    elif version == '7.3':
+        _write_mat73(path, saveData, append)
+    else:
+        raise Exception('saveMAT: undefined MAT-file version ' + str(version))
+    return
+
+class MATLABSession(object):
+    """ a long-lived, reusable MATLAB engine session
+    
+    the engine is started lazily (i.e. on first use), and may be shared
+    by many saveMAT.VGPy() calls, or used to call the PredictFailure 
+    scripts after saving. can be used as a context manager, in which
+    case the engine is quit on exit:
+    
+        with MATLABSession() as session:
+            VGPy(specimens, 'Deterministic', session=session)
+            VGPy(more_specimens, 'Deterministic', append=True, session=session)
+            session.engine.driver_homog_optim(nargout=0)
+    
+    Attributes:
+        engine = the (started) matlab.engine object
+        stats  = dictionary of timing statistics (seconds):
+                 'startup'  = engine startup time
+                 'calls'    = number of saves
+                 'convert'  = total numpy to MATLAB dtype conversion time
+                 'transfer' = total struct/workspace transfer time
+                 'save'     = total MATLAB save time
+    """
+    
+    #
+    # Attributes (object initialization)
+    #
+    def __init__(self):
+        """ return object with desired attributes """
+        self._engine = None
+        self.stats   = {'startup':0.0, 'calls':0, 'convert':0.0, 
+                        'transfer':0.0, 'save':0.0}
+        return
+    
+    def __enter__(self):
+        return self
+    
+    def __exit__(self, *args):
+        self.quit()
+        return False
+    
+    #
+    # Dependent Properties
+    #
+    @property
+    def engine(self):
+        """ the matlab engine (started on first use) """
+        if self._engine is None:
+            if matlab is None:
+                raise Exception('saveMAT: the MATLAB engine could not be imported!')
+            tic = time.time()
+            self._engine = matlab.engine.start_matlab()
+            self.stats['startup'] += time.time() - tic
+        return self._engine
+    
+    @property
+    def started(self):
+        """ True if the engine is running """
+        return self._engine is not None
+    
+    #
+    # Methods
+    #
+    def save(self, saveData, saveKey, path, append=False):
+        """
+        save saveData (dictionary of {name: instance dict}) to the 
+        MAT-file path, through the MATLAB engine
+        """
+        eng = self.engine
+        
+        #we want the dict to have matlab dtypes
+        tic = time.time()
+        saveData = dict([ (name, _convert_dict_dtypes(data)) 
+                          for (name, data) in saveData.items() ])
+        toc = time.time()
+        self.stats['convert'] += toc - tic
+        
+        # now, convert dict to struct, and
+        # transport struct to matlab workspace
+        eng.workspace[saveKey] = eng.struct(saveData)
+        tic = time.time()
+        self.stats['transfer'] += tic - toc
+        
+        # save the transported struct
+        if append:
+            eng.save(path,'-struct',saveKey,'-append',nargout=0)
+        else:
+            eng.save(path,'-struct',saveKey,nargout=0)
+        
+        # free the workspace variable (the session is reused)
+        eng.clear(saveKey, nargout=0)
+        self.stats['save']  += time.time() - tic
+        self.stats['calls'] += 1
+        return
+    
+    def quit(self):
+        """ exit the matlab engine (it will be restarted if used again) """
+        if self._engine is not None:
+            self._engine.quit()
+            self._engine = None
+        return
+    
+    def timingSummary(self):
+        """ returns a string summary of the timing statistics """
+        calls = max(self.stats['calls'], 1)
+        lines = ['MATLAB engine session:',
+                 '  startup        : %.3f s' % self.stats['startup'],
+                 '  saves          : %i' % self.stats['calls']]
+        for key in ('convert', 'transfer', 'save'):
+            lines.append('  %-15s: %.3f s total, %.3f s per call' % 
+                         (key, self.stats[key], self.stats[key]/calls))
+        return '\n'.join(lines)
+
+# the shared session, used by VGPy(..., useEngine=True)
+_SHARED_SESSION = None
+
+def sharedSession():
+    """ 
+    returns the shared (per-process) MATLABSession. it is quit
+    automatically when python exits.
+    """
+    global _SHARED_SESSION
+    if _SHARED_SESSION is None:
+        _SHARED_SESSION = MATLABSession()
+        atexit.register(_SHARED_SESSION.quit)
+    return _SHARED_SESSION
+
+def VGPy(inputData, saveKey, append=False, useEngine=False, version=None, 
+         session=None):
     """ 
     saves a python FEM_VGPy object instance
     (or list/tuple of FEM_VGPy object instances)
@@ -101,63 +539,35 @@ def VGPy(inputData, saveKey, append=False):
                     whether the data should be appended to the (already 
                     existing) .MAT file. Meaningless if the file doesn't
                     already exist.
+        useEngine = optional logical flag (default = False) to save
+                    through the MATLAB engine (the shared MATLABSession
+                    is used, see sharedSession). By default, the .MAT
+                    file is written directly (no MATLAB required).
+        session   = optional MATLABSession to save through (implies
+                    useEngine = True)
+        version   = optional string MAT-file version for the direct
+                    writer: '5' or '7.3'. By default, v7.3 (HDF5) is
+                    used only for specimens larger than 2 GB. when
+                    appending, the version of the existing file is used.
     """
     # remove .MAT from saveKey if it was specified
     if saveKey.endswith('.mat'):
         saveKey = saveKey[:-4]
-    # get CWD
-    wd = os.getcwd()
-    # change to save dir
-    os.chdir( myPaths.saveResults() )
-    # start matlab engine
-    eng = matlab.engine.start_matlab()
+    path = os.path.join( myPaths.saveResults(), saveKey + '.mat' )
     
-    if (type(inputData) is list) or (type(inputData) is tuple):
-        #if we have a list or tuple
-        #then assume the elements are VGIPy classes
-        
-        #initialize saveData dict which will be exported
-        saveData = {}
-        
-        for instance in inputData:
-            #save instance dicts to saveData dict
-            #we want the dict to have matlab dtypes
-            saveData[instance.name] = _convert_dict_dtypes( instance.__dict__ )
-        
-        # now, convert dict to struct
-        saveStruct = eng.struct(saveData)       
-        
-        # transport struct to matlab workspace
-        eng.workspace[saveKey] = saveStruct
-        
-    else:
-        #assume input is a VGIPy class or otherwise has a name attribute
-        saveData = {}
-        
-        try:
-            #this works if inputData is an instance
-            saveData[inputData.name] = _convert_dict_dtypes( inputData.__dict__ )
-        except:
-            #this works if inputData is an instance.__dict__
-            saveData[inputData["name"]] = _convert_dict_dtypes( inputData )
-
-        # now, convert dict to struct
-        saveStruct = eng.struct(saveData)       
-        
-        # transport struct to matlab workspace
-        eng.workspace[saveKey] = saveStruct
+    # {instance name: instance dict}. 
+    # each instance is saved as a separate variable
+    saveData = _collect_instances(inputData)
     
-    # save the transported struct
-    if append:
-        eng.save(saveKey + '.mat','-struct',saveKey,'-append',nargout=0)
-    else:
-        eng.save(saveKey + '.mat','-struct',saveKey,nargout=0)
+    with instrumentation.stage('saveMAT') as record:
+        if session is not None:
+            session.save(saveData, saveKey, path, append)
+        elif useEngine:
+            sharedSession().save(saveData, saveKey, path, append)
+        else:
+            _save_native(saveData, path, append, version)
+        record['bytes'] = instrumentation.nbytes(saveData)
     
-    # exit matlab engine
-    eng.quit()
-    # return to previous dir
-    os.chdir( wd )
     # alert user
-    print "MATLAB Binary Database saved to: " + myPaths.saveResults()
+    print("MATLAB Binary Database saved to: " + myPaths.saveResults())
     return
-
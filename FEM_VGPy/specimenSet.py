@@ -0,0 +1,361 @@
+"""
+Columnar container of many specimens (superSpecimen subclasses).
+
+The VGI histories, load histories and failure indices of all specimens
+are packed into contiguous ragged arrays (values + offsets), and the
+materials and specimen types into compact int32 codes. Filtering and
+l* selection across specimens are then vectorized, and the whole set is
+saved in one bulk write (a single MATLAB struct of the columns).
+
+    specimens = SpecimenSet([SNTT(...), CT(...), ...])
+    ap50 = specimens.filter(material='AP50', specimenType='SNTT')
+    (VGI, frameOffsets) = ap50.lstarVGI(3)
+    saveSet(ap50, 'AP50_SNTT')
+
+offsets are 0-based: the values of specimen i are
+values[offsets[i]:offsets[i+1]].
+"""
+
+#
+# imports
+#
+import numpy
+import os
+import myPaths
+
+#
+# constants
+#
+
+# the ragged (values, offsets) and per-specimen columns of a SpecimenSet
+COLUMNS = ('names', 'materials', 'materialCodes', 'specimenTypes', 'typeCodes',
+           'loadHist', 'frameOffsets', 'VGI', 'VGIOffsets', 'nloc',
+           'failureIndex', 'failureFrame', 'failureOffsets')
+
+#
+# function defs
+#
+def _offsets(lengths):
+    """ returns the (int64) offsets of ragged arrays of lengths """
+    offsets = numpy.zeros(len(lengths) + 1, dtype=numpy.int64)
+    numpy.cumsum(lengths, out=offsets[1:])
+    return offsets
+
+def _raggedTake(offsets, indices):
+    """
+    returns a tuple of (flat, newOffsets): the flat indices of the values
+    of the ragged arrays indices (i.e. values[flat]), and their offsets
+    """
+    lengths    = numpy.diff(offsets)[indices]
+    newOffsets = _offsets(lengths)
+    flat = (numpy.repeat(offsets[:-1][indices] - newOffsets[:-1], lengths) +
+            numpy.arange(newOffsets[-1], dtype=numpy.int64))
+    return (flat, newOffsets)
+
+def _codes(values):
+    """ returns a tuple of (distinct values, int32 codes) """
+    (distinct, codes) = numpy.unique(numpy.array(values), return_inverse=True)
+    return (tuple([str(v) for v in distinct]), codes.astype(numpy.int32))
+
+def _setPath(saveKey):
+    """ returns the file path of a saved set (name or path) """
+    if not saveKey.endswith('.mat'):
+        saveKey = saveKey + '.mat'
+    if os.path.dirname(saveKey):
+        return saveKey
+    return os.path.join(myPaths.saveResults(), saveKey)
+
+def saveSet(specimenSet, saveKey):
+    """
+    saves a SpecimenSet to a MAT-file, in one write. the file holds a
+    single struct variable 'specimenSet' of the columns (see COLUMNS).
+
+    input:
+        specimenSet = SpecimenSet
+        saveKey     = string name of the file (saved to myPaths.saveResults),
+                      or full path of the .mat file
+    """
+    import scipy.io
+    columns = dict([ (name, getattr(specimenSet, name)) for name in COLUMNS ])
+    for name in ('names', 'materials', 'specimenTypes'):
+        # cell arrays of strings
+        columns[name] = numpy.array(list(columns[name]), dtype=object)
+    scipy.io.savemat(_setPath(saveKey), {'specimenSet': columns},
+                     do_compression=True, oned_as='column')
+    return
+
+def loadSet(saveKey):
+    """ returns the SpecimenSet saved by saveSet """
+    import scipy.io
+    data = scipy.io.loadmat(_setPath(saveKey), squeeze_me=True,
+                            struct_as_record=False, chars_as_strings=True)
+    struct = data['specimenSet']
+    columns = {}
+    for name in COLUMNS:
+        value = numpy.atleast_1d(getattr(struct, name))
+        if name in ('names', 'materials', 'specimenTypes'):
+            value = tuple([str(v) for v in value])
+        columns[name] = value
+    return SpecimenSet.fromColumns(columns)
+
+#
+# class definitions
+#
+class SpecimenView(object):
+    """ a lightweight view of a specimen of a SpecimenSet
+
+    the attributes are views of the (contiguous) columns of the set.
+    """
+    __slots__ = ('specimenSet', 'index')
+
+    def __init__(self, specimenSet, index):
+        self.specimenSet = specimenSet
+        self.index       = index
+        return
+
+    def __repr__(self):
+        return 'SpecimenView(' + self.name + ')'
+
+    def _slice(self, offsets):
+        return slice(offsets[self.index], offsets[self.index + 1])
+
+    @property
+    def name(self):
+        return str(self.specimenSet.names[self.index])
+
+    @property
+    def material(self):
+        return self.specimenSet.materials[self.specimenSet.materialCodes[self.index]]
+
+    @property
+    def specimenType(self):
+        return self.specimenSet.specimenTypes[self.specimenSet.typeCodes[self.index]]
+
+    @property
+    def loadHist(self):
+        """ array (nframe, 1) of the load history """
+        s = self.specimenSet
+        return s.loadHist[self._slice(s.frameOffsets)][:,numpy.newaxis]
+
+    @property
+    def VGI(self):
+        """ array (nframe, nloc) of the VGI history """
+        s = self.specimenSet
+        return s.VGI[self._slice(s.VGIOffsets)].reshape((-1, s.nloc[self.index]))
+
+    @property
+    def failureIndex(self):
+        s = self.specimenSet
+        return s.failureIndex[self._slice(s.failureOffsets)]
+
+    @property
+    def failureFrame(self):
+        s = self.specimenSet
+        return s.failureFrame[self._slice(s.failureOffsets)]
+
+class SpecimenSet(object):
+    """ a columnar (array-backed) set of specimens
+
+    SpecimenSet(specimens)
+
+    specimens is a list/tuple of superSpecimen (subclass) instances. their
+    VGI, loadHist and failureIndex are computed if needed. any trailing
+    dimensions of VGI (e.g. elements) are flattened into locations.
+
+    Attributes:
+        names          = array (nspec) of the specimen names
+        materials      = tuple of the distinct materials
+        materialCodes  = int32 array (nspec) of indices into materials
+        specimenTypes  = tuple of the distinct specimen class names
+        typeCodes      = int32 array (nspec) of indices into specimenTypes
+        loadHist       = array of all load histories, with offsets
+        frameOffsets   = int64 array (nspec+1)
+        VGI            = array of all (C-ordered, flattened) VGI histories,
+                         with offsets
+        VGIOffsets     = int64 array (nspec+1)
+        nloc           = int32 array (nspec) of the VGI locations
+        failureIndex   = int32 array of all failure frames, with offsets
+        failureFrame   = array of all (interpolated) failure frames
+        failureOffsets = int64 array (nspec+1)
+    """
+
+    #
+    # Attributes (object initialization)
+    #
+    def __init__(self, specimens=()):
+        """ return object with desired attributes """
+
+        VGI = []
+        for s in specimens:
+            if isinstance(s.VGI, dict):
+                raise Exception('specimenSet: dictionary VGI (e.g. calcAllMonoVGI) ' +
+                                'is not supported!')
+            VGI.append(numpy.asarray(s.VGI, dtype=numpy.float64).reshape((s.VGI.shape[0], -1)))
+
+        (materials, materialCodes) = _codes([s.material for s in specimens])
+        (types, typeCodes) = _codes([type(s).__name__ for s in specimens])
+        failureIndex = [numpy.ravel(s.failureIndex).astype(numpy.int32) for s in specimens]
+
+        columns = {
+            'names'          : [s.name for s in specimens],
+            'materials'      : materials,
+            'materialCodes'  : materialCodes,
+            'specimenTypes'  : types,
+            'typeCodes'      : typeCodes,
+            'loadHist'       : [numpy.ravel(s.loadHist) for s in specimens],
+            'VGI'            : [v.ravel() for v in VGI],
+            'nloc'           : [v.shape[1] for v in VGI],
+            'failureIndex'   : failureIndex,
+            'failureFrame'   : [numpy.ravel(s.failureFrame) for s in specimens],
+            }
+        for name in ('loadHist', 'VGI', 'failureIndex', 'failureFrame'):
+            values = columns[name]
+            columns[name + 'Offsets'] = _offsets([v.shape[0] for v in values])
+            columns[name] = numpy.concatenate(values) if values else numpy.zeros(0)
+        columns['frameOffsets']   = columns.pop('loadHistOffsets')
+        columns['failureOffsets'] = columns.pop('failureIndexOffsets')
+        del columns['failureFrameOffsets']
+        self._setColumns(columns)
+        return
+
+    @classmethod
+    def fromColumns(cls, columns):
+        """ returns a SpecimenSet of columns (dictionary, see COLUMNS) """
+        specimenSet = cls.__new__(cls)
+        specimenSet._setColumns(columns)
+        return specimenSet
+
+    def _setColumns(self, columns):
+        """ set the columns (with compact dtypes) """
+        self.names          = numpy.array([str(n) for n in columns['names']])
+        self.materials      = tuple(columns['materials'])
+        self.materialCodes  = numpy.asarray(columns['materialCodes'], dtype=numpy.int32)
+        self.specimenTypes  = tuple(columns['specimenTypes'])
+        self.typeCodes      = numpy.asarray(columns['typeCodes'], dtype=numpy.int32)
+        self.loadHist       = numpy.asarray(columns['loadHist'], dtype=numpy.float64)
+        self.frameOffsets   = numpy.asarray(columns['frameOffsets'], dtype=numpy.int64)
+        self.VGI            = numpy.asarray(columns['VGI'], dtype=numpy.float64)
+        self.VGIOffsets     = numpy.asarray(columns['VGIOffsets'], dtype=numpy.int64)
+        self.nloc           = numpy.asarray(columns['nloc'], dtype=numpy.int32)
+        self.failureIndex   = numpy.asarray(columns['failureIndex'], dtype=numpy.int32)
+        self.failureFrame   = numpy.asarray(columns['failureFrame'], dtype=numpy.float64)
+        self.failureOffsets = numpy.asarray(columns['failureOffsets'], dtype=numpy.int64)
+        return
+
+    #
+    # Dependent Properties
+    #
+    @property
+    def nframe(self):
+        """ int array (nspec) of the number of frames """
+        return numpy.diff(self.frameOffsets)
+
+    @property
+    def nfail(self):
+        """ int array (nspec) of the number of failures """
+        return numpy.diff(self.failureOffsets)
+
+    def __len__(self):
+        return self.names.shape[0]
+
+    def __getitem__(self, index):
+        if index < 0:
+            index += len(self)
+        if not 0 <= index < len(self):
+            raise IndexError(index)
+        return SpecimenView(self, index)
+
+    def __iter__(self):
+        for index in range(len(self)):
+            yield SpecimenView(self, index)
+
+    #
+    # Methods
+    #
+    def mask(self, material=None, specimenType=None):
+        """
+        returns a logical array (nspec) of the specimens of material
+        and specimenType (strings or sequences of strings, None = all)
+        """
+        mask = numpy.ones(len(self), dtype=bool)
+        if material is not None:
+            if isinstance(material, str):
+                material = (material,)
+            # materials are uppercase (see superSpecimen)
+            material = [m.upper() for m in material]
+            wanted = numpy.array([m in material for m in self.materials], dtype=bool)
+            mask &= wanted[self.materialCodes]
+        if specimenType is not None:
+            if isinstance(specimenType, str):
+                specimenType = (specimenType,)
+            wanted = numpy.array([t in specimenType for t in self.specimenTypes], dtype=bool)
+            mask &= wanted[self.typeCodes]
+        return mask
+
+    def subset(self, indices):
+        """ returns a SpecimenSet of the specimens indices (or logical mask) """
+        indices = numpy.asarray(indices)
+        if indices.dtype == bool:
+            indices = numpy.nonzero(indices)[0]
+        (frames, frameOffsets) = _raggedTake(self.frameOffsets, indices)
+        (VGI, VGIOffsets)      = _raggedTake(self.VGIOffsets, indices)
+        (fails, failOffsets)   = _raggedTake(self.failureOffsets, indices)
+        return SpecimenSet.fromColumns({
+            'names'          : self.names[indices],
+            'materials'      : self.materials,
+            'materialCodes'  : self.materialCodes[indices],
+            'specimenTypes'  : self.specimenTypes,
+            'typeCodes'      : self.typeCodes[indices],
+            'loadHist'       : self.loadHist[frames],
+            'frameOffsets'   : frameOffsets,
+            'VGI'            : self.VGI[VGI],
+            'VGIOffsets'     : VGIOffsets,
+            'nloc'           : self.nloc[indices],
+            'failureIndex'   : self.failureIndex[fails],
+            'failureFrame'   : self.failureFrame[fails],
+            'failureOffsets' : failOffsets,
+            })
+
+    def filter(self, material=None, specimenType=None):
+        """ returns a SpecimenSet of the specimens of material and specimenType """
+        return self.subset(self.mask(material, specimenType))
+
+    def _columns(self, lstarIndex):
+        """
+        returns the int array (nspec) of the VGI location of lstarIndex
+        (scalar, or per specimen). single-location VGI always use it.
+        """
+        lstarIndex = numpy.broadcast_to(numpy.asarray(lstarIndex, dtype=numpy.int64),
+                                        (len(self),))
+        if numpy.any((lstarIndex >= self.nloc) & (self.nloc > 1)):
+            raise Exception('specimenSet: lstarIndex exceeds the VGI locations!')
+        return numpy.where(self.nloc == 1, 0, lstarIndex)
+
+    def lstarVGI(self, lstarIndex):
+        """
+        returns a tuple of (VGI, frameOffsets): the VGI histories of all
+        specimens at the location lstarIndex (scalar, or per specimen),
+        packed as a ragged array
+        """
+        nframe  = self.nframe
+        columns = self._columns(lstarIndex)
+        frame = (numpy.arange(self.frameOffsets[-1], dtype=numpy.int64) -
+                 numpy.repeat(self.frameOffsets[:-1], nframe))
+        flat  = (numpy.repeat(self.VGIOffsets[:-1] + columns, nframe) +
+                 frame*numpy.repeat(self.nloc.astype(numpy.int64), nframe))
+        return (self.VGI[flat], self.frameOffsets.copy())
+
+    def failureVGI(self, lstarIndex):
+        """
+        returns an array of the VGI at every failure (aligned with
+        self.failureIndex) at the location lstarIndex (scalar, or per
+        specimen), linearly interpolated at self.failureFrame
+        """
+        specimen = numpy.repeat(numpy.arange(len(self)), self.nfail)
+        base  = (self.VGIOffsets[:-1] + self._columns(lstarIndex))[specimen]
+        nloc  = self.nloc.astype(numpy.int64)[specimen]
+        last  = self.nframe[specimen] - 1
+        lo    = numpy.clip(numpy.floor(self.failureFrame).astype(numpy.int64), 0, last)
+        hi    = numpy.minimum(lo + 1, last)
+        t     = self.failureFrame - lo
+        return (1.0 - t)*self.VGI[base + lo*nloc] + t*self.VGI[base + hi*nloc]
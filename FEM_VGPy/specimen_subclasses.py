@@ -16,12 +16,9 @@ Subclasses of simulation specimens:
 # imports
 #
 import numpy
-import sys
-import myPaths
-sys.path.append(myPaths.OdbTools())
 from specimen_superclasses import *
-from odbFieldVariableClasses import *
-from odbHistoryVariableClasses import *
+from odbBackend import *
+from instrumentation import instrumented
 
 #
 # subclass definitions
@@ -81,8 +78,8 @@ class SNTT(superSpecimen):
         # assume that the relevant displacement is in the 2-direction
         # (AKA y-direction), and further assume that the first node 
         # (column) is representative of the other columns
-        abqDispl = NodalVariable(self.odbPath, 'U', self.loadSetName)
-        abqDispl.fetchNodalOutput()
+        abqDispl = self._fetchField(NodalVariable, (self.odbPath, 'U', self.loadSetName),
+                                    ('fetchNodalOutput',))
         abqDispl = abqDispl.resultData[:,0,1]
         
         # ensure proper shape
@@ -91,46 +88,6 @@ class SNTT(superSpecimen):
         # save to attribute
         self.loadHist = loadHist
         return
-    
-    def determineFailureIndex(self):
-        """
-        determine which "history" (AKA frame) index corresponding to failure.
-        
-        these indices correspond to the nearest percent error (within tolerance)
-        between the loadHist and failureLoad
-        """
-        
-        # obtain the displacement history of the simulation, if needed
-        if self.loadHist is None:
-            self.fetchLoadHist()
-        
-        # number of frames in the abaqus history
-        nframe = self.loadHist.shape[0]
-        
-        # determine which frames correspond to failure
-        failureIndex = []
-        for displ in self.failureLoad:
-            # for all failure displacements, locate which frame index it corresponds to.
-            # we don't want to compare floats directly, so use a percent error
-            percent_err = numpy.absolute( 100.0*(self.loadHist - displ)/displ )
-            
-            # lowest percent error => equivalent to failure displ
-            frameind = numpy.argmin(percent_err)
-            
-            # check to see that it is within tolerance
-            if percent_err[frameind] < self.ERR_TOL:
-                # good. save it.
-                failureIndex.append(int(frameind))
-            else:
-                # provide warning that something went wrong.
-                # append nothing. try to continue.
-                print ("\n!! WARNING: " + self.name + ": the failure index could not " +
-                       "be located for failure displacement " + str(displ) + " !!")
-                print "Nearest Percent Error is: " + str(percent_err[frameind]) + "\n"
-        
-        # save to atttribute
-        self.failureIndex = tuple(failureIndex)
-        return
 
 class CT(superSpecimen):
     """ a compact tension specimen (ASTM E1820)
@@ -150,6 +107,15 @@ class CT(superSpecimen):
         
     failureLoad corresponds to J1 for CT specimens
     """
+    #
+    # Attribute dependencies (see lazyAttributes)
+    #
+    DEPENDENCIES = dict(superSpecimen.DEPENDENCIES,
+                        loadHist=('odbPath', 'stepName', 'crackName', 'frameRange'))
+    
+    stepName  = Input('stepName')
+    crackName = Input('crackName')
+    
     #
     # Attributes (object initialization)
     #
@@ -207,6 +173,7 @@ class CT(superSpecimen):
     #
     # Methods
     #
+    @instrumented('deterministicVGI', outputs=('VGI', 'deterministicVGI', 'lstarNodeInfo'))
     def fetchDeterministicVGI(self, overwrite=True):
         """ 
         obtain the deterministic VGI.
@@ -222,48 +189,49 @@ class CT(superSpecimen):
         #
         # check if pre-requisites are properly met
         #
-        if self.elemLabelSet is not None:
-            # make sure element calcs have not been executed
+        if self.vgiMode != 'NODAL_AVG':
+            # make sure element calcs are not used
+            # (the nodal VGI is computed on first access of self.VGI)
             raise Exception("method not supported or meaningful for element output")
-        elif self.nodeLabelSet is None:
-            # if nodal calcs have not been executed, execute them...
-            print "\nExecuting calcNodalAvgMonoVGI()...",
-            self.calcNodalAvgMonoVGI(),
-            print "done!\n"
         
         #
         # determine which nodal locations are potential l* candidates
         #
         
         # find initial coordinates of crack tip node
-        dummy = NodalVariable(self.odbName, 'COORD', self.crackTipSet)
-        dummy.fetchNodalOutput()
+        dummy = self._fetchField(NodalVariable, (self.odbName, 'COORD', self.crackTipSet),
+                                 ('fetchNodalOutput',))
         crackTipCoords = dummy.resultData[0,:,0] #first frame, x-coord
         del dummy
         
         # find initial coordinates of the nodes ahead of the crack tip
-        dummy = NodalVariable(self.odbName, 'COORD', self.setName)
-        dummy.fetchNodalOutput()
+        dummy = self._fetchField(NodalVariable, (self.odbName, 'COORD', self.setName),
+                                 ('fetchNodalOutput',))
         setCoords = dummy.resultData[0,:,0] #first frame, x-coord
+        setLabels = numpy.ravel(dummy.nodeLabels)
         del dummy
         
         # find which nodes exist from crack tip to max_lstar
         # (i.e., which of the nodes do we want to save data for?)
         max_dist = numpy.absolute(crackTipCoords[0] - self.max_lstar)
         set_dist = numpy.absolute(setCoords - crackTipCoords[0])
-        nodinds  = numpy.where(set_dist < max_dist)
+        setinds  = numpy.nonzero(set_dist < max_dist)[0]
         nnodLS   = numpy.sum(set_dist < max_dist)   # number of node l* candidates
         
+        # the COORD rows are not necessarily in the order of the VGI 
+        # (nodeLabelSet), so match the candidates by node label
+        nodinds = self._labelRows(self.nodeLabelSet, setLabels[setinds], 'the VGI nodes')
+        
         # preallocate storage arrays
         lstarNodeInfo = numpy.zeros((2,nnodLS),dtype=int)
         lstars        = numpy.zeros((1,nnodLS),dtype=numpy.float64)
         
         # save the nodal index values and actual node labels to lstarNodeInfo
         lstarNodeInfo[0,:] = nodinds
-        lstarNodeInfo[1,:] = self.nodeLabelSet[nodinds]
+        lstarNodeInfo[1,:] = setLabels[setinds]
         
         # save the actual distance values, as these are the potential l*'same
-        lstars[0,:] = set_dist[nodinds]
+        lstars[0,:] = set_dist[setinds]
         
         #
         # fetch the VGI at those node locations
@@ -292,8 +260,8 @@ class CT(superSpecimen):
         """
         
         # obtain the J1 history of the simulation
-        cv = CrackVariable(self.odbPath, self.stepName, self.crackName)
-        cv.fetchJintegral()
+        cv = self._fetchField(CrackVariable, (self.odbPath, self.stepName, self.crackName),
+                              ('fetchJintegral',))
         
         # number of total frames in the abaqus history
         nframeHist = cv.resultData.shape[0]
@@ -308,52 +276,11 @@ class CT(superSpecimen):
         # save to attribute
         self.loadHist = abqJ1
         return
-        
-    def determineFailureIndex(self):
-        """
-        determine which "history" (AKA frame) index corresponds to failure.
-        
-        this is specific to CT because failure is specifically 
-        related to the observed J1c. this will automatically
-        call self.fetchLoadHist() if it has not been already executed.
-        """
-        
-        # obtain load history if not already set.
-        if self.loadHist is None:
-            self.fetchLoadHist()
-        
-        # rename for convenience
-        abqJ1 = self.loadHist
-        
-        # find out which frames correspond to observed failure
-        failureIndex = []
-        fi_pctErr    = []
-        for J1c in self.failureLoad:
-            #for each observed J1c, find the nearest abaqus J1 and it's index
-            percent_err = numpy.absolute( 100.0*(abqJ1 - J1c)/J1c )
-            
-            # the frame we want has the lowest percent error
-            frameind = numpy.argmin(percent_err)
-
-            # check to see that it is within tolerance
-            if percent_err[frameind] < self.ERR_TOL:
-                # good. save it.
-                failureIndex.append(int(frameind))
-            else:
-                # provide warning that something went wrong.
-                # append nothing. try to continue.
-                print ("\n!! WARNING: " + self.name + ": the failure index could not " +
-                       "be located for J_1c " + str(J1c) + " !!")
-                print "Nearest Percent Error is: " + str(percent_err[frameind]) + "\n"
-            
-        # save to attribute
-        self.failureIndex = tuple(failureIndex)
-        return
 
 class BB(SNTT):
     """ 
     bolt-bearing specimen.
-    inherit from SNTT, since same determineFailureIndex() will be used.
+    inherit from SNTT. determineFailureIndex() is inherited from superSpecimen.
     """
     #
     # Attributes (Object Initialization)
@@ -396,14 +323,12 @@ class BB(SNTT):
         # obtain the displacement history of the simulation.
         # assume that the relevant displacement is in the 2-direction
         # (AKA y-direction).
-        lvdt0 = NodalVariable(self.odbPath, 'U', self.loadSetName[0])
-        lvdt0.fetchNodalOutput()
-        lvdt0.avgNodalOutput()
+        lvdt0 = self._fetchField(NodalVariable, (self.odbPath, 'U', self.loadSetName[0]),
+                                 ('fetchNodalOutput', 'avgNodalOutput'))
         lvdt0 = lvdt0.resultData[:,0,1]
         
-        lvdt1 = NodalVariable(self.odbPath, 'U', self.loadSetName[1])
-        lvdt1.fetchNodalOutput()
-        lvdt1.avgNodalOutput()
+        lvdt1 = self._fetchField(NodalVariable, (self.odbPath, 'U', self.loadSetName[1]),
+                                 ('fetchNodalOutput', 'avgNodalOutput'))
         lvdt1 = lvdt1.resultData[:,0,1]
         
         lvdt = numpy.absolute(lvdt0 - lvdt1)
@@ -418,7 +343,7 @@ class BB(SNTT):
 class BH(SNTT):
     """ 
     bolt-hole specimen.
-    inherit from SNTT, since same determineFailureIndex() will be used.
+    inherit from SNTT. determineFailureIndex() is inherited from superSpecimen.
     """
     #
     # Attributes (Object Initialization)
@@ -458,9 +383,8 @@ class BH(SNTT):
         # obtain the displacement history of the simulation.
         # assume that the relevant displacement is in the 2-direction
         # (AKA y-direction).
-        lvdt = NodalVariable(self.odbPath, 'U', self.loadSetName)
-        lvdt.fetchNodalOutput()
-        lvdt.avgNodalOutput()
+        lvdt = self._fetchField(NodalVariable, (self.odbPath, 'U', self.loadSetName),
+                                ('fetchNodalOutput', 'avgNodalOutput'))
         lvdt = 2.0 * lvdt.resultData[:,0,1]
         
         # ensure proper shape
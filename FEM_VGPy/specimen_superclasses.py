@@ -8,13 +8,111 @@ Superclasses useful for abaqus simulations of structural test specimens
 # imports
 #
 
+import os
 import numpy
-import sys
-import myPaths
-sys.path.append(myPaths.OdbTools())
-from odbFieldVariableClasses import *
-from odbInstanceMeshClasses import *
+from odbBackend import *
 from calcVGI import *
+from fieldCache import FIELD_CACHE, fetchField, odbFingerprint
+import fornberg
+import nonlocalAverage
+from lazyAttributes import Input, LazyAttribute, setComputed
+import instrumentation
+from instrumentation import instrumented
+
+#
+# constants
+#
+
+# VGI averaging modes (see superSpecimen.vgiMode): the IntPtVariable 
+# fetch method, and the labels (superSpecimen attribute: IntPtVariable 
+# attribute) of each mode. mode 'ALL' is both NODAL_EXTRAP and INT_PT.
+VGI_MODES = {
+    'NODAL_EXTRAP' : ('fetchNodalExtrap',    {'elemLabelSet' : 'elementLabels',
+                                              'nodeLabelSet' : 'nodeLabels'}),
+    'INT_PT'       : ('fetchIntPtData',      {'elemLabelSet' : 'elementLabels',
+                                              'intPtLabelSet': 'intPtLabels'}),
+    'NODAL_AVG'    : ('fetchNodalAverage',   {'nodeLabelSet' : 'nodeLabels'}),
+    'ELEM_AVG'     : ('fetchElementAverage', {'elemLabelSet' : 'elementLabels'}),
+    'ALL'          : None,
+    }
+
+# VGI sources (see superSpecimen.vgiSource):
+#   'FIELDS' = integrate the MISES, PRESS and PEEQ fields (calcVGI)
+#   'AUTO'   = the in-solver monotonic VGI (UVARM3 of UVARM/monovgi.for)
+#              if it is output to the ODB and consistent with that
+#              integrated from the fields (see checkUVARMVGI), else 'FIELDS'
+#   'UVARM'  = the in-solver monotonic VGI (error if it is not output)
+#   'CHECK'  = 'UVARM', and warn if it is not consistent with that
+#              integrated from the fields (see checkUVARMVGI)
+# only 'UVARM' reads less of the ODB than 'FIELDS' (one field instead
+# of three). 'AUTO' and 'CHECK' also read the three fields to check the
+# in-solver VGI (the verdict is remembered per ODB, set and mode, so
+# only the first check of a process reads all four fields).
+VGI_SOURCES = ('FIELDS', 'AUTO', 'UVARM', 'CHECK')
+
+# the field output of the in-solver monotonic VGI
+UVARM_VGI = 'UVARM3'
+
+# number of sampled points, and relative tolerance (of the largest VGI
+# of a point), of the UVARM consistency check
+UVARM_SAMPLE = 1000
+UVARM_RTOL   = 0.05
+
+# (odbPath, setName, fingerprint) of the ODB sets found without UVARM_VGI
+_MISSING_UVARM = set()
+
+# consistency (see checkUVARMVGI) of UVARM_VGI, of the
+# (odbPath, setName, fingerprint, mode) already checked
+_UVARM_CONSISTENT = {}
+
+#
+# function defs
+#
+def locateFailureFrames(loadHist, failureLoad, errTol):
+    """
+    locate the (sub-frame) positions of the failure loads in a load
+    history, all at once, by binary search of the running maximum of
+    loadHist. i.e. the first frame at which each failure load is reached,
+    such that noise (small decreases) in the load history, or unloading,
+    does not end the search. the frame position is linearly interpolated
+    between the bracketing frames (of the running maximum).
+    
+    returns a tuple of (frames, located), where frames is an array of 
+    the fractional frame of every failure load, and located is a logical
+    array. failure loads beyond the load history (by more than the 
+    percent error errTol) are not located.
+    """
+    load = numpy.ravel(loadHist).astype(numpy.float64)
+    failureLoad = numpy.ravel(numpy.asarray(failureLoad, dtype=numpy.float64))
+    
+    # the running maximum (non-decreasing) of the load history
+    peak  = numpy.maximum.accumulate(load)
+    npeak = peak.shape[0]
+    
+    # first frame reaching each failure load, and linear interpolation
+    # from the previous frame. loads below (above) the history are at
+    # the first frame (the first frame of the maximum load)
+    hi = numpy.searchsorted(peak, failureLoad)
+    below  = hi == 0
+    beyond = hi >= npeak
+    hi = numpy.clip(hi, 1, max(npeak - 1, 1))
+    hi = numpy.minimum(hi, npeak - 1)
+    lo = numpy.maximum(hi - 1, 0)
+    span = peak[hi] - peak[lo]
+    with numpy.errstate(divide='ignore', invalid='ignore'):
+        t = numpy.where(span > 0.0, (failureLoad - peak[lo])/span, 1.0)
+    frames = lo + numpy.clip(t, 0.0, 1.0)
+    frames[below]  = 0.0
+    frames[beyond] = numpy.searchsorted(peak, peak[-1])
+    
+    # failure loads beyond the load history must be within tolerance
+    # of its end points (the first, or the maximum load)
+    nearest = peak[numpy.rint(frames).astype(numpy.intp)]
+    with numpy.errstate(divide='ignore', invalid='ignore'):
+        percent_err = numpy.absolute( 100.0*(nearest - failureLoad)/failureLoad )
+    inside  = (failureLoad >= peak[0]) & (failureLoad <= peak[-1])
+    located = inside | (percent_err < errTol)
+    return (frames, located)
 
 #
 # main class
@@ -30,6 +128,17 @@ class superSpecimen(object):
         instanceName = string name of the instance in the ABAQUS assembly
         setName      = string of the name of the set of interest
                        (e.g. set to obtain VGI)
+        vgiMode      = string VGI averaging mode (see VGI_MODES), default 
+                       'NODAL_AVG'. set by the self.calc...MonoVGI() methods
+        vgiSource    = string VGI source (see VGI_SOURCES), default 'FIELDS'
+                       i.e. integrated from the MISES, PRESS and PEEQ fields
+        frameRange   = None (all frames), or tuple (start, stop) of the
+                       frames of VGI and loadHist
+    
+    the attributes below are computed lazily (i.e. on first access), and
+    are memoized. changing any attribute they depend on (see DEPENDENCIES,
+    e.g. setName, vgiMode, frameRange) invalidates them, such that they 
+    are recomputed on next access. see lazyAttributes.
     
     Attributes set by self.calcNodalExtrapMonoVGI():
         VGI          = rank-3 array of nodal (extrapolated) VGI history 
@@ -59,14 +168,65 @@ class superSpecimen(object):
         VGI          = same as above, but average values are associated
                        with elements
     
+    Attributes set by self.determineFailureIndex():
+        failureIndex = tuple of the (nearest) frame of every failure load
+        failureFrame = numpy array of the (interpolated, fractional) frame
+                       of every failure load
+    
     Attributes set by self.fetchVolume():
         elemVol      = numpy array of element volumes in self.setName
         
     Attributes set by self.fetchMeshInfo():
         nodesCoords  = numpy array of the nodal coordinates
         elemConnect  = numpy array of the elemental connectivity
+    
+    Attributes set by all self.calc...MonoVGI() methods:
+        vgiFrom      = string source of self.VGI: 'UVARM' (in-solver),
+                       or 'FIELDS' (integrated from MISES, PRESS, PEEQ)
     """
     
+    #
+    # Attribute dependencies (see lazyAttributes)
+    #
+    DEPENDENCIES = {
+        'VGI'               : ('odbPath', 'setName', 'vgiMode', 'vgiSource', 'frameRange'),
+        'vgiFrom'           : ('odbPath', 'setName', 'vgiMode', 'vgiSource'),
+        'nodeLabelSet'      : ('odbPath', 'setName', 'vgiMode', 'vgiSource'),
+        'elemLabelSet'      : ('odbPath', 'setName', 'vgiMode', 'vgiSource'),
+        'intPtLabelSet'     : ('odbPath', 'setName', 'vgiMode', 'vgiSource'),
+        'loadHist'          : ('odbPath', 'loadSetName', 'frameRange'),
+        'failureIndex'      : ('loadHist', 'failureLoad'),
+        'failureFrame'      : ('failureIndex',),
+        'nodesCoords'       : ('odbPath', 'instanceName'),
+        'elemConnect'       : ('odbPath', 'instanceName'),
+        'elemType'          : ('odbPath', 'instanceName'),
+        'elemVol'           : ('odbPath', 'setName'),
+        '_derivOperators'   : ('loadHist', 'failureIndex'),
+        '_nonlocalAverager' : ('odbPath', 'setName', 'nodeLabelSet'),
+        }
+    
+    odbPath       = Input('odbPath')
+    setName       = Input('setName')
+    instanceName  = Input('instanceName')
+    loadSetName   = Input('loadSetName')
+    failureLoad   = Input('failureLoad')
+    vgiMode       = Input('vgiMode')
+    vgiSource     = Input('vgiSource')
+    frameRange    = Input('frameRange')
+    
+    VGI           = LazyAttribute('VGI', '_computeVGI')
+    vgiFrom       = LazyAttribute('vgiFrom', '_computeVGI')
+    nodeLabelSet  = LazyAttribute('nodeLabelSet', '_computeVGI')
+    elemLabelSet  = LazyAttribute('elemLabelSet', '_computeVGI')
+    intPtLabelSet = LazyAttribute('intPtLabelSet', '_computeVGI')
+    loadHist      = LazyAttribute('loadHist', '_computeLoadHist')
+    failureIndex  = LazyAttribute('failureIndex', 'determineFailureIndex')
+    failureFrame  = LazyAttribute('failureFrame', '_computeFailureFrame')
+    nodesCoords   = LazyAttribute('nodesCoords', 'fetchMeshInfo')
+    elemConnect   = LazyAttribute('elemConnect', 'fetchMeshInfo')
+    elemType      = LazyAttribute('elemType', 'fetchMeshInfo')
+    elemVol       = LazyAttribute('elemVol', 'fetchVolume')
+    
     #
     # Attributes (object initialization)
     #
@@ -83,10 +243,17 @@ class superSpecimen(object):
         if loadSetName is not None:
             self.loadSetName  = loadSetName.upper()
         
-        # set from Methods:
+        # VGI averaging and frames (see VGI_MODES)
+        self.vgiMode    = 'NODAL_AVG'
+        self.vgiSource  = 'FIELDS'
+        self.frameRange = None
+        
+        # lazy attributes, computed by Methods on first access:
         #calc VGI's
         self.VGI           = None
+        self.vgiFrom       = None
         self.failureIndex  = None
+        self.failureFrame  = None
         self.nodeLabelSet  = None
         self.elemLabelSet  = None
         self.intPtLabelSet = None
@@ -101,6 +268,11 @@ class superSpecimen(object):
         # these should be set/handled by the subclasses
         self.failureLoad = failureLoad
         self.loadHist    = None
+        
+        # cached derivative operators of loadHist (see self.derivOperator)
+        # and nonlocal averaging operators (see self.nonlocalVGI)
+        self._derivOperators   = None
+        self._nonlocalAverager = None
         return
     
     #
@@ -119,59 +291,214 @@ class superSpecimen(object):
     #
     # Methods
     #
+    def _labelRows(self, labels, subset, what):
+        """
+        returns the indices of labels (e.g. the node labels of a fetch)
+        of every label of subset, in the order of subset. raises an 
+        exception if labels (what) are missing any of subset
+        """
+        labels = numpy.ravel(labels)
+        subset = numpy.ravel(subset)
+        order  = numpy.argsort(labels, kind='mergesort')
+        rows   = order[numpy.clip(numpy.searchsorted(labels, subset, sorter=order),
+                                  0, max(labels.shape[0] - 1, 0))]
+        if labels.shape[0] == 0 or not numpy.array_equal(labels[rows], subset):
+            raise Exception('superSpecimen: ' + self.name + ': ' + what + 
+                            ' are missing labels')
+        return rows
+
+    def _fetchField(self, varClass, args, methods):
+        """
+        fetch ODB data through the shared per-process cache, such that
+        repeated fetches of the same data are not re-read from the ODB.
+        i.e. varClass(*args), then calls the methods (names, in order).
+        the returned object is shared, so it must be treated as read-only.
+        a fetch served from memory is instrumented as 'cached', of 0 bytes
+        """
+        with instrumentation.stage('fetch', self.name) as record:
+            hits = FIELD_CACHE.hits
+            obj  = fetchField(varClass, args, methods)
+            if instrumentation.enabled():
+                cached = FIELD_CACHE.hits > hits
+                record['field']  = varClass.__name__ + str(tuple(args[1:]) + tuple(methods))
+                record['cached'] = cached
+                record['bytes']  = 0 if cached else instrumentation.nbytes(obj)
+                record['shapes'] = instrumentation.shapes(getattr(obj, 'resultData', None))
+        return obj
+    
+    def _fetchMonoVGIFields(self, fetchMethod):
+        """
+        returns a tuple of the IntPtVariable objects (PEEQ, mises, pressure)
+        of (elemental) self.setName, fetched using fetchMethod (string name
+        of the IntPtVariable method, e.g. 'fetchNodalAverage')
+        """
+        
+        fields = []
+        for var in ('PEEQ', 'MISES', 'PRESS'):
+            fields.append( self._fetchField(IntPtVariable,
+                                            (self.odbPath, var, self.setName),
+                                            (fetchMethod,)) )
+        return tuple(fields)
+    
+    def _fetchUVARMVGI(self, fetchMethod):
+        """
+        returns the IntPtVariable object of the in-solver monotonic VGI
+        (UVARM_VGI) of (elemental) self.setName, fetched using fetchMethod.
+        returns None if it is not output to the ODB, unless self.vgiSource
+        is 'UVARM' or 'CHECK' (in which case the fetch error is raised).
+        only a missing variable (VARIABLE_NOT_FOUND of odbBackend) is
+        taken as "not output"; any other fetch error is raised.
+        """
+        # the ODB (path, and fingerprint, so a re-run ODB is retried)
+        # and set are remembered once UVARM_VGI is found to be missing
+        missingKey = (self.odbPath, self.setName, odbFingerprint(self.odbPath))
+        if missingKey in _MISSING_UVARM and self.vgiSource == 'AUTO':
+            return None
+        try:
+            return self._fetchField(IntPtVariable, (self.odbPath, UVARM_VGI, self.setName),
+                                    (fetchMethod,))
+        except VARIABLE_NOT_FOUND:
+            if self.vgiSource != 'AUTO':
+                raise
+            _MISSING_UVARM.add(missingKey)
+            print('\n' + self.name + ': ' + UVARM_VGI + ' of ' + self.setName + 
+                  ' is not output to the ODB. using the VGI of the fields\n')
+            return None
+    
+    @instrumented('VGI', outputs=('VGI',))
+    def _computeVGI(self):
+        """
+        computes the monotonic VGI (and labels) of (elemental or nodal)
+        self.setName for the averaging mode self.vgiMode, and frames
+        self.frameRange, from the source self.vgiSource. see VGI_MODES
+        and VGI_SOURCES
+        """
+        if self.vgiMode not in VGI_MODES:
+            raise Exception('superSpecimen: undefined vgiMode ' + str(self.vgiMode))
+        if self.vgiSource not in VGI_SOURCES:
+            raise Exception('superSpecimen: undefined vgiSource ' + str(self.vgiSource))
+        
+        modes = ('NODAL_EXTRAP', 'INT_PT') if self.vgiMode == 'ALL' else (self.vgiMode,)
+        VGI    = {}
+        labels = {'nodeLabelSet': None, 'elemLabelSet': None, 'intPtLabelSet': None}
+        source = set()
+        for mode in modes:
+            (fetchMethod, labelNames) = VGI_MODES[mode]
+            
+            # the in-solver VGI history (a single field), if available
+            # (and not already found inconsistent, for 'AUTO')
+            field = None
+            checkKey = (self.odbPath, self.setName, odbFingerprint(self.odbPath), mode)
+            if self.vgiSource != 'FIELDS' and not (self.vgiSource == 'AUTO' and 
+                                                   _UVARM_CONSISTENT.get(checkKey) is False):
+                field = self._fetchUVARMVGI(fetchMethod)
+            
+            # the in-solver VGI is only trusted by 'AUTO' if it is 
+            # consistent with the fields (e.g. not of an older UVARM).
+            # the verdict is remembered, so the fields are read only once
+            if field is not None and self.vgiSource in ('AUTO', 'CHECK'):
+                if checkKey not in _UVARM_CONSISTENT:
+                    _UVARM_CONSISTENT[checkKey] = self.checkUVARMVGI(mode)['consistent']
+                if not _UVARM_CONSISTENT[checkKey] and self.vgiSource == 'AUTO':
+                    print('\n' + self.name + ': ' + UVARM_VGI + ' (' + mode + ') is not ' + 
+                          'used. using the VGI of the fields\n')
+                    field = None
+            
+            if field is not None:
+                # (copied, since the fetched data is shared)
+                VGI[mode] = numpy.array(self._frames(field.resultData), dtype=numpy.float64)
+                source.add('UVARM')
+            else:
+                # obtain the PEEQ, mises, and pressure histories
+                (PEEQ, mises, pressure) = self._fetchMonoVGIFields(fetchMethod)
+                
+                # obtain the VGI history of the simulation
+                VGI[mode] = self._frames(calcMonotonicVGI(mises.resultData, pressure.resultData,
+                                                          PEEQ.resultData))
+                source.add('FIELDS')
+                field = mises
+            for (name, fieldName) in labelNames.items():
+                labels[name] = getattr(field, fieldName)
+        
+        # save VGI (as dict for 'ALL') and labels
+        if self.vgiMode == 'ALL':
+            VGI = {'ELEM_IP':VGI['INT_PT'], 'ELEM_NODAL':VGI['NODAL_EXTRAP']}
+        else:
+            VGI = VGI[self.vgiMode]
+        setComputed(self, VGI=VGI, vgiFrom='/'.join(sorted(source)), **labels)
+        return
+    
+    def checkUVARMVGI(self, mode=None, nsample=UVARM_SAMPLE, rtol=UVARM_RTOL, seed=0):
+        """
+        compare the in-solver monotonic VGI (UVARM_VGI) to the VGI 
+        integrated from the MISES, PRESS and PEEQ fields, of the averaging
+        mode (default = self.vgiMode, see VGI_MODES), at nsample randomly 
+        sampled points (nodes, or integration points) of self.setName.
+        
+        the in-solver VGI is integrated over every increment, whereas 
+        calcVGI integrates over the output frames, so the two differ by
+        the integration error of the frames (and by the integration rule
+        of UVARM/monovgi.for). a warning is printed if they differ by more
+        than rtol (relative to the largest VGI of a point).
+        
+        returns a dictionary of the 'mode', the number of sampled points
+        'npoint', the largest absolute and relative differences 'maxAbsErr'
+        and 'maxRelErr', and 'consistent' (maxRelErr <= rtol)
+        """
+        if mode is None:
+            mode = self.vgiMode
+        if mode not in VGI_MODES or VGI_MODES[mode] is None:
+            raise Exception('superSpecimen: undefined vgiMode for the UVARM check ' + str(mode))
+        fetchMethod = VGI_MODES[mode][0]
+        
+        # both fetches raise if the fields are not output to the ODB
+        uvarm = self._fetchField(IntPtVariable, (self.odbPath, UVARM_VGI, self.setName),
+                                 (fetchMethod,))
+        (PEEQ, mises, pressure) = self._fetchMonoVGIFields(fetchMethod)
+        
+        # sample points of the (flattened) histories
+        nframe = uvarm.resultData.shape[0]
+        npoint = uvarm.resultData.size//max(nframe, 1)
+        rng    = numpy.random.RandomState(seed)
+        sample = numpy.sort(rng.permutation(npoint)[:nsample])
+        def points(data):
+            return numpy.ascontiguousarray(numpy.reshape(data, (nframe, npoint))[:,sample])
+        
+        fieldVGI = calcMonotonicVGI(points(mises.resultData), points(pressure.resultData),
+                                    points(PEEQ.resultData))
+        absErr = numpy.absolute(points(uvarm.resultData) - fieldVGI)
+        scale  = numpy.maximum(numpy.absolute(fieldVGI).max(axis=0), 1e-12)
+        result = {'mode': mode, 'npoint': int(sample.shape[0]),
+                  'maxAbsErr': float(absErr.max()) if absErr.size else 0.0,
+                  'maxRelErr': float((absErr/scale).max()) if absErr.size else 0.0}
+        result['consistent'] = result['maxRelErr'] <= rtol
+        if not result['consistent']:
+            print('\n!! WARNING: ' + self.name + ' ' + UVARM_VGI + ' and the field VGI (' + 
+                  mode + ') differ by up to ' + '%.1f' % (100.0*result['maxRelErr']) + 
+                  '% of the VGI !!\n')
+        return result
+    
+    def _frames(self, history):
+        """ returns the frames self.frameRange of history[frame, ...] """
+        if self.frameRange is None:
+            return history
+        return history[slice(*self.frameRange)]
+    
     def calcNodalExtrapMonoVGI(self):
         """ 
         Obtians an extrapolated monotonic VGI for nodes of elements 
         in (elemental) self.setName
         """
-        
-        # obtain the PEEQ history
-        PEEQ = IntPtVariable(self.odbPath, 'PEEQ', self.setName)
-        PEEQ.fetchNodalExtrap()
-        
-        # obtain the mises history
-        mises = IntPtVariable(self.odbPath, 'MISES', self.setName)
-        mises.fetchNodalExtrap()
-        
-        # obtain the pressure history
-        pressure = IntPtVariable(self.odbPath, 'PRESS', self.setName)
-        pressure.fetchNodalExtrap()
-        
-        # obtain the VGI history of the simulation
-        VGI = calcMonotonicVGI( mises.resultData, pressure.resultData, PEEQ.resultData )
-    
-        # save VGI and labels, then return
-        self.VGI = VGI
-        self.elemLabelSet = mises.elementLabels
-        self.nodeLabelSet = mises.nodeLabels
-        return
+        self.vgiMode = 'NODAL_EXTRAP'
+        return self.VGI
         
     def calcIntPtMonoVGI(self):
         """ 
         Obtains the monotonic VGI for integration points of elements
         in (elemental) self.setName
         """
-        
-        # obtain the PEEQ history
-        PEEQ = IntPtVariable(self.odbPath, 'PEEQ', self.setName)
-        PEEQ.fetchIntPtData()
-        
-        # obtain the mises history
-        mises = IntPtVariable(self.odbPath, 'MISES', self.setName)
-        mises.fetchIntPtData()
-        
-        # obtain the pressure history
-        pressure = IntPtVariable(self.odbPath, 'PRESS', self.setName)
-        pressure.fetchIntPtData()
-        
-        # obtain the VGI history of the simulation
-        VGI = calcMonotonicVGI( mises.resultData, pressure.resultData, PEEQ.resultData )
-    
-        # save VGI and labels, then return
-        self.VGI = VGI
-        self.elemLabelSet  = mises.elementLabels
-        self.intPtLabelSet = mises.intPtLabels
-        return
+        self.vgiMode = 'INT_PT'
+        return self.VGI
 
     def calcAllMonoVGI(self):
         """ 
@@ -185,66 +512,30 @@ class superSpecimen(object):
         integration point data has dictionary key 'ELEM_IP'
         nodal data has dictionary key 'ELEM_NODAL'
         """
-        
-        # obtain the nodal (extrapolated) VGI
-        self.calcNodalExtrapMonoVGI()
-        nodal_VGI = self.VGI
-        
-        # obtain the integration point VGI
-        self.calcIntPtMonoVGI()
-        ip_VGI = self.VGI
-        
-        # save as dict to VGI
-        self.VGI = {'ELEM_IP':ip_VGI, 'ELEM_NODAL':nodal_VGI}
-        return
-        
+        self.vgiMode = 'ALL'
+        return self.VGI
         
     def calcNodalAvgMonoVGI(self):
         """ Obtains the average monotonic VGI of (nodal) self.setName """
-        
-        # obtain the PEEQ history
-        PEEQ = IntPtVariable(self.odbPath, 'PEEQ', self.setName)
-        PEEQ.fetchNodalAverage()
-        
-        # obtain the mises history
-        mises = IntPtVariable(self.odbPath, 'MISES', self.setName)
-        mises.fetchNodalAverage()
-        
-        # obtain the pressure history
-        pressure = IntPtVariable(self.odbPath, 'PRESS', self.setName)
-        pressure.fetchNodalAverage()
-        
-        # obtain the VGI history of the simulation
-        VGI = calcMonotonicVGI(mises.resultData, pressure.resultData, PEEQ.resultData)        
-        
-        # save VGI and labels, then return
-        self.VGI = VGI
-        self.nodeLabelSet = PEEQ.nodeLabels
-        return
+        self.vgiMode = 'NODAL_AVG'
+        return self.VGI
     
     def calcElemAvgMonoVGI(self):
         """ Obtains the average monotonic VGI of (elemental) self.setName """
-        
-        # obtain the PEEQ history
-        PEEQ = IntPtVariable(self.odbPath, 'PEEQ', self.setName)
-        PEEQ.fetchElementAverage()
-        
-        # obtain the mises history
-        mises = IntPtVariable(self.odbPath, 'MISES', self.setName)
-        mises.fetchElementAverage()
-        
-        # obtain the pressure history
-        pressure = IntPtVariable(self.odbPath, 'PRESS', self.setName)
-        pressure.fetchElementAverage()
-        
-        # obtain the VGI history of the simulation
-        VGI = calcMonotonicVGI(mises.resultData, pressure.resultData, PEEQ.resultData)        
-        
-        # save VGI and labels, then return
-        self.VGI = VGI
-        self.elemLabelSet = PEEQ.elementLabels
+        self.vgiMode = 'ELEM_AVG'
+        return self.VGI
+    
+    @instrumented('loadHist', outputs=('loadHist',))
+    def _computeLoadHist(self):
+        """ 
+        computes the load history (see self.fetchLoadHist of the subclasses)
+        of the frames self.frameRange
+        """
+        self.fetchLoadHist()
+        setComputed(self, loadHist=self._frames(self.__dict__['loadHist']))
         return
         
+    @instrumented('mesh', outputs=('nodesCoords', 'elemConnect'))
     def fetchMeshInfo(self, instanceName=None, exactKey=False):
         """ obtain the nodal coordinates and elemental connectivity """
         # check input
@@ -252,19 +543,148 @@ class superSpecimen(object):
             instanceName = self.instanceName
 
         # generate InstanceMesh object and fetch the mesh
-        mesh = InstanceMesh(self.odbPath, instanceName, exactKey)
-        mesh.fetchMesh()
+        mesh = self._fetchField(InstanceMesh, (self.odbPath, instanceName, exactKey),
+                                ('fetchMesh',))
 
         # save to self, return
-        self.elemConnect = mesh.elemConnect
-        self.elemType    = mesh.elemType
-        self.nodesCoords = mesh.nodesCoords
+        setComputed(self, elemConnect=mesh.elemConnect, elemType=mesh.elemType,
+                          nodesCoords=mesh.nodesCoords)
         return
         
+    @instrumented('volume', outputs=('elemVol',))
     def fetchVolume(self):
         """ obtain the initial volume for the elements in the self.setName """
         
-        vol = ElementVariable(self.odbName, 'EVOL', self.setName)
-        vol.fetchInitialElementVolume()
-        self.elemVol = vol.resultData
+        vol = self._fetchField(ElementVariable, (self.odbName, 'EVOL', self.setName),
+                               ('fetchInitialElementVolume',))
+        setComputed(self, elemVol=vol.resultData)
+        return
+    
+    @instrumented('failureIndex', outputs=('failureIndex', 'failureFrame'))
+    def determineFailureIndex(self):
+        """
+        determine which "history" (AKA frame) index corresponds to failure,
+        for every observed failure load (self.failureLoad).
+        
+        all failure loads are located at once (see locateFailureFrames), 
+        and the sub-frame position of failure is interpolated between the
+        bracketing frames. failure loads beyond self.loadHist (by more than
+        the percent error self.ERR_TOL) cannot be located, and are skipped.
+        
+        saves self.failureIndex (nearest frames) and self.failureFrame 
+        (interpolated frames).
+        """
+        
+        failureLoad = numpy.ravel(numpy.asarray(self.failureLoad, dtype=numpy.float64))
+        (frames, located) = locateFailureFrames(self.loadHist, failureLoad, self.ERR_TOL)
+        for load in failureLoad[~located]:
+            # provide warning that something went wrong.
+            # append nothing. try to continue.
+            print ("\n!! WARNING: " + self.name + ": the failure index could not " +
+                   "be located for failure load " + str(load) + " !!\n")
+        
+        # save to attributes
+        setComputed(self, failureIndex=tuple([int(f) for f in numpy.rint(frames[located])]),
+                          failureFrame=frames[located])
+        return
+    
+    def _computeFailureFrame(self):
+        """
+        computes the failure frames. these are interpolated by
+        self.determineFailureIndex, unless self.failureIndex was assigned
+        """
+        failureIndex = self.failureIndex
+        if self.__dict__.get('failureFrame') is None:
+            setComputed(self, failureFrame=numpy.array(failureIndex, dtype=numpy.float64))
         return
+    
+    def VGIAtFailure(self):
+        """
+        returns the VGI state at every observed failure, linearly
+        interpolated between the frames bracketing the failure load.
+        i.e. an array VGI[failure, ...], or a dictionary of them (for
+        the VGI of self.calcAllMonoVGI)
+        """
+        frames = numpy.ravel(self.failureFrame)
+        
+        def interp(VGI):
+            VGI = numpy.asarray(VGI)
+            lo  = numpy.clip(numpy.floor(frames).astype(numpy.intp), 0, VGI.shape[0] - 1)
+            hi  = numpy.minimum(lo + 1, VGI.shape[0] - 1)
+            t   = (frames - lo).reshape((-1,) + (1,)*(VGI.ndim - 1))
+            return (1.0 - t)*VGI[lo] + t*VGI[hi]
+        
+        if isinstance(self.VGI, dict):
+            return dict([ (key, interp(value)) for (key, value) in self.VGI.items() ])
+        return interp(self.VGI)
+    
+    def derivOperator(self, m=1, width=fornberg.STENCIL_WIDTH, failureRows=False):
+        """
+        returns the sparse matrix D of the m^th derivative w.r.t. load
+        (self.loadHist), such that e.g. D*CDF is the failure PDF. CDF may
+        be a vector, or a matrix [frames, n_params] of many CDF's.
+        
+        if failureRows is True, D only has the rows of the observed
+        failures (i.e. D*CDF is the PDF at the observed failures),
+        interpolated at the sub-frame failure positions.
+        
+        the operators are cached, and rebuilt if self.loadHist (or
+        self.failureIndex) changes. see fornberg.derivMatrix()
+        """
+        
+        loadHist = self.loadHist
+        rows = None
+        if failureRows:
+            rows = tuple(numpy.ravel(self.failureFrame).tolist())
+        
+        # the cache is invalidated with loadHist (see DEPENDENCIES)
+        cache = self._derivOperators
+        if cache is None:
+            cache = self._derivOperators = {}
+        
+        key = (m, width, rows)
+        if key not in cache:
+            cache[key] = fornberg.derivMatrix(m, loadHist, width, 
+                                              None if rows is None else numpy.array(rows))
+        return cache[key]
+
+    @instrumented('nonlocalVGI')
+    def nonlocalVGI(self, radius, kernel='uniform', weights=None):
+        """
+        returns the nonlocal average of the (nodal average) self.VGI over
+        radius (uniform kernel), or over the Gaussian kernel width radius.
+        radius may also be a sequence (e.g. an l* sweep), in which case a
+        list of the averages is returned. weights are the nodal volumes
+        of self.nodeLabelSet (default = equal weights).
+        
+        only the nodal average VGI (vgiMode 'NODAL_AVG') is supported.
+        the initial coordinates (COORD) of the nodes of self.setName are
+        matched to self.nodeLabelSet by node label. the KD-tree of the
+        nodes, and the averaging operators, are cached. see 
+        nonlocalAverage.NonlocalAverager
+        """
+        
+        # check if pre-requisites are properly met
+        if self.vgiMode != 'NODAL_AVG':
+            # make sure element calcs are not used
+            raise Exception("method not supported or meaningful for element output")
+        
+        averager = self._nonlocalAverager
+        if weights is None:
+            # equal weights (of any value) are the default
+            rebuild = averager is not None and numpy.ptp(averager.weights) != 0.0
+        else:
+            rebuild = averager is not None and not numpy.array_equal(averager.weights, weights)
+        if averager is None or rebuild:
+            # initial coordinates of the nodes in the set
+            coords = self._fetchField(NodalVariable, (self.odbPath, 'COORD', self.setName),
+                                      ('fetchNodalOutput',))
+            
+            # rows of the coordinates of the VGI nodes (nodeLabelSet)
+            rows = self._labelRows(coords.nodeLabels, self.nodeLabelSet, 'the COORD of ' + self.setName)
+            averager = nonlocalAverage.NonlocalAverager(coords.resultData[0][rows], weights)
+            self._nonlocalAverager = averager
+        
+        if numpy.ndim(radius) == 0:
+            return averager.average(self.VGI, radius, kernel)
+        return averager.sweep(self.VGI, radius, kernel)
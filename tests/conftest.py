@@ -0,0 +1,21 @@
+"""
+pytest configuration: the FEM_VGPy modules are imported from the source
+tree, and the ODB backend is the replay of a temporary archive (see
+odbReplay), with the on-disk caches disabled, so that no Abaqus is
+required.
+"""
+import os
+import sys
+import tempfile
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'FEM_VGPy'))
+
+import myPaths
+
+ARCHIVE_DIR = tempfile.mkdtemp(prefix='VGPy_OdbArchive_')
+
+myPaths.odbBackend  = lambda: 'replay'
+myPaths.odbArchive  = lambda: ARCHIVE_DIR
+myPaths.fieldCache  = lambda: None
+myPaths.basisCache  = lambda: None
+myPaths.saveResults = lambda: tempfile.gettempdir()
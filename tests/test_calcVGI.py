@@ -0,0 +1,96 @@
+"""
+backend equivalence of calcVGI.calcCyclicVGI and the reference
+(scalar loop) implementation, including NaN and zero-stress frames, and
+of the MonotonicVGIAccumulator and calcMonotonicVGI (of any frame blocks)
+"""
+import numpy
+import pytest
+
+import calcVGI
+
+
+def _histories(nframe=40, npoint=12, seed=0):
+    """ cyclic mises, pressure, PEEQ with zero-stress and extreme frames """
+    rng = numpy.random.RandomState(seed)
+    mises    = rng.uniform(0.5, 2.0, (nframe, npoint))
+    pressure = rng.uniform(-2.0, 2.0, (nframe, npoint))
+    PEEQ     = numpy.cumsum(rng.uniform(0.0, 0.01, (nframe, npoint)), axis=0)
+    mises[0] = 0.0
+    pressure[0] = 0.0
+    PEEQ[0] = 0.0
+
+    # zero stress (NaN triaxiality) at later frames
+    mises[10, :4] = 0.0
+    pressure[10, :4] = 0.0
+    mises[25:, 5] = 0.0
+    pressure[25:, 5] = 0.0
+
+    # an infinite integrand in the last frame
+    mises[-1, 6] = 1.0
+    pressure[-1, 6] = -1e4
+    return (mises, pressure, PEEQ)
+
+
+def _backends():
+    backends = ['numpy']
+    if calcVGI.HAS_NUMBA:
+        backends.append('numba')
+    return backends
+
+
+@pytest.mark.parametrize('backend', _backends())
+def test_cyclic_backend_matches_reference(backend):
+    (mises, pressure, PEEQ) = _histories()
+    with numpy.errstate(divide='ignore', invalid='ignore', over='ignore'):
+        (refVGI, refPEEQ) = calcVGI._calcCyclicVGI_reference(mises, pressure, PEEQ)
+        (VGI, cumePEEQ) = calcVGI.calcCyclicVGI(mises, pressure, PEEQ, backend=backend)
+
+    if backend == 'numpy':
+        numpy.testing.assert_array_equal(VGI, refVGI)
+    else:
+        numpy.testing.assert_allclose(VGI, refVGI, rtol=1e-12)
+    numpy.testing.assert_array_equal(cumePEEQ, refPEEQ)
+
+    # the first frame is never mixed with the last
+    assert numpy.all(VGI[0] == 0.0)
+    assert numpy.all(cumePEEQ[0] == 0.0)
+
+
+def test_cyclic_rank3_matches_rank2():
+    (mises, pressure, PEEQ) = _histories(npoint=12)
+    shape = (mises.shape[0], 3, 4)
+    with numpy.errstate(divide='ignore', invalid='ignore', over='ignore'):
+        (VGI2, cume2) = calcVGI.calcCyclicVGI(mises, pressure, PEEQ, backend='numpy')
+        (VGI3, cume3) = calcVGI.calcCyclicVGI(mises.reshape(shape), pressure.reshape(shape),
+                                              PEEQ.reshape(shape), backend='numpy')
+    numpy.testing.assert_array_equal(VGI3.reshape(VGI2.shape), VGI2)
+    numpy.testing.assert_array_equal(cume3.reshape(cume2.shape), cume2)
+
+
+def _monotonicHistories(nframe=40, npoint=12, seed=1):
+    """ monotonic mises, pressure, PEEQ """
+    rng = numpy.random.RandomState(seed)
+    mises    = rng.uniform(0.5, 2.0, (nframe, npoint))
+    pressure = rng.uniform(-2.0, 1.0, (nframe, npoint))
+    PEEQ     = numpy.cumsum(rng.uniform(0.0, 0.01, (nframe, npoint)), axis=0)
+    return (mises, pressure, PEEQ)
+
+
+@pytest.mark.parametrize('splits', [(), (1,), (1, 2, 3), (7, 20, 39), tuple(range(1, 40))])
+def test_accumulator_matches_monotonic(splits):
+    (mises, pressure, PEEQ) = _monotonicHistories()
+    VGI = calcVGI.calcMonotonicVGI(mises, pressure, PEEQ)
+
+    accumulator = calcVGI.MonotonicVGIAccumulator(recordFrames=(0, 5, 39), recordMax=True)
+    bounds = (0,) + splits + (mises.shape[0],)
+    for (start, end) in zip(bounds[:-1], bounds[1:]):
+        if end - start == 1:
+            accumulator.addFrame(mises[start], pressure[start], PEEQ[start])
+        else:
+            accumulator.addFrames(mises[start:end], pressure[start:end], PEEQ[start:end])
+
+    assert accumulator.nframe == mises.shape[0]
+    numpy.testing.assert_array_equal(accumulator.VGI, VGI[-1])
+    for frame in (0, 5, 39):
+        numpy.testing.assert_array_equal(accumulator.recorded[frame], VGI[frame])
+    numpy.testing.assert_array_equal(accumulator.maxHist, VGI.max(axis=1))
@@ -0,0 +1,39 @@
+"""
+specimen_superclasses.locateFailureFrames: sub-frame failure positions
+of monotonic, noisy and unloading load histories
+"""
+import numpy
+
+from specimen_superclasses import locateFailureFrames
+
+
+def test_monotonic_interpolated():
+    load = numpy.linspace(0.0, 1.0, 11)
+    (frames, located) = locateFailureFrames(load, (0.25, 0.5, 1.0), 1.0)
+    numpy.testing.assert_allclose(frames, (2.5, 5.0, 10.0))
+    assert located.all()
+
+
+def test_noisy_load_history():
+    # a tiny decrease early on must not end the search
+    load = numpy.linspace(0.0, 1.0, 50)
+    load[3] = load[2] - 1e-9
+    (frames, located) = locateFailureFrames(load, (0.5, 0.9), 1.0)
+    assert located.all()
+    numpy.testing.assert_allclose(numpy.interp(frames, numpy.arange(50), load),
+                                  (0.5, 0.9), rtol=1e-12)
+
+
+def test_unloading_first_frame_reached():
+    # the failure load is located on the loading branch
+    load = numpy.concatenate((numpy.linspace(0.0, 1.0, 11), numpy.linspace(0.9, 0.0, 10)))
+    (frames, located) = locateFailureFrames(load, (0.5,), 1.0)
+    assert located.all()
+    numpy.testing.assert_allclose(frames, (5.0,))
+
+
+def test_beyond_history_tolerance():
+    load = numpy.linspace(0.0, 1.0, 11)
+    (frames, located) = locateFailureFrames(load, (1.005, 1.5), 1.0)
+    numpy.testing.assert_array_equal(located, (True, False))
+    numpy.testing.assert_allclose(frames, (10.0, 10.0))
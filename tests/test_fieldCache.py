@@ -0,0 +1,100 @@
+"""
+fieldCache: the memory and on-disk caches are invalidated by a re-run
+ODB (fingerprint) and by invalidate(), but only of that ODB
+"""
+import os
+import time
+
+import numpy
+
+import fieldCache
+
+
+class _Fetch(object):
+    """ a fetched 'ODB variable', which counts its reads """
+    reads = 0
+
+    def __init__(self, odbPath, name):
+        self.odbPath = odbPath
+        self.name    = name
+
+    def fetchData(self):
+        _Fetch.reads += 1
+        with open(self.odbPath, 'r') as f:
+            self.resultData = numpy.array([float(f.read())])
+
+
+def _writeOdb(path, value, mtime=None):
+    with open(path, 'w') as f:
+        f.write(str(value))
+    if mtime is not None:
+        os.utime(path, (mtime, mtime))
+    return path
+
+
+def _fetch(cache, odbPath):
+    return cache.fetch(_Fetch, (odbPath, 'PEEQ'), ('fetchData',)).resultData[0]
+
+
+def test_memory_cache_rerun_odb(tmpdir):
+    odbPath = _writeOdb(str(tmpdir.join('CT.odb')), 1.0, mtime=time.time() - 100)
+    cache = fieldCache.FieldCache()
+    assert _fetch(cache, odbPath) == 1.0
+    assert _fetch(cache, odbPath) == 1.0
+    assert (cache.hits, cache.misses) == (1, 1)
+
+    # re-run the ODB: a new fingerprint (size and mtime)
+    _writeOdb(odbPath, 20.0)
+    assert _fetch(cache, odbPath) == 20.0
+
+
+def test_memory_cache_invalidate_same_name(tmpdir):
+    odbA = _writeOdb(str(tmpdir.mkdir('a').join('CT.odb')), 1.0)
+    odbB = _writeOdb(str(tmpdir.mkdir('b').join('CT.odb')), 2.0)
+    cache = fieldCache.FieldCache()
+    (_fetch(cache, odbA), _fetch(cache, odbB))
+    assert len(cache) == 2
+
+    # only the ODB of that directory is removed
+    cache.invalidate(odbA)
+    assert len(cache) == 1
+    assert _fetch(cache, odbB) == 2.0
+    assert cache.hits == 1
+
+    cache.invalidate()
+    assert len(cache) == 0 and cache.nbytes == 0
+
+
+def test_disk_cache_rerun_odb(tmpdir):
+    odbPath = _writeOdb(str(tmpdir.join('CT.odb')), 1.0, mtime=time.time() - 100)
+    disk = fieldCache.DiskFieldCache(str(tmpdir.join('cache')))
+    _Fetch.reads = 0
+    assert _fetch(fieldCache.FieldCache(disk=disk), odbPath) == 1.0
+
+    # a new process (empty memory cache) is served from disk
+    assert _fetch(fieldCache.FieldCache(disk=disk), odbPath) == 1.0
+    assert (_Fetch.reads, disk.hits) == (1, 1)
+
+    # a re-run ODB is read again, and replaces the stale file
+    _writeOdb(odbPath, 20.0)
+    assert _fetch(fieldCache.FieldCache(disk=disk), odbPath) == 20.0
+    assert _Fetch.reads == 2
+    assert len(disk._files()) == 1
+
+
+def test_disk_cache_invalidate(tmpdir):
+    odbA = _writeOdb(str(tmpdir.mkdir('a').join('CT.odb')), 1.0)
+    odbB = _writeOdb(str(tmpdir.mkdir('b').join('CT.odb')), 2.0)
+    disk = fieldCache.DiskFieldCache(str(tmpdir.join('cache')))
+    cache = fieldCache.FieldCache(disk=disk)
+    (_fetch(cache, odbA), _fetch(cache, odbB))
+    assert len(disk._files()) == 2
+
+    cache.invalidate(odbA)
+    assert len(disk._files()) == 1
+    _Fetch.reads = 0
+    assert _fetch(fieldCache.FieldCache(disk=disk), odbB) == 2.0
+    assert _Fetch.reads == 0
+
+    cache.invalidate()
+    assert disk.size() == 0
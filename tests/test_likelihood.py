@@ -0,0 +1,55 @@
+"""
+likelihood: the analytic gradients of SampleBlock.logLikelihood match
+central finite differences, for every distribution type
+"""
+import numpy
+import pytest
+
+import likelihood
+
+
+class _Sample(object):
+    """ a specimen of the attributes used by SampleBlock """
+    def __init__(self, name, VGI, loadHist, failureFrame):
+        self.name         = name
+        self.material     = 'AP50'
+        self.VGI          = VGI
+        self.loadHist     = loadHist
+        self.failureIndex = tuple(numpy.rint(failureFrame).astype(int))
+        self.failureFrame = numpy.asarray(failureFrame, dtype=numpy.float64)
+
+
+def _block(seed=0):
+    rng = numpy.random.RandomState(seed)
+    samples = []
+    for (k, nframe) in enumerate((30, 45, 60)):
+        loadHist = numpy.sort(rng.uniform(0.0, 1.0, nframe))
+        VGI = numpy.cumsum(rng.uniform(0.0, 0.2, (nframe, 4)), axis=0)
+        samples.append(_Sample('SNTT_R%i_AP50' % k, VGI, loadHist,
+                               rng.uniform(5.0, nframe - 5.0, 2)))
+    return likelihood.SampleBlock(samples, lstarIndex=2)
+
+
+# parameters near the failure VGI of _block (about 1 to 6)
+PARAMS = {'Normal'   : (3.0, 1.5),
+          'Lognormal': (1.0, 0.5),
+          'Weibull'  : (3.5, 2.0),
+          'Gumbel'   : (3.0, 1.0)}
+
+
+@pytest.mark.parametrize('distType', sorted(likelihood.DIST_TYPES))
+def test_logLikelihood_gradient(distType):
+    block  = _block()
+    params = numpy.array(PARAMS[distType])
+    (logL, grad) = block.logLikelihood(distType, tuple(params), gradient=True)
+    assert logL == pytest.approx(block.logLikelihood(distType, tuple(params)), rel=1e-12)
+
+    fd = numpy.zeros(2)
+    for i in range(2):
+        h = 1e-6*params[i]
+        (up, down) = (params.copy(), params.copy())
+        up[i]   += h
+        down[i] -= h
+        fd[i] = (block.logLikelihood(distType, tuple(up)) -
+                 block.logLikelihood(distType, tuple(down)))/(2.0*h)
+    numpy.testing.assert_allclose(grad, fd, rtol=1e-5, atol=1e-8)
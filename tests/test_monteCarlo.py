@@ -0,0 +1,41 @@
+"""
+monteCarlo: the failure frames do not depend on the number of processes
+(of shared arrays, and of a generator copied to the workers)
+"""
+import numpy
+
+import monteCarlo
+from randomField import RandomFieldGenerator
+
+
+def _history(nframe=50, nnode=200, seed=0):
+    rng = numpy.random.RandomState(seed)
+    VGI = numpy.cumsum(rng.rand(nframe, nnode), axis=0)
+    return (VGI, numpy.linspace(0.0, 1.0, nframe), rng)
+
+
+def test_processes_array_fields():
+    (VGI, loadHist, rng) = _history()
+    fields = rng.uniform(5.0, 30.0, (600, VGI.shape[1]))
+    (loads, frames) = monteCarlo.monteCarloFailure(VGI, loadHist, fields, batchSize=100)
+    (loads2, frames2) = monteCarlo.monteCarloFailure(VGI, loadHist, fields, batchSize=100,
+                                                     processes=3)
+    numpy.testing.assert_array_equal(frames2, frames)
+    numpy.testing.assert_array_equal(loads2, loads)
+
+    # the first frame at which any node reaches its capacity
+    reached = VGI[numpy.newaxis,:,:] >= fields[:,numpy.newaxis,:]
+    expected = numpy.where(reached.any(axis=(1,2)), reached.any(axis=2).argmax(axis=1), -1)
+    numpy.testing.assert_array_equal(frames, expected)
+
+
+def test_processes_generator():
+    (VGI, loadHist, rng) = _history()
+    gen = RandomFieldGenerator(rng.rand(VGI.shape[1], 2)*0.01, 'exponential', 0.005,
+                               'Lognormal', (2.5, 0.3))
+    state = gen.rng.get_state()[1].copy()
+    (_, frames) = monteCarlo.monteCarloFailure(VGI, loadHist, gen, 500, batchSize=100)
+    (_, frames2) = monteCarlo.monteCarloFailure(VGI, loadHist, gen, 500, batchSize=100,
+                                                processes=3)
+    numpy.testing.assert_array_equal(frames2, frames)
+    numpy.testing.assert_array_equal(gen.rng.get_state()[1], state)
@@ -0,0 +1,72 @@
+"""
+randomField and karhunenLoeve: the standard Gaussian fields have unit
+variance, and the correlation of their covariance type (within the 
+interpolation or truncation error, and the sampling error)
+"""
+import numpy
+import pytest
+
+import randomField
+import karhunenLoeve
+
+
+def _coords(npoint=8, seed=0):
+    """ points of a square of 2 correlation lengths (of corrLength = 1) """
+    return numpy.random.RandomState(seed).uniform(0.0, 2.0, (npoint, 2))
+
+
+def _correlation(coords, covType, nu):
+    r = numpy.sqrt(((coords[:,numpy.newaxis,:] - coords[numpy.newaxis,:,:])**2).sum(axis=2))
+    return randomField.covariance(covType, r, 1.0, nu)
+
+
+# correlation error of the default spacing (see randomField.DEFAULT_SPACING)
+FFT_CASES = (('exponential', 1.5, 0.06),
+             ('squaredExponential', 1.5, 0.02),
+             ('matern', 1.5, 0.03),
+             ('matern', 0.5, 0.06))
+
+
+@pytest.mark.parametrize('covType,nu,tol', FFT_CASES)
+def test_fft_covariance(covType, nu, tol):
+    coords = _coords()
+    nreal  = 20000
+    gen = randomField.RandomFieldGenerator(coords, covType, 1.0, nu=nu, seed=0)
+    G = gen.standard(nreal)
+
+    # (sampling error of the variance, and correlation, is about 1/sqrt(nreal))
+    sampling = 5.0/numpy.sqrt(nreal)
+    numpy.testing.assert_allclose(G.var(axis=0), 1.0, atol=sampling)
+    numpy.testing.assert_allclose(numpy.corrcoef(G.T), _correlation(coords, covType, nu),
+                                  atol=tol + sampling)
+
+
+def test_fft_batches_are_independent(monkeypatch):
+    # batches of 2 realizations (one FFT)
+    monkeypatch.setattr(randomField, 'FIELD_BATCH_BYTES', 1)
+    gen = randomField.RandomFieldGenerator(_coords(), 'exponential', 1.0, seed=0)
+    assert gen.batchSize == 2
+    G = gen.standard(6000)
+    # realizations of different batches (and of the real and imaginary
+    # parts of an FFT) are uncorrelated
+    lag = numpy.mean(G[1:]*G[:-1], axis=0)
+    numpy.testing.assert_allclose(lag, 0.0, atol=5.0/numpy.sqrt(G.shape[0]))
+
+
+@pytest.mark.parametrize('covType,nu', [('exponential', 1.5), ('squaredExponential', 1.5),
+                                        ('matern', 1.5)])
+@pytest.mark.parametrize('method', ['lanczos', 'nystrom'])
+def test_kl_covariance(covType, nu, method):
+    coords = _coords(npoint=40)
+    gen = karhunenLoeve.KLGenerator(coords, covType=covType, corrLength=1.0, nu=nu,
+                                    varianceFraction=0.999, method=method, cacheDir=False,
+                                    seed=0)
+
+    # the covariance of the (rescaled) truncated expansion
+    basis = gen.basis/gen.rowNorm[:,numpy.newaxis]
+    C = basis.dot(basis.T)
+    numpy.testing.assert_allclose(numpy.diag(C), 1.0, rtol=1e-12)
+    numpy.testing.assert_allclose(C, _correlation(coords, covType, nu), atol=0.05)
+
+    G = gen.standard(20000)
+    numpy.testing.assert_allclose(numpy.cov(G.T, bias=True), C, atol=5.0/numpy.sqrt(20000))
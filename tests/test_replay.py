@@ -0,0 +1,107 @@
+"""
+end-to-end workflow of every specimen class (VGI, failure index and,
+for CT, the deterministic VGI) on synthetic archives, with the 'replay'
+backend of odbBackend
+"""
+import numpy
+import pytest
+
+import odbReplay
+import specimen_subclasses
+
+
+SPECIMENS = (('SNTT', 'SNTT_R10_AP50'),
+             ('CT',   'CT_1T_AP50'),
+             ('BB',   'BB_A325_AP50'),
+             ('BH',   'BH_AP50'),
+             ('RBS',  'RBS_AP50'),
+             ('BN',   'BN_AP50'))
+
+
+def _specimen(className, name, **options):
+    specimenClass = getattr(specimen_subclasses, className)
+    return specimenClass('C:\\temp\\' + name + '.odb', 'AP50', (0.25, 0.5), **options)
+
+
+@pytest.mark.parametrize('className,name', SPECIMENS)
+def test_replay_workflow(className, name):
+    (nframe, nnode) = (40, 30)
+    odbReplay.synthesizeArchive(_specimen(className, name), nframe=nframe, nnode=nnode)
+
+    specimen = _specimen(className, name)
+    specimen.calcNodalAvgMonoVGI()
+    specimen.determineFailureIndex()
+
+    assert specimen.VGI.shape == (nframe, nnode)
+    assert numpy.all(numpy.isfinite(specimen.VGI))
+    assert len(specimen.failureIndex) == 2
+    assert specimen.failureIndex[0] < specimen.failureIndex[1]
+
+    if className == 'CT':
+        labels = specimen.nodeLabelSet.copy()
+        VGI = specimen.VGI.copy()
+        specimen.fetchDeterministicVGI()
+        (nodinds, nodeLabels) = specimen.lstarNodeInfo
+        assert len(nodinds) > 0
+        assert specimen.lstars.shape == (1, len(nodinds))
+        numpy.testing.assert_array_equal(nodeLabels, labels[nodinds])
+        numpy.testing.assert_array_equal(specimen.VGI, VGI[:,nodinds])
+        assert numpy.all(specimen.lstars < specimen.max_lstar)
+
+
+def _reverseCoords(specimen, setName):
+    """ rewrite the COORD record of setName with the nodes in reverse order """
+    coords = specimen._fetchField(specimen_subclasses.NodalVariable,
+                                  (specimen.odbPath, 'COORD', setName), ('fetchNodalOutput',))
+    odbReplay.writeRecord('NodalVariable', (specimen.odbPath, 'COORD', setName),
+                          ('fetchNodalOutput',),
+                          odbReplay._Record(resultData=coords.resultData[:,::-1].copy(),
+                                            nodeLabels=coords.nodeLabels[::-1].copy()))
+
+
+def test_replay_deterministic_vgi_by_label():
+    odbReplay.synthesizeArchive(_specimen('CT', 'CT_1T_AP50L'), nframe=20, nnode=30)
+    reference = _specimen('CT', 'CT_1T_AP50L')
+    reference.fetchDeterministicVGI()
+
+    # the same mesh, with the COORD nodes in another order
+    odbReplay.synthesizeArchive(_specimen('CT', 'CT_1T_AP50R'), nframe=20, nnode=30)
+    specimen = _specimen('CT', 'CT_1T_AP50R')
+    _reverseCoords(specimen, specimen.setName)
+    specimen.fetchDeterministicVGI()
+
+    order = numpy.argsort(specimen.lstarNodeInfo[1])
+    numpy.testing.assert_array_equal(specimen.lstarNodeInfo[1][order], reference.lstarNodeInfo[1])
+    numpy.testing.assert_array_equal(specimen.lstars[:,order], reference.lstars)
+    numpy.testing.assert_array_equal(specimen.VGI[:,order], reference.VGI)
+
+
+def test_replay_nonlocal_weights():
+    odbReplay.synthesizeArchive(_specimen('SNTT', 'SNTT_R10_AP50W'), nframe=20, nnode=30)
+    specimen = _specimen('SNTT', 'SNTT_R10_AP50W')
+    weights = numpy.linspace(1.0, 10.0, 30)
+    equal    = specimen.nonlocalVGI(0.01)
+    weighted = specimen.nonlocalVGI(0.01, weights=weights)
+    assert not numpy.allclose(weighted, equal)
+
+    # the default (equal) weights again
+    numpy.testing.assert_array_equal(specimen.nonlocalVGI(0.01), equal)
+    numpy.testing.assert_array_equal(specimen.nonlocalVGI(0.01, weights=weights), weighted)
+
+
+def test_replay_instrumented_cache_hits(tmpdir):
+    import instrumentation
+    odbReplay.synthesizeArchive(_specimen('SNTT', 'SNTT_R10_AP50I'), nframe=20, nnode=30)
+    path = str(tmpdir.join('stages.jsonl'))
+    with instrumentation.instrument(path):
+        _specimen('SNTT', 'SNTT_R10_AP50I').calcNodalAvgMonoVGI()
+        _specimen('SNTT', 'SNTT_R10_AP50I').calcNodalAvgMonoVGI()
+
+    fetches = [r for r in instrumentation.readRecords(path) if r['stage'] == 'fetch']
+    (first, second) = (fetches[:len(fetches)//2], fetches[len(fetches)//2:])
+    assert not any([r['cached'] for r in first]) and all([r['bytes'] > 0 for r in first])
+    assert all([r['cached'] for r in second]) and all([r['bytes'] == 0 for r in second])
+
+    summary = dict([(s['stage'], s) for s in instrumentation.summarize(path)])
+    assert summary['fetch']['cached'] == len(second)
+    assert 'cached' in instrumentation.formatSummary(instrumentation.summarize(path))
@@ -0,0 +1,69 @@
+"""
+saveMAT: the native v5 and v7.3 MAT-file writers round-trip the
+attributes of a specimen (and append further specimens)
+"""
+import numpy
+import pytest
+
+import myPaths
+import saveMAT
+
+
+class _Specimen(object):
+    """ a specimen of the attribute types saved by saveMAT """
+    def __init__(self, name, seed=0):
+        rng = numpy.random.RandomState(seed)
+        self.name         = name
+        self.material     = 'AP50'
+        self.VGI          = rng.rand(20, 5)
+        self.loadHist     = numpy.linspace(0.0, 1.0, 20)
+        self.failureIndex = (7, 12)
+        self.failureLoad  = (0.35, 0.6)
+        self.radius       = 0.01
+        self.nframe       = 20
+        self.allVGI       = {'nodalExtrap': rng.rand(20, 3), 'intPt': rng.rand(20, 2)}
+        self.lstars       = None
+        self._private     = rng.rand(3)
+
+
+def _load(path, version):
+    """ returns {variable: {field: array}} of a MAT-file, in MATLAB (column-major) shapes """
+    if version == '5':
+        import scipy.io
+        data = scipy.io.loadmat(path, simplify_cells=True)
+        return dict([ (k, v) for (k, v) in data.items() if not k.startswith('__') ])
+
+    import h5py
+    def read(node):
+        if isinstance(node, h5py.Group):
+            return dict([ (k, read(node[k])) for k in node.keys() ])
+        value = node[()].transpose()
+        if node.attrs['MATLAB_class'] == b'char':
+            return ''.join([chr(c) for c in value.ravel()])
+        return value
+    with h5py.File(path, 'r') as f:
+        return dict([ (k, read(f[k])) for k in f.keys() ])
+
+
+@pytest.mark.parametrize('version', ['5', '7.3'])
+def test_round_trip(version, tmpdir, monkeypatch):
+    monkeypatch.setattr(myPaths, 'saveResults', lambda: str(tmpdir))
+    specimen = _Specimen('SNTT_R10_AP50')
+    saveMAT.VGPy(specimen, 'Deterministic.mat', version=version)
+    saveMAT.VGPy([_Specimen('CT_1T_AP50', seed=1)], 'Deterministic', append=True)
+
+    data = _load(str(tmpdir.join('Deterministic.mat')), version)
+    assert sorted(data) == ['CT_1T_AP50', 'SNTT_R10_AP50']
+    saved = data['SNTT_R10_AP50']
+    assert sorted(saved) == ['VGI', 'allVGI', 'failureIndex', 'failureLoad', 'loadHist',
+                             'material', 'name', 'nframe', 'radius']
+    assert (saved['name'], saved['material']) == (specimen.name, specimen.material)
+    numpy.testing.assert_array_equal(saved['VGI'], specimen.VGI)
+    numpy.testing.assert_array_equal(numpy.ravel(saved['loadHist']), specimen.loadHist)
+    numpy.testing.assert_array_equal(numpy.ravel(saved['failureIndex']), specimen.failureIndex)
+    numpy.testing.assert_array_equal(numpy.ravel(saved['failureLoad']), specimen.failureLoad)
+    assert numpy.ravel(saved['radius'])[0] == specimen.radius
+    assert numpy.ravel(saved['nframe'])[0] == specimen.nframe
+    for key in specimen.allVGI:
+        numpy.testing.assert_array_equal(saved['allVGI'][key], specimen.allVGI[key])
+    numpy.testing.assert_array_equal(data['CT_1T_AP50']['VGI'], _Specimen('CT', seed=1).VGI)
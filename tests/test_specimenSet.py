@@ -0,0 +1,51 @@
+"""
+specimenSet: saveSet/loadSet round-trip the columns of a SpecimenSet
+"""
+import numpy
+import pytest
+
+import specimenSet
+
+
+class SNTT(object):
+    """ a specimen of the attributes used by SpecimenSet """
+    def __init__(self, name, material, nframe, nloc, seed=0):
+        rng = numpy.random.RandomState(seed)
+        self.name         = name
+        self.material     = material
+        self.VGI          = numpy.cumsum(rng.rand(nframe, nloc), axis=0)
+        self.loadHist     = numpy.linspace(0.0, 1.0, nframe)[:,numpy.newaxis]
+        self.failureFrame = numpy.sort(rng.uniform(1.0, nframe - 1.0, 2))
+        self.failureIndex = tuple(numpy.rint(self.failureFrame).astype(int))
+
+
+class CT(SNTT):
+    pass
+
+
+@pytest.mark.parametrize('nspec', [1, 3])
+def test_round_trip(nspec, tmpdir):
+    specimens = [SNTT('SNTT_R10_AP50', 'AP50', 30, 1, seed=0),
+                 CT('CT_1T_AP70HP', 'AP70HP', 45, 6, seed=1),
+                 SNTT('SNTT_R05_AP70HP', 'AP70HP', 12, 1, seed=2)][:nspec]
+    original = specimenSet.SpecimenSet(specimens)
+    path = str(tmpdir.join('AllSpecimens.mat'))
+    specimenSet.saveSet(original, path)
+    loaded = specimenSet.loadSet(path)
+
+    for name in specimenSet.COLUMNS:
+        (a, b) = (getattr(original, name), getattr(loaded, name))
+        if isinstance(a, tuple):
+            assert a == b
+        else:
+            numpy.testing.assert_array_equal(b, a)
+            assert b.dtype == a.dtype
+
+    # the views are of the same specimens
+    for (specimen, view) in zip(specimens, loaded):
+        assert (view.name, view.material, view.specimenType) == (
+            specimen.name, specimen.material, type(specimen).__name__)
+        numpy.testing.assert_array_equal(view.VGI, specimen.VGI)
+        numpy.testing.assert_array_equal(view.loadHist, specimen.loadHist)
+        numpy.testing.assert_array_equal(view.failureIndex, specimen.failureIndex)
+        numpy.testing.assert_array_equal(view.failureFrame, specimen.failureFrame)